@@ -1,54 +1,46 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import csv
 import os
-import json
 import uuid
 from datetime import datetime, timedelta
 from tkcalendar import DateEntry
 from PIL import Image, ImageTk
-
-# --- CONFIGURATION FICHIERS ---
-FILE_DEPENSES = "depenses_flotte.csv"
-FILE_CHAUFFEURS = "chauffeurs.csv"
-FILE_REVENUS = "revenus_hebdo.csv"
-FILE_CONFIG = "config_taxi.json"
+import pandas as pd
+import configuration
+import detail_taxes
+import flottes
+import taux
+
+# --- CONFIGURATION FICHIERS (dossier de la flotte, voir flottes.py ; MONTAXI_FLOTTE choisit celle du démarrage) ---
+FLOTTE = flottes.defaut()
+FILE_DEPENSES = flottes.fichier(FLOTTE, "depenses")
+FILE_CHAUFFEURS = flottes.fichier(FLOTTE, "chauffeurs")
+FILE_REVENUS = flottes.fichier(FLOTTE, "revenus")
+FILE_PARAMS = flottes.fichier(FLOTTE, "config")
 
 BG_JAUNE = "#FFFFE0"
 
-DEFAULT_CONFIG = {
-    "cout_appel": 1.05, "pourcent_chauffeur": 40.0, "taux_impot": 18.0,
-    "taux_tps": 5.0, "taux_tvq": 9.975,
-    "categories": ["Réparation mécanique", "Carrosserie", "Pneus", "Assurance véhicule", "Permis/Licence SAAQ",
-                   "Frais administratifs", "Achat Pièces", "Autre"]
-}
-
-
-# --- GESTION PARAMÈTRES ---
-def charger_config():
-    config = DEFAULT_CONFIG.copy()
-    if os.path.exists(FILE_CONFIG):
-        try:
-            config.update(json.load(open(FILE_CONFIG, 'r', encoding='utf-8')))
-        except:
-            pass
-    return config
-
 
+# --- GESTION PARAMÈTRES (schéma commun avec app_taxi.py, voir configuration.py) ---
 def sauvegarder_config_gui():
     try:
         data = {
             "cout_appel": float(entry_param_appel.get().replace(',', '.')),
-            "pourcent_chauffeur": float(entry_param_pct.get().replace(',', '.')),
+            "pct_chauf": float(entry_param_pct.get().replace(',', '.')),
             "taux_impot": float(entry_param_impot.get().replace(',', '.')),
-            "taux_tps": float(entry_param_tps.get().replace(',', '.')),
-            "taux_tvq": float(entry_param_tvq.get().replace(',', '.')),
+            "tps": float(entry_param_tps.get().replace(',', '.')),
+            "tvq": float(entry_param_tvq.get().replace(',', '.')),
             "categories": [line.strip() for line in text_param_cats.get("1.0", tk.END).split('\n') if line.strip()]
         }
-        with open(FILE_CONFIG, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
         global PARAMS;
-        PARAMS = data
+        # Taux modifiés -> nouveau palier à partir d'aujourd'hui (les semaines passées gardent leurs taux)
+        # Config de départ = ancienne config (comme app_taxi.py) : sans historique, le palier d'origine garde les
+        # anciens taux
+        cfg = {**PARAMS, "categories": data["categories"]}
+        if any(data[k] != taux.actuels(PARAMS)[k] for k in taux.TAUX):
+            cfg = taux.ajouter(cfg, datetime.now(), data)
+        PARAMS = configuration.sauvegarder(cfg, FILE_PARAMS)
         update_labels_transaction()
         combo_dep_cat['values'] = PARAMS['categories']
         messagebox.showinfo("Succès", "Configuration sauvegardée !")
@@ -57,7 +49,30 @@ def sauvegarder_config_gui():
         messagebox.showerror("Erreur", "Chiffres invalides")
 
 
-PARAMS = charger_config()
+PARAMS = configuration.charger(FILE_PARAMS)
+
+
+def changer_flotte(event=None):
+    # Nouveaux chemins puis rechargement des onglets : seuls les fichiers de la flotte choisie sont lus
+    global FLOTTE, FILE_DEPENSES, FILE_CHAUFFEURS, FILE_REVENUS, FILE_PARAMS, PARAMS
+    FLOTTE = flottes.noms()[combo_flotte.current()]
+    FILE_DEPENSES = flottes.fichier(FLOTTE, "depenses")
+    FILE_CHAUFFEURS = flottes.fichier(FLOTTE, "chauffeurs")
+    FILE_REVENUS = flottes.fichier(FLOTTE, "revenus")
+    FILE_PARAMS = flottes.fichier(FLOTTE, "config")
+    PARAMS = configuration.charger(FILE_PARAMS)
+    fenetre.title(f"Gestion Taxi - {flottes.libelle(FLOTTE)} - Version Finale")
+    for e, k in [(entry_param_appel, "cout_appel"), (entry_param_pct, "pct_chauf"), (entry_param_impot, "taux_impot"),
+                 (entry_param_tps, "tps"), (entry_param_tvq, "tvq")]:
+        e.delete(0, tk.END); e.insert(0, PARAMS[k])
+    text_param_cats.delete("1.0", tk.END); text_param_cats.insert("1.0", "\n".join(PARAMS["categories"]))
+    combo_dep_cat['values'] = PARAMS['categories']
+    update_labels_transaction()
+    verifier_fichiers()
+    vider_form_trans(); vider_form_dep(); vider_form_chauf()
+    combo_filt_annee['values'] = get_annees_disponibles()
+    mise_a_jour_combos()
+    charger_tab_trans(); charger_tab_dep(); charger_tab_chauf(); calculer_synthese()
 
 
 # --- UTILITAIRES ---
@@ -109,7 +124,8 @@ def get_annees_disponibles():
 # =============================================================================
 def effectuer_calculs(*args):
     try:
-        t_ap, t_pct, t_imp = PARAMS["cout_appel"], PARAMS["pourcent_chauffeur"] / 100, PARAMS["taux_impot"] / 100
+        tx = taux.actuels(PARAMS, entry_rev_date.get_date())
+        t_ap, t_pct, t_imp = tx["cout_appel"], tx["pct_chauf"] / 100, tx["taux_impot"] / 100
         m_d, m_f = safe_float(entry_rev_meter_deb.get()), safe_float(entry_rev_meter_fin.get())
         mt = m_f - m_d if m_f >= m_d else 0.0
         val_meter_total.config(text=f"{mt:.2f}", fg="red" if m_f < m_d and m_f > 0 else "black")
@@ -148,7 +164,7 @@ def effectuer_calculs(*args):
 
 def update_labels_transaction():
     lbl_txt_redevance.config(text=f"Moins Appels (x {PARAMS['cout_appel']}$):")
-    lbl_txt_salaire.config(text=f"Salaire Chauffeur ({PARAMS['pourcent_chauffeur']}%):")
+    lbl_txt_salaire.config(text=f"Salaire Chauffeur ({PARAMS['pct_chauf']}%):")
     lbl_txt_impot.config(text=f"IMPOT ({PARAMS['taux_impot']}%):")
 
 
@@ -349,9 +365,10 @@ def crud_dep(mode):
         if mt == 0: messagebox.showwarning("Erreur", "Montant requis"); return
 
         if var_taxe.get() == 1:
-            div = 1 + (PARAMS["taux_tps"] / 100) + (PARAMS["taux_tvq"] / 100)
+            tx = taux.actuels(PARAMS, entry_dep_date.get_date())
+            div = 1 + (tx["tps"] / 100) + (tx["tvq"] / 100)
             ht = mt / div
-            tps, tvq = ht * (PARAMS["taux_tps"] / 100), ht * (PARAMS["taux_tvq"] / 100)
+            tps, tvq = ht * (tx["tps"] / 100), ht * (tx["tvq"] / 100)
         else:
             ht, tps, tvq = mt, 0.0, 0.0
 
@@ -508,33 +525,29 @@ def calculer_synthese():
         else:
             return f"ANNÉE {row['Annee']}"
 
-    div_taxe = 1 + PARAMS["taux_tps"] / 100 + PARAMS["taux_tvq"] / 100
-
     # 1. SCAN REVENUS (Transactions) -> Salaire, Net Proprio, Taxes Essence/Lavage
     if os.path.exists(FILE_REVENUS):
         with open(FILE_REVENUS, 'r', encoding='utf-8') as f:
-            for row in csv.DictReader(f):
-                if row['Annee'] != f_annee: continue
-
-                key = get_key(row)
-                if key not in stats: stats[key] = {'brut': 0, 'salaire': 0, 'remettre': 0, 'tps': 0, 'tvq': 0}
-
-                # Sommes basiques (STRICTES)
-                stats[key]['brut'] += safe_float(row['Total_Brut'])
-                stats[key]['salaire'] += safe_float(row['Salaire_Chauffeur'])
-                stats[key]['remettre'] += safe_float(row['Grand_Total_Remis'])
-
-                # Extraction Taxes implicites (Essence/Lavage)
-                for col in ["Essence", "Lavage"]:
-                    val = safe_float(row.get(col, 0))
-                    if val > 0:
-                        ht = val / div_taxe
-                        tps, tvq = ht * PARAMS["taux_tps"] / 100, ht * PARAMS["taux_tvq"] / 100
-                        stats[key]['tps'] += tps
-                        stats[key]['tvq'] += tvq
-                        # Ajout au détail
-                        tree_analyse_det.insert("", tk.END, values=(row['Date_Debut'], f"{col} (Trans.)", f"{tps:.2f}",
-                                                                    f"{tvq:.2f}", f"{val:.2f}"))
+            lignes = [row for row in csv.DictReader(f) if row['Annee'] == f_annee]
+        # Taux en vigueur à la date de chaque semaine, recherchés en une passe pour toute l'année
+        taux_lignes = taux.en_vigueur([row.get('Date_Debut') for row in lignes], PARAMS)
+        for row, tx in zip(lignes, taux_lignes.itertuples(index=False)):
+            div_taxe = 1 + tx.tps / 100 + tx.tvq / 100
+            key = get_key(row)
+            if key not in stats: stats[key] = {'brut': 0, 'salaire': 0, 'remettre': 0, 'tps': 0, 'tvq': 0}
+
+            # Sommes basiques (STRICTES)
+            stats[key]['brut'] += safe_float(row['Total_Brut'])
+            stats[key]['salaire'] += safe_float(row['Salaire_Chauffeur'])
+            stats[key]['remettre'] += safe_float(row['Grand_Total_Remis'])
+
+            # Extraction Taxes implicites (Essence/Lavage)
+            for col in ["Essence", "Lavage"]:
+                val = safe_float(row.get(col, 0))
+                if val > 0:
+                    ht = val / div_taxe
+                    stats[key]['tps'] += ht * tx.tps / 100
+                    stats[key]['tvq'] += ht * tx.tvq / 100
 
     # 2. SCAN DEPENSES (Factures) -> Taxes Dépenses
     if os.path.exists(FILE_DEPENSES):
@@ -545,14 +558,8 @@ def calculer_synthese():
                 key = get_key(row)
                 if key not in stats: stats[key] = {'brut': 0, 'salaire': 0, 'remettre': 0, 'tps': 0, 'tvq': 0}
 
-                tps, tvq = safe_float(row['TPS']), safe_float(row['TVQ'])
-                stats[key]['tps'] += tps
-                stats[key]['tvq'] += tvq
-
-                if tps > 0 or tvq > 0:
-                    tree_analyse_det.insert("", tk.END,
-                                            values=(row['Date'], row['Categorie'], f"{tps:.2f}", f"{tvq:.2f}",
-                                                    row['Montant_Total']))
+                stats[key]['tps'] += safe_float(row['TPS'])
+                stats[key]['tvq'] += safe_float(row['TVQ'])
 
     # 3. REMPLISSAGE TABLEAU SYNTHESE
     for k, v in sorted(stats.items()):
@@ -565,12 +572,52 @@ def calculer_synthese():
             f"{v['tvq']:.2f} $"
         ))
 
+    # 4. DÉTAIL DES TAXES (construit en une passe vectorisée, affiché par page)
+    global DETAIL_TAXES
+    DETAIL_TAXES = construire_detail_annee(f_annee)
+    var_page_det.set(1)
+    afficher_page_detail()
+
+
+DETAIL_TAXES = None
+
+
+def construire_detail_annee(annee):
+    def lire(fichier):
+        if not os.path.exists(fichier): return pd.DataFrame()
+        df = pd.read_csv(fichier, dtype=str, keep_default_na=False)
+        return df[df["Annee"] == annee] if "Annee" in df.columns else df.iloc[0:0]
+
+    df_r = lire(FILE_REVENUS)
+    return detail_taxes.construire_detail_taxes(df_r, lire(FILE_DEPENSES), *taux.taxes_revenus(df_r, PARAMS))
+
+
+def afficher_page_detail(delta=0):
+    for i in tree_analyse_det.get_children(): tree_analyse_det.delete(i)
+    if DETAIL_TAXES is None: return
+    nb = detail_taxes.nb_pages(DETAIL_TAXES)
+    page = min(max(1, var_page_det.get() + delta), nb)
+    var_page_det.set(page)
+    for r in detail_taxes.paginer(DETAIL_TAXES, page).itertuples(index=False):
+        d = r.Date.strftime("%Y-%m-%d") if pd.notna(r.Date) else ""
+        tree_analyse_det.insert("", tk.END, values=(d, r.Source, f"{r.TPS:.2f}", f"{r.TVQ:.2f}", f"{r.Total:.2f}"))
+    lbl_page_det.config(text=f"Page {page} / {nb} ({len(DETAIL_TAXES)} lignes)")
+
+
+def exporter_detail():
+    if DETAIL_TAXES is None or DETAIL_TAXES.empty: messagebox.showwarning("Export", "Aucun détail"); return
+    chemin = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+                                          initialfile=f"detail_taxes_{combo_filt_annee.get()}.csv")
+    if not chemin: return
+    with open(chemin, 'wb') as f: f.write(detail_taxes.exporter_csv(DETAIL_TAXES))
+    messagebox.showinfo("Succès", "Détail exporté")
+
 
 # =============================================================================
 # INTERFACE
 # =============================================================================
 fenetre = tk.Tk()
-fenetre.title("Gestion Taxi - MonTaxi31 - Version Finale")
+fenetre.title(f"Gestion Taxi - {flottes.libelle(FLOTTE)} - Version Finale")
 fenetre.geometry("1280x950")
 
 var_current_trans_id = tk.StringVar()
@@ -591,6 +638,14 @@ if os.path.exists(LOGO_PATH):
         tk.Label(frame_logo, text="MonTaxi31", font=("Arial", 24, "bold"), bg="white").pack()
 else:
     tk.Label(frame_logo, text="MonTaxi31", font=("Arial", 24, "bold"), bg="white").pack()
+if len(flottes.noms()) > 1:
+    f_flotte = tk.Frame(frame_logo, bg="white");
+    f_flotte.pack()
+    tk.Label(f_flotte, text="Flotte :", bg="white").pack(side=tk.LEFT)
+    combo_flotte = ttk.Combobox(f_flotte, values=[flottes.libelle(n) for n in flottes.noms()], state="readonly")
+    combo_flotte.current(flottes.noms().index(FLOTTE));
+    combo_flotte.pack(side=tk.LEFT, padx=5)
+    combo_flotte.bind("<<ComboboxSelected>>", changer_flotte)
 
 notebook = ttk.Notebook(fenetre);
 notebook.pack(pady=10, expand=True, fill="both")
@@ -723,6 +778,14 @@ sb_ad = ttk.Scrollbar(f_det, orient="vertical", command=tree_analyse_det.yview);
 sb_ad.pack(side=tk.RIGHT, fill="y")
 tree_analyse_det.configure(yscrollcommand=sb_ad.set);
 tree_analyse_det.pack(fill="both", expand=True)
+var_page_det = tk.IntVar(value=1)
+f_det_nav = tk.Frame(tab_res);
+f_det_nav.pack(fill="x", padx=10)
+tk.Button(f_det_nav, text="◀", command=lambda: afficher_page_detail(-1)).pack(side=tk.LEFT)
+lbl_page_det = tk.Label(f_det_nav, text="Page 1 / 1");
+lbl_page_det.pack(side=tk.LEFT, padx=5)
+tk.Button(f_det_nav, text="▶", command=lambda: afficher_page_detail(1)).pack(side=tk.LEFT)
+tk.Button(f_det_nav, text="EXPORTER CSV", command=exporter_detail).pack(side=tk.RIGHT)
 
 # DEPENSES
 f_d_form = tk.LabelFrame(tab_dep, text="Dépense", padx=10, pady=10);
@@ -821,7 +884,7 @@ entry_param_appel.insert(0, PARAMS["cout_appel"]);
 entry_param_appel.grid(row=0, column=1)
 tk.Label(lf_p, text="% Chauffeur:").grid(row=1, column=0);
 entry_param_pct = tk.Entry(lf_p, bg=BG_JAUNE);
-entry_param_pct.insert(0, PARAMS["pourcent_chauffeur"]);
+entry_param_pct.insert(0, PARAMS["pct_chauf"]);
 entry_param_pct.grid(row=1, column=1)
 tk.Label(lf_p, text="% Impôt:").grid(row=2, column=0);
 entry_param_impot = tk.Entry(lf_p, bg=BG_JAUNE);
@@ -829,11 +892,11 @@ entry_param_impot.insert(0, PARAMS["taux_impot"]);
 entry_param_impot.grid(row=2, column=1)
 tk.Label(lf_p, text="% TPS:").grid(row=3, column=0);
 entry_param_tps = tk.Entry(lf_p, bg=BG_JAUNE);
-entry_param_tps.insert(0, PARAMS["taux_tps"]);
+entry_param_tps.insert(0, PARAMS["tps"]);
 entry_param_tps.grid(row=3, column=1)
 tk.Label(lf_p, text="% TVQ:").grid(row=4, column=0);
 entry_param_tvq = tk.Entry(lf_p, bg=BG_JAUNE);
-entry_param_tvq.insert(0, PARAMS["taux_tvq"]);
+entry_param_tvq.insert(0, PARAMS["tvq"]);
 entry_param_tvq.grid(row=4, column=1)
 tk.Label(f_p_in, text="Catégories", font="Arial 12 bold").pack(pady=10)
 text_param_cats = tk.Text(f_p_in, height=10, width=40, bg=BG_JAUNE);
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from aiohttp import web
+from sqlalchemy import create_engine
+
+import archives
+import calculs
+import configuration
+import cumuls
+import donnees
+import flottes
+import taux
+
+# --- API JSON EN LECTURE SEULE ---
+# Service HTTP asynchrone local pour les outils de répartition / comptabilité.
+#   python api_montaxi.py --port 8531
+#   GET /api/revenus?annee=2025&taxi=101&page=1&taille=100
+#   GET /api/depenses | /api/chauffeurs | /api/taxis
+#   GET /api/synthese?annee=2025&vue=Trimestre
+#   GET /api/cumuls?annee=2025
+#   GET /api/versions
+#   ?flotte=coop_b sur chaque route : base, archives et config de cette flotte (flottes.json) ; sans paramètre,
+#   la flotte du service (--flotte, ou --db + dossier courant)
+# Chaque réponse porte un ETag dérivé de la version des tables (donnees.versions) : un client qui renvoie
+# If-None-Match reçoit 304 sans relecture. Les résultats sont gardés en cache tant que la version ne change pas.
+TABLES = ["revenus", "depenses", "chauffeurs", "taxis"]
+FILTRES = {"revenus": {"annee": "Annee", "mois": "Mois", "taxi": "Taxi", "chauffeur": "Chauffeur"},
+           "depenses": {"annee": "Annee", "mois": "Mois", "taxi": "Taxi", "chauffeur": "Chauffeur",
+                        "categorie": "Categorie"},
+           "chauffeurs": {}, "taxis": {}}
+TAILLE_DEFAUT = 100
+TAILLE_MAX = 1000
+TAILLE_CACHE = 128
+
+
+# --- CACHE EN MÉMOIRE (LRU, invalidé par la version des tables) ---
+class CacheReponses:
+    def __init__(self, taille=TAILLE_CACHE):
+        self.taille = taille
+        self.entrees = OrderedDict()
+        self.verrous = {}  # clé -> [verrou, nombre de requêtes qui l'utilisent]
+
+    def lire(self, cle, version):
+        e = self.entrees.get(cle)
+        if e is None or e[0] != version: return None
+        self.entrees.move_to_end(cle)
+        return e[1]
+
+    def ecrire(self, cle, version, valeur):
+        self.entrees[cle] = (version, valeur)
+        self.entrees.move_to_end(cle)
+        while len(self.entrees) > self.taille: self.entrees.popitem(last=False)
+
+    @contextlib.asynccontextmanager
+    async def verrou(self, cle):
+        # Une seule lecture en base par clé, même si plusieurs clients arrivent en même temps. Le verrou est
+        # retiré dès que plus personne ne l'attend : le dict reste borné par les requêtes en cours.
+        # (Pas de verrous partagés par hachage : /api/{table} prend la clé "df" sous la clé "page", deux clés
+        # sur le même verrou non réentrant s'y bloqueraient.)
+        v = self.verrous.setdefault(cle, [asyncio.Lock(), 0])
+        v[1] += 1
+        try:
+            async with v[0]: yield
+        finally:
+            v[1] -= 1
+            if not v[1]: del self.verrous[cle]
+
+
+# --- SÉRIALISATION ---
+def vers_json(df):
+    df = df.copy()
+    for c in df.columns:
+        if c in donnees.COLS_DATES:
+            df[c] = df[c].dt.strftime("%Y-%m-%d").fillna("")
+        elif c not in donnees.COLS_MONTANTS + donnees.COLS_ENTIERS and c != donnees.COL_VERSION:
+            df[c] = df[c].astype(str)
+    return df.to_dict("records")
+
+
+def reponse(request, corps, etag):
+    entetes = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in [e.strip() for e in request.headers.get("If-None-Match", "").split(",")]:
+        return web.Response(status=304, headers=entetes)
+    return web.Response(body=corps, content_type="application/json", charset="utf-8", headers=entetes)
+
+
+def calculer_etag(*parties):
+    return '"' + hashlib.sha1("|".join([str(p) for p in parties]).encode("utf-8")).hexdigest()[:20] + '"'
+
+
+# --- SERVICE ---
+class ApiMonTaxi:
+    def __init__(self, engine, config=None, dossier=archives.DOSSIER_ARCHIVES,
+                 fichier_config=configuration.FILE_CONFIG):
+        self.engine = engine
+        self.dossier = dossier  # archives de la flotte servie par défaut
+        self.fichier_config = fichier_config
+        self.config = config  # None : config_taxi.json relu à chaque changement (configuration.charger)
+        self.cache = CacheReponses()
+
+    def _flotte(self, request):
+        # -> (nom, engine, dossier des archives, fichier config) ; le nom fait partie des clés de cache
+        nom = request.query.get("flotte", "")
+        if not nom: return "", self.engine, self.dossier, self.fichier_config
+        if nom not in flottes.noms():
+            raise web.HTTPNotFound(text=json.dumps({"erreur": f"Flotte inconnue '{nom}'"}))
+        return (nom, *flottes.source(nom))
+
+    def _config(self, fichier_config):
+        return self.config or configuration.charger(fichier_config)
+
+    async def _sql(self, fn, *args):
+        # SQLAlchemy est synchrone : exécution dans le pool de threads, connexions du pool de l'engine
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def _versions(self, engine, tables):
+        v = await self._sql(donnees.versions, engine)
+        return tuple([v.get(t, 0) for t in tables])
+
+    async def _memo(self, cle, version, produire):
+        val = self.cache.lire(cle, version)
+        if val is None:
+            async with self.cache.verrou(cle):
+                val = self.cache.lire(cle, version)
+                if val is None:
+                    val = await produire()
+                    self.cache.ecrire(cle, version, val)
+        return val
+
+    async def _servir(self, request, engine, tables, cle, produire):
+        # 1. Version des tables -> ETag : un client à jour reçoit 304 sans aucune lecture de données
+        version = await self._versions(engine, tables)
+        etag = calculer_etag(cle, version)
+        if etag in [e.strip() for e in request.headers.get("If-None-Match", "").split(",")]:
+            return reponse(request, b"", etag)
+
+        # 2. Réponse déjà sérialisée pour cette version ?
+        async def corps():
+            res = await produire(version)
+            return json.dumps(res, ensure_ascii=False, default=str).encode("utf-8")
+
+        return reponse(request, await self._memo(cle, version, corps), etag)
+
+    async def table(self, request):
+        table = request.match_info["table"]
+        if table not in TABLES: raise web.HTTPNotFound(text=json.dumps({"erreur": f"Table inconnue '{table}'"}))
+        q = request.query
+        try:
+            page = max(1, int(q.get("page", 1)))
+            taille = min(TAILLE_MAX, max(1, int(q.get("taille", TAILLE_DEFAUT))))
+        except ValueError:
+            raise web.HTTPBadRequest(text=json.dumps({"erreur": "page / taille doivent être des entiers"}))
+        where = tuple(sorted([(col, q[p]) for p, col in FILTRES[table].items() if q.get(p)]))
+        nom, engine, _, _ = self._flotte(request)
+
+        async def produire(version):
+            # Le jeu filtré complet reste en cache : changer de page ne relit pas la table
+            df = await self._memo(("df", nom, table, where), version,
+                                  lambda: self._sql(donnees.load_data, engine, table, None, dict(where) or None))
+            lignes = df.iloc[(page - 1) * taille: page * taille]
+            return {"table": table, "page": page, "taille": taille, "total": len(df),
+                    "pages": max(1, -(-len(df) // taille)), "lignes": vers_json(lignes)}
+
+        return await self._servir(request, engine, [table], ("page", nom, table, where, page, taille), produire)
+
+    async def synthese(self, request):
+        annee, vue = request.query.get("annee", ""), request.query.get("vue", "Mois")
+        if not annee or vue not in calculs.VUES:
+            raise web.HTTPBadRequest(text=json.dumps({"erreur": f"annee requise, vue parmi {list(calculs.VUES)}"}))
+
+        nom, engine, dossier, fichier_config = self._flotte(request)
+        config = self._config(fichier_config)
+        # Les taux (et leur historique) font partie de la clé : un changement de taux invalide le cache
+        cle_taux = json.dumps(taux.historique(config).values.tolist())
+
+        def calcul():
+            if archives.est_archivee(annee, dossier):
+                tot = archives.lire_totaux(annee, vue, dossier)
+                final = calculs.assembler_synthese(tot[calculs.TOTAUX_REVENUS], tot[calculs.TOTAUX_DEPENSES])
+            else:
+                df_r = donnees.load_data(engine, "revenus", ["Date_Debut", "Mois", "Annee", "Trimestre",
+                                                                  "Total_Brut", "Salaire_Chauffeur",
+                                                                  "Grand_Total_Remis", "Essence", "Lavage"],
+                                         {"Annee": annee})
+                df_d = donnees.load_data(engine, "depenses", ["Date", "Mois", "Annee", "Trimestre",
+                                                                   "Montant_Total", "TPS", "TVQ"], {"Annee": annee})
+                final = calculs.calculer_synthese(df_r, df_d, vue, *taux.taxes_revenus(df_r, config))
+            final.index = final.index.astype(str)
+            return {"annee": annee, "vue": vue, "periodes": final.round(2).reset_index(names="Periode").to_dict(
+                "records")}
+
+        return await self._servir(request, engine, ["revenus", "depenses"], ("synthese", nom, annee, vue, cle_taux),
+                                  lambda version: self._sql(calcul))
+
+    async def cumuls_mensuels(self, request):
+        annee = request.query.get("annee", "")
+        nom, engine, _, _ = self._flotte(request)
+
+        def calcul():
+            df = cumuls.charger(engine, [annee] if annee else None)
+            return {"annee": annee or None, "lignes": df.round(2).to_dict("records")}
+
+        return await self._servir(request, engine, [cumuls.TABLE_CUMULS], ("cumuls", nom, annee),
+                                  lambda version: self._sql(calcul))
+
+    async def versions(self, request):
+        return web.json_response(await self._sql(donnees.versions, self._flotte(request)[1]))
+
+    async def sante(self, request):
+        return web.json_response({"statut": "ok", "tables": TABLES})
+
+
+def creer_app(engine, config=None, dossier=archives.DOSSIER_ARCHIVES, fichier_config=configuration.FILE_CONFIG):
+    api = ApiMonTaxi(engine, config, dossier, fichier_config)
+    app = web.Application()
+    app.add_routes([web.get("/", api.sante), web.get("/api/versions", api.versions),
+                    web.get("/api/synthese", api.synthese), web.get("/api/cumuls", api.cumuls_mensuels),
+                    web.get("/api/{table}", api.table)])
+    return app
+
+
+def main():
+    p = argparse.ArgumentParser(description="API JSON en lecture seule sur les données MonTaxi.")
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"))
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte servie par défaut (base, archives et config de flottes.json ; remplace --db)")
+    p.add_argument("--hote", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8531)
+    p.add_argument("--connexions", type=int, default=5, help="taille du pool de connexions SQL")
+    a = p.parse_args()
+
+    url, dossier, fichier_config = a.db, archives.DOSSIER_ARCHIVES, configuration.FILE_CONFIG
+    if a.flotte:
+        url, dossier, fichier_config = (flottes.url(a.flotte), flottes.fichier(a.flotte, "archives"),
+                                        flottes.fichier(a.flotte, "config"))
+    engine = create_engine(url, pool_size=a.connexions, max_overflow=a.connexions, pool_pre_ping=True)
+    web.run_app(creer_app(engine, None, dossier, fichier_config), host=a.hote, port=a.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,36 +2,47 @@ import streamlit as st
 from streamlit_option_menu import option_menu
 import pandas as pd
 import os
-import json
+import tempfile
 import uuid
-import re
-import pdfplumber
-from pypdf import PdfReader
-from datetime import datetime, timedelta
+from datetime import datetime
 import sqlalchemy
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
+import archives
+import partitions
+import detail_taxes
+import donnees
+import appariement
+import calculs
+import configuration
+import taux
+import diagnostics
+import flottes
+import cumuls
+import recherche
+import audit_compteurs
 
 # --- CONFIGURATION PAGE ---
 st.set_page_config(page_title="MonTaxi31", page_icon="🚖", layout="wide")
-
-# --- CONNEXION SQL ---
-DB_CONNECTION = "mysql+pymysql://root:@localhost/montaxi31_db"
+diagnostics.debut_rerun()
+
+# --- FLOTTE ET CONNEXION SQL ---
+# Une base + un dossier de données par flotte (flottes.json, voir flottes.py) ; ?flotte=coop_b ouvre une flotte.
+# Sans flottes.json : MONTAXI_DB (ex : sqlite:///montaxi31.db) et le dossier courant, comme avant.
+# Le moteur de chaque flotte est créé une fois par processus (pool borné) : changer de flotte ne coûte qu'une
+# connexion prise dans son pool.
+if st.session_state.get("flotte") not in flottes.noms():
+    st.session_state.flotte = st.query_params.get("flotte") if st.query_params.get("flotte") in flottes.noms() \
+        else flottes.defaut()
+FLOTTE = st.session_state.flotte
+DOSSIER_ARCHIVES = flottes.fichier(FLOTTE, "archives")
 try:
-    engine = create_engine(DB_CONNECTION)
+    engine = diagnostics.instrumenter_moteur(flottes.moteur(FLOTTE))
     with engine.connect() as conn:
         pass
 except Exception as e:
     st.error(f"🚨 Erreur SQL : {e}. Vérifiez XAMPP.")
     st.stop()
 
-# --- CONFIGURATION ---
-FILE_CONFIG = "config_taxi.json"
-DEFAULT_CONFIG = {
-    "cout_appel": 1.05, "pct_chauf": 40.0, "taux_impot": 18.0,
-    "tps": 5.0, "tvq": 9.975,
-    "categories": ["Réparation mécanique", "Carrosserie", "Pneus", "Assurance", "SAAQ", "Admin", "Pièces", "Autre"]
-}
-
 
 # --- FONCTIONS UTILITAIRES ---
 def safe_float(valeur):
@@ -42,205 +53,239 @@ def safe_float(valeur):
         return 0.0
 
 
-def charger_config():
-    # 1. Chargement par défaut
-    config = DEFAULT_CONFIG.copy()
-    # 2. Tentative lecture fichier
-    if os.path.exists(FILE_CONFIG):
-        try:
-            with open(FILE_CONFIG, 'r', encoding='utf-8') as f:
-                saved = json.load(f)
-            if "cats" in saved: saved["categories"] = saved.pop("cats")
-            config.update(saved)
-        except:
-            pass
-
-    # 3. Sécurité Clés manquantes (Force l'ajout si tps/tvq absents)
-    for k, v in DEFAULT_CONFIG.items():
-        if k not in config: config[k] = v
-
-    # 4. Sauvegarde immédiate pour réparer le fichier
-    with open(FILE_CONFIG, 'w', encoding='utf-8') as f:
-        json.dump(config, f, indent=4)
-    return config
+# --- CONFIGURATION (configuration.py : relue seulement si le fichier change ; une par flotte) ---
+FILE_CONFIG = flottes.fichier(FLOTTE, "config")
+CONFIG = configuration.charger(FILE_CONFIG)
 
 
-def save_config(cfg):
-    with open(FILE_CONFIG, 'w', encoding='utf-8') as f: json.dump(cfg, f, indent=4)
-
-
-CONFIG = charger_config()
-
-
-def verifier_tables_sql():
-    schemas = {
-        "taxis": ["Taxi_ID", "Immatriculation", "Chauffeur_Defaut", "UUID"],
-        "chauffeurs": ["Nom", "Prenom", "License_ID", "Adresse", "Matricule", "Telephone", "Note", "UUID"],
-        "depenses": ["Date", "Mois", "Annee", "Trimestre", "Taxi", "Chauffeur", "Categorie", "Details", "Montant_HT",
-                     "TPS", "TVQ", "Montant_Total", "UUID"],
-        "revenus": ["Date_Debut", "Date_Fin", "Mois", "Annee", "Trimestre", "Taxi", "Chauffeur",
-                    "Meter_Deb", "Meter_Fin", "Meter_Total", "Fixe", "Total_Brut", "Nb_Appels",
-                    "Redevance", "Base_Salaire", "Salaire_Chauffeur", "STS", "Credits", "Prix_Fixes",
-                    "Visa", "Essence", "Lavage", "Divers", "Impot", "Grand_Total_Remis", "UUID"]
-    }
+@st.cache_resource(show_spinner=False)
+def verifier_tables_sql(flotte):
+    # Une seule fois par flotte (moteur) et par processus : tables, partitions, colonnes, cumuls, index de recherche.
+    # 'engine' / DOSSIER_ARCHIVES sont ceux de 'flotte' (en-tête FLOTTE ci-dessus)
+    schemas = donnees.SCHEMAS
     try:
+        # revenus / depenses : partitionnés par année (voir partitions.py)
+        for table in partitions.TABLES_PARTITIONNEES:
+            try:
+                partitions.creer_ou_convertir(engine, table, schemas[table])
+            except Exception as e:
+                st.warning(f"Partitionnement '{table}' : {e}")
         with engine.connect() as conn:
             for table, cols in schemas.items():
+                if table in partitions.TABLES_PARTITIONNEES: continue
                 try:
                     conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1"))
                 except:
                     df = pd.DataFrame(columns=cols)
                     dtypes = {c: sqlalchemy.types.Text() for c in cols}
                     df.to_sql(table, engine, if_exists='fail', index=False, dtype=dtypes)
+        try:
+            donnees.migrer_colonnes(engine)
+        except Exception as e:
+            st.warning(f"Migration des colonnes : {e}")
+        cumuls.assurer(engine, DOSSIER_ARCHIVES)
+        try:
+            recherche.assurer(engine)
+        except Exception as e:
+            st.warning(f"Index de recherche : {e}")
     except:
         pass
 
 
-def load_data(table):
+@diagnostics.chronometrer("load_data")
+def load_data(table, columns=None, where=None):
+    # Projection + filtres paramétrés, types corrects en une passe (voir donnees.py)
     try:
-        df = pd.read_sql(f"SELECT * FROM {table}", engine)
-        if "UUID" not in df.columns: df["UUID"] = [str(uuid.uuid4()) for _ in range(len(df))]
-        cols_str = ["Nom", "Prenom", "Taxi", "Chauffeur", "Date_Debut", "Date", "License_ID", "Adresse", "Taxi_ID",
-                    "Categorie"]
-        for c in cols_str:
-            if c in df.columns: df[c] = df[c].astype(str).replace('nan', '').replace('None', '')
-        return df
+        return donnees.load_data(engine, table, columns, where)
     except:
-        return pd.DataFrame()
+        return pd.DataFrame(columns=columns or donnees.SCHEMAS.get(table, []))
 
 
-def save_data(table, df):
-    df = df.astype(str)
-    df.to_sql(table, engine, if_exists='replace', index=False)
+def rafraichir_cumuls(table, mois=None):
+    # Cumuls Analytique : seuls les mois touchés sont recalculés (tout, si non précisés)
+    if table not in cumuls.TABLES_SOURCES: return
+    try:
+        if mois is not None: cumuls.rafraichir(engine, mois, DOSSIER_ARCHIVES)
+        else: cumuls.reconstruire(engine, DOSSIER_ARCHIVES)
+    except Exception as e:
+        st.warning(f"Cumuls non mis à jour : {e}")
+    charger_cumuls.clear(FLOTTE)
 
 
-# --- INTELLIGENCE PDF (TRIPLE MOTEUR) ---
-def analyser_pdf(uploaded_file):
-    data = {}
-    debug_log = "--- DIAGNOSTIC LECTURE ---\n"
-    full_text = ""
+# --- ÉCRITURE D'UNE FICHE (concurrence optimiste, voir donnees.py) ---
+# Seule la ligne concernée est écrite, par UUID ; une fiche chargée n'est modifiée / supprimée que si
+# personne ne l'a changée depuis son chargement (edit_version). Sinon : message, rien n'est écrasé.
+MSG_CONFLIT = ("⚠️ Cette fiche a été modifiée ou supprimée sur un autre poste depuis son chargement : "
+               "rien n'a été enregistré. Rechargez-la depuis l'historique puis refaites la modification.")
 
-    # 1. SAUVEGARDE TEMP (Contourne bug mémoire)
-    with open("temp_scan.pdf", "wb") as f:
-        f.write(uploaded_file.getbuffer())
 
-    # MOTEUR A : PYPDF (Texte Brut)
+@diagnostics.chronometrer("enregistrer_ligne")
+def enregistrer_ligne(table, ligne, mois=None):
     try:
-        reader = PdfReader("temp_scan.pdf")
-        for page in reader.pages: full_text += (page.extract_text() or "") + "\n"
-        if len(full_text.strip()) > 10: debug_log += f"✅ PyPDF : {len(full_text)} chars lus.\n"
-    except Exception as e:
-        debug_log += f"❌ PyPDF : {e}\n"
+        if st.session_state.edit_mode:
+            donnees.modifier_ligne(engine, table, ligne, st.session_state.edit_version)
+        else:
+            donnees.inserer_ligne(engine, table, ligne)
+    except donnees.ConflitVersion:
+        st.error(MSG_CONFLIT); return False
+    rafraichir_cumuls(table, mois)
+    return True
 
-    # MOTEUR B : PDFPLUMBER (Texte Layout + Tableaux)
-    if len(full_text.strip()) < 10:
-        try:
-            with pdfplumber.open("temp_scan.pdf") as pdf:
-                page = pdf.pages[0]
-                full_text = page.extract_text(layout=True) or ""
-                # Ajout contenu tableaux
-                tables = page.extract_tables()
-                for t in tables:
-                    for r in t:
-                        clean = " ".join([str(c) for c in r if c])
-                        full_text += "\n" + clean
-            if len(full_text.strip()) > 10: debug_log += f"✅ PDFPlumber : {len(full_text)} chars lus.\n"
-        except Exception as e:
-            debug_log += f"❌ PDFPlumber : {e}\n"
-
-    # NETTOYAGE
-    if os.path.exists("temp_scan.pdf"): os.remove("temp_scan.pdf")
-
-    # DIAGNOSTIC FINAL
-    if not full_text.strip():
-        return None, debug_log + "\n🚨 RÉSULTAT : FICHIER VIDE OU IMAGE.\nCe PDF est un scan. Le logiciel ne peut pas lire les pixels.\nSolution : Saisissez les montants manuellement."
-
-    # --- EXTRACTION DES DONNÉES ---
-    # On remplace les sauts de ligne multiples par un espace pour faciliter la regex
-    text_search = re.sub(r'\s+', ' ', full_text)
-
-    def find(keywords):
-        if isinstance(keywords, str): keywords = [keywords]
-        for k in keywords:
-            # Regex : Mot clé ... chiffres
-            # On cherche un motif large : Mot clé + jusqu'à 100 caractères + un montant
-            pattern = rf"{re.escape(k)}.*?(-?[\d\s]+[.,]\d{{2}})"
-            match = re.search(pattern, text_search, re.IGNORECASE)
-            if match:
-                try:
-                    val = float(match.group(1).replace(' ', '').replace(',', '.'))
-                    debug_log += f"   [OK] {k} -> {val}\n"
-                    return abs(val)
-                except:
-                    pass
-        return 0.0
 
-    data["Meter_Total"] = find(["TOTAL SEMAINE METER", "TOTAL METER", "TOTAL:"])
-    data["Fixe"] = find(["MONTANTS FIXES", "MONTANT FIXE"])
-    data["STS"] = find(["TOTAUX STS", "STS"])
-    data["Credits"] = find(["TOTAUX CREDITS", "CREDITS"])
-    data["Prix_Fixes"] = find(["TOTAUX PRIX FIXES", "PRIX FIXES"])
-    data["Visa"] = find(["TOTAUX VISE", "TOTAUX VISA", "DEBIT"])
-    data["Essence"] = find(["TOTAUX ESSENCE", "ESSENCE"])
-    data["Lavage"] = find(["LAVAGE AUTO", "LAVAGE"])
-    data["Divers"] = find(["DEPENSES"])
-    data["Impot"] = find(["POUR IMPOT", "IMPOT"])
-
-    # Appels (Entier)
-    app_money = find(["NOMBRES D'APPELS X", "APPELS X"])
-    if app_money > 0:
-        data["Nb_Appels"] = int(round(app_money / CONFIG["cout_appel"]))
-    else:
-        m = re.search(r"NOMBRES D'APPELS.*?(\d+)", text_search, re.IGNORECASE)
-        if m:
-            data["Nb_Appels"] = int(m.group(1))
+@diagnostics.chronometrer("supprimer_ligne")
+def supprimer_ligne(table, mois=None):
+    try:
+        donnees.supprimer_ligne(engine, table, st.session_state.edit_id, st.session_state.edit_version)
+    except donnees.ConflitVersion:
+        st.error(MSG_CONFLIT); return False
+    rafraichir_cumuls(table, mois)
+    return True
+
+
+# --- ÉDITION EN GRILLE (Transactions / Dépenses) ---
+# La grille part d'un instantané du mois (gardé en session) ; à l'application, seules les lignes ajoutées /
+# modifiées / supprimées par rapport à cet instantané sont écrites, en une transaction (donnees.appliquer_lot).
+GRILLE = {
+    "revenus": {"date": "Date_Debut", "requis": ["Date_Debut", "Taxi", "Chauffeur"],
+                "saisie": ["Date_Debut", "Taxi", "Chauffeur", *calculs.SAISIES],
+                "calcul": ["Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis"]},
+    "depenses": {"date": "Date", "requis": ["Date", "Taxi"],
+                 "saisie": ["Date", "Taxi", "Chauffeur", "Categorie", "Details", "Montant_Total", "Taxes_Incluses"],
+                 "calcul": ["Montant_HT", "TPS", "TVQ"]},
+}
+
+
+def choisir_mois_grille(df, table):
+    mois = sorted([m for m in df["Mois"].astype(str).unique() if m], reverse=True) if not df.empty else []
+    return st.selectbox("Mois", mois or [datetime.now().strftime("%Y-%m")], key=f"grille_mois_{table}")
+
+
+def instantane_grille(table, mois, df):
+    # Même instantané d'un rerun à l'autre : les versions lues sont celles affichées quand la grille a été ouverte
+    cle = f"grille_{table}"
+    if st.session_state.get(cle, (None,))[0] != mois:
+        snap = df[df["Mois"].astype(str) == mois].copy()
+        for c in ["Taxi", "Chauffeur", "Categorie"]:
+            if c in snap.columns: snap[c] = snap[c].astype(str)
+        if table == "depenses": snap["Taxes_Incluses"] = (snap["TPS"] + snap["TVQ"]) > 0
+        snap = snap.sort_values(GRILLE[table]["date"]).reset_index(drop=True)
+        # Nouveau jeton -> nouvelle clé de data_editor : les éditions de l'ancienne grille ne sont pas rejouées
+        st.session_state.grille_jeton = st.session_state.get("grille_jeton", 0) + 1
+        st.session_state[cle] = (mois, st.session_state.grille_jeton, snap)
+    return st.session_state[cle][1], st.session_state[cle][2]
+
+
+def fermer_grille(table):
+    st.session_state.pop(f"grille_{table}", None)
+
+
+@diagnostics.chronometrer("appliquer_grille")
+def appliquer_grille(table, avant, apres):
+    g = GRILLE[table]
+    incompletes = apres[g["requis"]].isna().any(axis=1) | (apres[g["requis"]].astype(str) == "").any(axis=1)
+    if incompletes.any():
+        st.error(f"⚠️ {int(incompletes.sum())} ligne(s) incomplète(s) : {', '.join(g['requis'])} requis.")
+        return False
+    ajouts, modifiees, supprimees = donnees.diff_lignes(avant, apres, g["saisie"])
+    if ajouts.empty and modifiees.empty and supprimees.empty:
+        st.info("Aucune modification."); return False
+
+    if table == "revenus" and not ajouts.empty:
+        # Comme le formulaire : une nouvelle semaine ne doit pas déjà exister pour ce taxi
+        autres = load_data("revenus", ["Date_Debut", "Taxi", "UUID"], {"Annee": sorted(ajouts["Annee"].unique())})
+        cles = pd.concat([autres[~autres["UUID"].isin(supprimees["UUID"])], ajouts])
+        dup = cles.duplicated(["Date_Debut", "Taxi"], keep=False) & cles["UUID"].isin(ajouts["UUID"])
+        if dup.any():
+            st.error(f"Doublon détecté : {int(dup.sum())} nouvelle(s) semaine(s) déjà saisie(s) pour ce taxi.")
+            return False
+
+    mois = pd.concat([ajouts["Mois"], modifiees["Mois"], supprimees["Mois"],
+                      avant[avant["UUID"].isin(modifiees["UUID"])]["Mois"]]).astype(str).tolist()
+    try:
+        res = donnees.appliquer_lot(engine, table, ajouts, modifiees, supprimees)
+    except donnees.ConflitVersion as e:
+        st.error(f"⚠️ {len(e.uuids)} ligne(s) modifiée(s) ou supprimée(s) sur un autre poste depuis l'ouverture "
+                 f"de la grille : aucune modification appliquée. Rechargez la grille puis recommencez.")
+        return False
+    rafraichir_cumuls(table, mois)
+    fermer_grille(table)
+    st.toast(f"{res['ajoutees']} ajoutée(s), {res['modifiees']} modifiée(s), {res['supprimees']} supprimée(s)")
+    return True
+
+
+def grille(table, df, l_taxis, l_chauf):
+    g = GRILLE[table]
+    c1, c2 = st.columns([1, 3])
+    with c1: mois = choisir_mois_grille(df, table)
+    jeton, avant = instantane_grille(table, mois, df)
+    cfg = {"UUID": None,
+           g["date"]: st.column_config.DateColumn(format="YYYY-MM-DD", required=True),
+           "Taxi": st.column_config.SelectboxColumn(options=l_taxis[1:], required=True),
+           "Chauffeur": st.column_config.SelectboxColumn(options=l_chauf[1:], required=table == "revenus"),
+           **{c: st.column_config.NumberColumn(format="%.2f $", disabled=True) for c in g["calcul"]}}
+    if table == "depenses":
+        cfg["Categorie"] = st.column_config.SelectboxColumn(options=CONFIG["categories"])
+        cfg["Taxes_Incluses"] = st.column_config.CheckboxColumn("Taxes incluses ?", default=False)
+    c2.caption(f"{len(avant)} ligne(s). Les colonnes grisées sont recalculées à l'application.")
+    apres = st.data_editor(avant[[*g["saisie"], *g["calcul"], "UUID"]], column_config=cfg, num_rows="dynamic",
+                           hide_index=True, use_container_width=True, key=f"editeur_{table}_{jeton}")
+
+    c1, c2 = st.columns([2, 1])
+    if c1.button("Appliquer les modifications", type="primary", use_container_width=True):
+        if table == "revenus":
+            apres = calculs.recalculer_revenus(apres, CONFIG)
         else:
-            data["Nb_Appels"] = 0
+            apres = calculs.recalculer_depenses(apres, apres["Taxes_Incluses"].fillna(False), CONFIG)
+        if appliquer_grille(table, avant, apres): st.rerun(scope="app")
+    if c2.button("Recharger la grille", use_container_width=True):
+        fermer_grille(table); st.rerun(scope="app")
 
-    # Date & Taxi
-    # On cherche les motifs dans le texte brut original (avec sauts de ligne) pour la précision
-    mt = re.search(r"NO[:\s]*(\d+)", full_text);
-    if mt: data["Taxi"] = mt.group(1)
 
-    mc = re.search(r"CHAUFFEUR[:\s]*(.+)", full_text)
-    if mc:
-        row = mc.group(1).split("NO:")[0]
-        data["Chauffeur_Raw"] = row.strip()
+@st.cache_data(ttl=600)
+def charger_cumuls(flotte, annees):
+    return cumuls.charger(flottes.moteur(flotte), list(annees))
 
-    md = re.search(r"LUNDI[:\s]*(\d{1,2})[\s\n]+([a-zA-Zéû]+)", full_text, re.IGNORECASE)
-    if md:
-        try:
-            d, m_txt = int(md.group(1)), md.group(2).lower()[:3]
-            m_map = {"jan": 1, "fev": 2, "fév": 2, "mar": 3, "avr": 4, "mai": 5, "jui": 6, "juil": 7, "aou": 8,
-                     "aoû": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12, "déc": 12}
-            m_num = 4
-            for k, v in m_map.items():
-                if k in m_txt: m_num = v
-            data["Date_Debut"] = datetime(datetime.now().year, m_num, d)
-        except:
-            pass
 
-    return data, debug_log
+@st.cache_data(ttl=600)
+def audit_flotte(flotte, version, seuil):
+    # version (versions_tables) : l'audit n'est refait qu'après une écriture ou un archivage des revenus
+    df = audit_compteurs.charger(flottes.moteur(flotte), flottes.fichier(flotte, "archives"))
+    return len(df), audit_compteurs.auditer(df, seuil)
+
+
+# --- INTELLIGENCE PDF (voir lecture_pdf.py) ---
+@diagnostics.chronometrer("analyser_pdf")
+def analyser_pdf(uploaded_file):
+    import lecture_pdf  # différé : pypdf / pdfplumber ne sont chargés qu'au premier import de PDF
+    return lecture_pdf.analyser_pdf(uploaded_file.getvalue(), taux.actuels(CONFIG)["cout_appel"])
 
 
 # --- HELPERS ---
 def get_liste_chauffeurs():
-    return (load_data("chauffeurs")["Nom"] + " " + load_data("chauffeurs")["Prenom"]).tolist()
+    df = load_data("chauffeurs", columns=["Nom", "Prenom"])
+    return (df["Nom"] + " " + df["Prenom"]).tolist()
 
 
 def get_liste_taxis():
-    return sorted(load_data("taxis")["Taxi_ID"].unique().tolist())
+    return sorted(load_data("taxis", columns=["Taxi_ID"])["Taxi_ID"].unique().tolist())
+
+
+@st.cache_resource
+def index_chauffeurs(flotte):
+    # Index d'appariement (jetons, trigrammes, matricules) par flotte : reconstruit seulement après modification
+    e = flottes.moteur(flotte)
+    return appariement.IndexChauffeurs(donnees.load_data(e, "chauffeurs"),
+                                       donnees.load_data(e, "taxis", columns=["Taxi_ID", "Chauffeur_Defaut"]))
 
 
 def get_default_driver(taxi_id):
-    df = load_data("taxis")
-    res = df[df["Taxi_ID"].astype(str) == str(taxi_id)]
+    res = load_data("taxis", columns=["Chauffeur_Defaut"], where={"Taxi_ID": str(taxi_id)})
     if not res.empty: return res.iloc[0]["Chauffeur_Defaut"]
     return None
 
 
 # --- INIT ---
-verifier_tables_sql()
+verifier_tables_sql(FLOTTE)
 
 # --- SESSION STATE ---
 keys_defaults = {
@@ -254,6 +299,7 @@ for k, v in keys_defaults.items():
 
 if 'edit_mode' not in st.session_state: st.session_state.edit_mode = False
 if 'edit_id' not in st.session_state: st.session_state.edit_id = None
+if 'edit_version' not in st.session_state: st.session_state.edit_version = 0
 if 'form_data' not in st.session_state: st.session_state.form_data = {}
 if 'form_date' not in st.session_state: st.session_state.form_date = datetime.now()
 if 'form_taxi' not in st.session_state: st.session_state.form_taxi = ""
@@ -261,6 +307,11 @@ if 'form_chauf' not in st.session_state: st.session_state.form_chauf = ""
 if 'debug_log' not in st.session_state: st.session_state.debug_log = ""
 
 
+CHAMPS_FORMULAIRE = {"Meter_Deb": "t_m_deb", "Meter_Fin": "t_m_fin", "Fixe": "t_fixe", "Nb_Appels": "t_nb",
+                     "STS": "t_sts", "Credits": "t_crd", "Visa": "t_visa", "Essence": "t_ess", "Lavage": "t_lav",
+                     "Divers": "t_div", "Prix_Fixes": "t_pf", "Impot": "t_imp"}
+
+
 def update_session_data(data):
     st.session_state.form_data = data
     if "Date_Debut" in data:
@@ -271,25 +322,28 @@ def update_session_data(data):
     if "Taxi" in data: st.session_state.form_taxi = str(data["Taxi"])
     if "Chauffeur" in data: st.session_state.form_chauf = str(data["Chauffeur"])
 
-    if "Meter_Total" in data and data["Meter_Total"] > 0:
-        st.session_state["t_m_deb"] = 0.0
-        st.session_state["t_m_fin"] = safe_float(data["Meter_Total"])
-    else:
-        st.session_state["t_m_deb"] = safe_float(data.get("Meter_Deb", 0))
-        st.session_state["t_m_fin"] = safe_float(data.get("Meter_Fin", 0))
-
-    st.session_state["t_fixe"] = safe_float(data.get("Fixe", 0))
-    st.session_state["t_nb"] = int(data.get("Nb_Appels", 0))
-    st.session_state["t_sts"] = safe_float(data.get("STS", 0))
-    st.session_state["t_crd"] = safe_float(data.get("Credits", 0))
-    st.session_state["t_visa"] = safe_float(data.get("Visa", 0))
-    st.session_state["t_ess"] = safe_float(data.get("Essence", 0))
-    st.session_state["t_lav"] = safe_float(data.get("Lavage", 0))
-    st.session_state["t_div"] = safe_float(data.get("Divers", 0))
-    st.session_state["t_pf"] = safe_float(data.get("Prix_Fixes", 0))
-    st.session_state["t_imp"] = safe_float(data.get("Impot", 0))
+    saisie = calculs.saisie_depuis_pdf(data)
+    for champ, cle in CHAMPS_FORMULAIRE.items(): st.session_state[cle] = saisie[champ]
 
     if "Taxi" in data: st.session_state["t_taxi_wdg"] = str(data["Taxi"])
+    if "Chauffeur" in data: st.session_state["t_chauf_wdg"] = str(data["Chauffeur"])
+
+
+def ouvrir_fiche(r):
+    # Fiche chargée en édition ; la version lue sert au contrôle de concurrence à l'enregistrement
+    st.session_state.edit_mode = True
+    st.session_state.edit_id = r["UUID"]
+    st.session_state.edit_version = int(r.get("Version", 0))
+
+
+def fiche_recherche(table, df):
+    # Résultat de recherche ouvert depuis une autre page -> ligne à charger ici (None si rien en attente)
+    cible = st.session_state.get("fiche_recherche")
+    if not cible or cible[0] != table: return None
+    del st.session_state["fiche_recherche"]
+    r = df[df["UUID"].astype(str) == str(cible[1])]
+    if r.empty: st.warning("Fiche introuvable (supprimée ou archivée depuis la recherche)."); return None
+    return r.iloc[0]
 
 
 def reset_form():
@@ -301,54 +355,115 @@ def reset_form():
     st.session_state.form_chauf = ""
     st.session_state.debug_log = ""
     for k, v in keys_defaults.items(): st.session_state[k] = v
+    for k in ["t_taxi_wdg", "t_chauf_wdg"]: st.session_state.pop(k, None)
+
+
+# --- CHOIX DE LA FLOTTE (seulement si flottes.json en décrit plusieurs) ---
+def changer_flotte():
+    # Les fiches / grilles / exports en cours appartiennent à l'ancienne flotte
+    reset_form()
+    for k in ["grille_revenus", "grille_depenses", "fiche_recherche", "decl_export"]: st.session_state.pop(k, None)
+    st.query_params["flotte"] = st.session_state.flotte
+
 
+if len(flottes.noms()) > 1:
+    st.selectbox("Flotte", flottes.noms(), format_func=flottes.libelle, key="flotte", on_change=changer_flotte)
 
 # --- MENU ---
+# Page "Diagnostics" cachée : accessible avec ?diag=1 dans l'URL ; ?page=Synthèse ouvre directement une page
+menu_options = ["Transactions", "Dépenses", "Chauffeurs", "Flotte Taxis", "Synthèse", "Analytique", "Audit",
+                "Paramètres"]
+menu_icons = ["receipt", "wrench", "person-badge", "car-front", "graph-up", "bar-chart-line", "shield-check", "gear"]
+if st.query_params.get("diag") == "1": menu_options.append("Diagnostics"); menu_icons.append("speedometer")
+page_initiale = menu_options.index(st.query_params["page"]) if st.query_params.get("page") in menu_options else 0
 selected_menu = option_menu(
     menu_title=None,
-    options=["Transactions", "Dépenses", "Chauffeurs", "Flotte Taxis", "Synthèse", "Paramètres"],
-    icons=["receipt", "wrench", "person-badge", "car-front", "graph-up", "gear"],
-    menu_icon="cast", default_index=0, orientation="horizontal",
+    options=menu_options,
+    icons=menu_icons,
+    menu_icon="cast", default_index=page_initiale, orientation="horizontal",
     styles={"container": {"padding": "0!important", "background-color": "#f0f2f6"},
             "nav-link-selected": {"background-color": "#008CBA"}}
 )
 
+# --- RECHERCHE GLOBALE (index plein texte, voir recherche.py) ---
+PAGES_RECHERCHE = {"revenus": "Transactions", "depenses": "Dépenses", "chauffeurs": "Chauffeurs"}
+
+
+@st.fragment
+def fragment_recherche():
+    with st.expander("🔎 Recherche", expanded=bool(st.session_state.get("rech_q"))):
+        c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+        q = c1.text_input("Rechercher", key="rech_q", placeholder="ex : frein 122, Tremblay, lavage...")
+        taxi = c2.selectbox("Taxi", [""] + get_liste_taxis(), key="rech_taxi")
+        du = c3.date_input("Du", value=None, key="rech_du")
+        au = c4.date_input("Au", value=None, key="rech_au")
+        if not q.strip(): return
+        try:
+            with diagnostics.chrono("recherche"):
+                t0 = datetime.now()
+                res = recherche.chercher(engine, q, taxi=taxi or None, debut=du, fin=au)
+                ms = (datetime.now() - t0).total_seconds() * 1000
+        except Exception as e:
+            st.warning(f"Recherche indisponible : {e}"); return
+        plus = " (les plus pertinents)" if len(res) >= recherche.LIMITE else ""
+        st.caption(f"{len(res)} résultat(s) en {ms:.0f} ms{plus}")
+        if res.empty: return
+        res["Page"] = res["Source"].map(PAGES_RECHERCHE)
+        evt = st.dataframe(res[["Page", "Date", "Taxi", "Texte"]], on_select="rerun", selection_mode="single-row",
+                           use_container_width=True, hide_index=True)
+        if evt.selection.rows and st.button("Ouvrir la fiche", type="primary"):
+            hit = res.iloc[evt.selection.rows[0]]
+            st.session_state.fiche_recherche = (hit["Source"], hit["UUID"])
+            st.query_params["page"] = hit["Page"]
+            st.rerun(scope="app")
+
+
+fragment_recherche()
+
 # =============================================================================
 # 1. TRANSACTIONS
 # =============================================================================
 if selected_menu == "Transactions":
     st.subheader("📒 Revenus Hebdomadaires")
+    if st.session_state.pop("reset_demande", False): reset_form()
     df_rev = load_data("revenus")
+    fiche = fiche_recherche("revenus", df_rev)
+    if fiche is not None:
+        st.session_state["grille_on_revenus"] = False
+        ouvrir_fiche(fiche); update_session_data(fiche.to_dict())
     l_taxis = [""] + get_liste_taxis()
     l_chauf = [""] + get_liste_chauffeurs()
+    en_grille = st.toggle("✏️ Édition en grille (par mois)", key="grille_on_revenus")
+    if not en_grille: fermer_grille("revenus")
 
-    col_list, col_form = st.columns([1, 1])
 
-    with col_list:
+    # Chaque bloc est un fragment : une interaction ne relance que son bloc,
+    # sans relire 'revenus' ni reconstruire les listes taxis / chauffeurs.
+    @st.fragment
+    def fragment_historique(df_rev):
         st.info("👆 Historique")
         if not df_rev.empty:
-            df_v = df_rev.copy()
-            df_v["Grand_Total_Remis"] = pd.to_numeric(df_v["Grand_Total_Remis"], errors='coerce')
-            df_display = df_v[["Date_Debut", "Taxi", "Chauffeur", "Grand_Total_Remis"]].rename(
+            df_display = df_rev[["Date_Debut", "Taxi", "Chauffeur", "Grand_Total_Remis"]].rename(
                 columns={"Grand_Total_Remis": "Net Perçu"}).sort_values("Date_Debut", ascending=False)
 
             event = st.dataframe(
                 df_display, use_container_width=True, hide_index=True, on_select="rerun", selection_mode="single-row",
-                column_config={"Net Perçu": st.column_config.NumberColumn(format="%.2f $")}
+                column_config={"Net Perçu": st.column_config.NumberColumn(format="%.2f $"),
+                               "Date_Debut": st.column_config.DateColumn(format="YYYY-MM-DD")}
             )
             if event.selection.rows:
                 idx = event.selection.rows[0];
                 real_idx = df_display.index[idx];
                 row_data = df_rev.loc[real_idx]
                 if st.button("Charger la sélection"):
-                    st.session_state.edit_mode = True
-                    st.session_state.edit_id = row_data["UUID"]
+                    ouvrir_fiche(row_data)
                     update_session_data(row_data.to_dict())
-                    st.rerun()
-        if st.button("Nouvelle Saisie (Vider)"): reset_form(); st.rerun()
+                    st.rerun(scope="app")
+        if st.button("Nouvelle Saisie (Vider)"): reset_form(); st.rerun(scope="app")
 
-    with col_form:
-        # IMPORT PDF
+
+    @st.fragment
+    def fragment_import_pdf():
         with st.expander("📂 IMPORTER PDF", expanded=True):
             uploaded_pdf = st.file_uploader("Glisser fichier ici", type="pdf")
             if uploaded_pdf is not None:
@@ -357,13 +472,15 @@ if selected_menu == "Transactions":
                     st.session_state.debug_log = debug_log
 
                     if data_pdf and (data_pdf.get("Meter_Total", 0) > 0 or data_pdf.get("Essence", 0) > 0):
-                        if "Chauffeur_Raw" in data_pdf:
-                            raw = str(data_pdf.get("Chauffeur_Raw", "")).lower()
-                            for c in l_chauf:
-                                if c and c.lower() in raw: data_pdf["Chauffeur"] = c; break
+                        cands = index_chauffeurs(FLOTTE).candidats(data_pdf.get("Chauffeur_Raw", ""),
+                                                             taxi=data_pdf.get("Taxi"), n=3)
+                        if cands:
+                            st.session_state.debug_log += "\n--- CHAUFFEUR ---\n" + "\n".join(
+                                [f"   {nom} -> {score:.2f}" for nom, score in cands])
+                            if cands[0][1] >= 0.5: data_pdf["Chauffeur"] = cands[0][0]
                         update_session_data(data_pdf)
                         st.success(f"Données extraites !");
-                        st.rerun()
+                        st.rerun(scope="app")
                     else:
                         st.error("Aucune donnée trouvée.")
 
@@ -371,101 +488,100 @@ if selected_menu == "Transactions":
                 with st.expander("🔍 DIAGNOSTIC (Texte lu)"):
                     st.text_area("", st.session_state.debug_log, height=200)
 
+
+    @st.fragment
+    def fragment_formulaire(df_rev, l_taxis, l_chauf):
         tit = "Modifier" if st.session_state.edit_mode else "Nouveau"
         st.markdown(f"### {tit}")
 
-        with st.form("crud_rev"):
-            c1, c2 = st.columns(2)
-            d_in = c1.date_input("Date Début", value=st.session_state.form_date)
-
-            val_t = st.session_state.form_taxi
-            idx_t = l_taxis.index(str(val_t)) if str(val_t) in l_taxis else 0
-            t_in = c2.selectbox("Taxi", l_taxis, index=idx_t, key="t_taxi_wdg")
-
-            val_c = st.session_state.form_chauf
-            idx_c = l_chauf.index(val_c) if val_c in l_chauf else 0
-            ch_in = c1.selectbox("Chauffeur", l_chauf, index=idx_c, key="t_chauf_wdg")
-
-            st.divider()
-            c1, c2, c3, c4 = st.columns(4)
-            m_d = c1.number_input("Meter Déb", key="t_m_deb")
-            m_f = c2.number_input("Meter Fin", key="t_m_fin")
-            fixe = c3.number_input("Fixe", key="t_fixe")
-            nb = c4.number_input("Nb Appels", step=1, key="t_nb")
+        # Pas de st.form : le net se recalcule en direct, sans toucher à la base
+        c1, c2 = st.columns(2)
+        d_in = c1.date_input("Date Début", value=st.session_state.form_date)
+
+        val_t = st.session_state.form_taxi
+        idx_t = l_taxis.index(str(val_t)) if str(val_t) in l_taxis else 0
+        c2.selectbox("Taxi", l_taxis, index=idx_t, key="t_taxi_wdg")
+
+        val_c = st.session_state.form_chauf
+        idx_c = l_chauf.index(val_c) if val_c in l_chauf else 0
+        c1.selectbox("Chauffeur", l_chauf, index=idx_c, key="t_chauf_wdg")
+
+        st.divider()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.number_input("Meter Déb", key="t_m_deb")
+        c2.number_input("Meter Fin", key="t_m_fin")
+        c3.number_input("Fixe", key="t_fixe")
+        c4.number_input("Nb Appels", step=1, key="t_nb")
+
+        st.caption("Déductions")
+        c1, c2, c3 = st.columns(3)
+        c1.number_input("STS", key="t_sts")
+        c2.number_input("Crédits", key="t_crd")
+        c3.number_input("Visa", key="t_visa")
+
+        c1, c2, c3 = st.columns(3)
+        c1.number_input("Essence", key="t_ess")
+        c2.number_input("Lavage", key="t_lav")
+        c3.number_input("Divers", key="t_div")
+        c3.number_input("Prix Fixes (Deduc)", key="t_pf")
+
+        c1, c2 = st.columns(2)
+        c1.number_input("Impôt (Manuel)", key="t_imp")
+
+        ss = st.session_state
+        saisie = {"Meter_Deb": ss.t_m_deb, "Meter_Fin": ss.t_m_fin, "Fixe": ss.t_fixe, "Nb_Appels": ss.t_nb,
+                  "STS": ss.t_sts, "Credits": ss.t_crd, "Prix_Fixes": ss.t_pf, "Visa": ss.t_visa,
+                  "Essence": ss.t_ess, "Lavage": ss.t_lav, "Divers": ss.t_div, "Impot": ss.t_imp}
+        calc = calculs.calculer_reglement(saisie, taux.actuels(CONFIG, d_in))
+        c2.metric("Net à remettre", f"{calc['Grand_Total_Remis']:.2f} $",
+                  help=f"Brut {calc['Total_Brut']:.2f} $ — Salaire {calc['Salaire_Chauffeur']:.2f} $")
+
+        c_s, c_d = st.columns([2, 1])
+        sub = c_s.button("Enregistrer", type="primary", use_container_width=True)
+        dele = False
+        if st.session_state.edit_mode: dele = c_d.button("Supprimer", type="secondary")
+
+        if sub:
+            val_t_in = st.session_state.t_taxi_wdg
+            val_ch_in = st.session_state.t_chauf_wdg
+
+            if not val_t_in or not val_ch_in:
+                st.error("⚠️ Taxi et Chauffeur requis")
+            else:
+                dup = False
+                if not st.session_state.edit_mode and not df_rev.empty:
+                    check = df_rev[(df_rev['Date_Debut'] == pd.Timestamp(d_in)) & (
+                                df_rev['Taxi'].astype(str) == str(val_t_in))]
+                    if not check.empty: st.error("Doublon détecté !"); dup = True
+
+                if not dup:
+                    row = {"Date_Debut": d_in, **calculs.champs_periode(d_in), "Taxi": val_t_in,
+                           "Chauffeur": val_ch_in, **saisie, **calc,
+                           "UUID": st.session_state.edit_id if st.session_state.edit_mode else str(uuid.uuid4())}
 
-            st.caption("Déductions")
-            c1, c2, c3 = st.columns(3)
-            sts = c1.number_input("STS", key="t_sts")
-            cred = c2.number_input("Crédits", key="t_crd")
-            visa = c3.number_input("Visa", key="t_visa")
+                    mois = [row["Mois"]] + cumuls.mois_touches(df_rev, [row["UUID"]], "Date_Debut")
+                    if enregistrer_ligne("revenus", row, mois):
+                        st.toast(f"Enregistré ! Net: {calc['Grand_Total_Remis']:.2f} $");
+                        st.session_state.reset_demande = True
+                        st.rerun(scope="app")
 
-            c1, c2, c3 = st.columns(3)
-            ess = c1.number_input("Essence", key="t_ess")
-            lav = c2.number_input("Lavage", key="t_lav")
-            div = c3.number_input("Divers", key="t_div")
-            c4 = c3.number_input("Prix Fixes (Deduc)", key="t_pf")
+        if dele:
+            mois = cumuls.mois_touches(df_rev, [st.session_state.edit_id], "Date_Debut")
+            if supprimer_ligne("revenus", mois):
+                st.toast("Supprimé");
+                st.session_state.reset_demande = True
+                st.rerun(scope="app")
 
-            c1, c2 = st.columns(2)
-            imp = c1.number_input("Impôt (Manuel)", key="t_imp")
 
-            c_s, c_d = st.columns([2, 1])
-            sub = c_s.form_submit_button("Enregistrer", type="primary", use_container_width=True)
-            dele = False
-            if st.session_state.edit_mode: dele = c_d.form_submit_button("Supprimer", type="secondary")
-
-            if sub:
-                val_t_in = st.session_state.t_taxi_wdg
-                val_ch_in = st.session_state.t_chauf_wdg
-
-                if not val_t_in or not val_ch_in:
-                    st.error("⚠️ Taxi et Chauffeur requis"); sub = False
-                else:
-                    dup = False
-                    if not st.session_state.edit_mode and not df_rev.empty:
-                        check = df_rev[(df_rev['Date_Debut'].astype(str) == str(d_in)) & (
-                                    df_rev['Taxi'].astype(str) == str(val_t_in))]
-                        if not check.empty: st.error("Doublon détecté !"); dup = True
-
-                    if not dup:
-                        mt = st.session_state.t_m_fin - st.session_state.t_m_deb
-                        brut = mt + st.session_state.t_fixe
-                        redev = st.session_state.t_nb * CONFIG["cout_appel"]
-                        base = brut - redev
-                        sal = base * (CONFIG["pct_chauf"] / 100)
-                        imp_fin = st.session_state.t_imp if st.session_state.t_imp > 0 else sal * (
-                                    CONFIG["taux_impot"] / 100)
-                        ded = st.session_state.t_sts + st.session_state.t_crd + st.session_state.t_visa + st.session_state.t_ess + st.session_state.t_lav + st.session_state.t_div + st.session_state.t_pf
-                        net = brut - sal - ded + imp_fin
-
-                        row = {
-                            "Date_Debut": d_in, "Date_Fin": d_in + timedelta(days=6), "Mois": d_in.strftime("%Y-%m"),
-                            "Annee": str(d_in.year),
-                            "Trimestre": f"T{(d_in.month - 1) // 3 + 1}", "Taxi": val_t_in, "Chauffeur": val_ch_in,
-                            "Meter_Deb": st.session_state.t_m_deb, "Meter_Fin": st.session_state.t_m_fin,
-                            "Meter_Total": mt,
-                            "Fixe": st.session_state.t_fixe, "Total_Brut": brut, "Nb_Appels": st.session_state.t_nb,
-                            "Redevance": redev, "Base_Salaire": base, "Salaire_Chauffeur": round(sal, 2),
-                            "STS": st.session_state.t_sts, "Credits": st.session_state.t_crd,
-                            "Prix_Fixes": st.session_state.t_pf, "Visa": st.session_state.t_visa,
-                            "Essence": st.session_state.t_ess, "Lavage": st.session_state.t_lav,
-                            "Divers": st.session_state.t_div,
-                            "Impot": round(imp_fin, 2), "Grand_Total_Remis": round(net, 2),
-                            "UUID": st.session_state.edit_id if st.session_state.edit_mode else str(uuid.uuid4())
-                        }
-
-                        if st.session_state.edit_mode: df_rev = df_rev[df_rev.UUID != st.session_state.edit_id]
-                        df_rev = pd.concat([df_rev, pd.DataFrame([row])], ignore_index=True)
-                        save_data("revenus", df_rev);
-                        st.success(f"Enregistré ! Net: {net:.2f} $");
-                        reset_form();
-                        st.rerun()
-
-            if dele:
-                df_rev = df_rev[df_rev.UUID != st.session_state.edit_id]
-                save_data("revenus", df_rev);
-                st.warning("Supprimé");
-                reset_form();
-                st.rerun()
+    if en_grille:
+        st.fragment(grille)("revenus", df_rev, l_taxis, l_chauf)
+    else:
+        col_list, col_form = st.columns([1, 1])
+        with col_list:
+            fragment_historique(df_rev)
+        with col_form:
+            fragment_import_pdf()
+            fragment_formulaire(df_rev, l_taxis, l_chauf)
 
 # =============================================================================
 # 2. DEPENSES
@@ -473,8 +589,12 @@ if selected_menu == "Transactions":
 elif selected_menu == "Dépenses":
     st.subheader("🔧 Dépenses Garage")
     df_dep = load_data("depenses");
+    fiche = fiche_recherche("depenses", df_dep)
+    if fiche is not None: st.session_state["grille_on_depenses"] = False
     l_taxis = [""] + get_liste_taxis();
     l_chauf = [""] + get_liste_chauffeurs()
+    en_grille = st.toggle("✏️ Édition en grille (par mois)", key="grille_on_depenses")
+    if not en_grille: fermer_grille("depenses")
 
     if 'd_date' not in st.session_state: st.session_state.d_date = datetime.now()
     if 'd_taxi' not in st.session_state: st.session_state.d_taxi = ""
@@ -494,13 +614,27 @@ elif selected_menu == "Dépenses":
         st.session_state.d_det = ""
 
 
-    col_list, col_form = st.columns([1, 1])
-    with col_list:
+    def charger_dep(r):
+        ouvrir_fiche(r)
+        try:
+            st.session_state.d_date = pd.to_datetime(r["Date"])
+        except:
+            pass
+        st.session_state.d_taxi = r["Taxi"];
+        st.session_state.d_chauf = r["Chauffeur"]
+        st.session_state.d_cat = r["Categorie"];
+        st.session_state.d_tot = safe_float(r["Montant_Total"])
+        st.session_state.d_det = r["Details"]
+
+
+    if fiche is not None: charger_dep(fiche)
+
+
+    @st.fragment
+    def fragment_historique_dep(df_dep):
         st.info("Historique")
         if not df_dep.empty:
-            df_v = df_dep.copy();
-            df_v["Montant_Total"] = pd.to_numeric(df_v["Montant_Total"], errors='coerce')
-            df_show = df_v[["Date", "Taxi", "Categorie", "Montant_Total"]].sort_values("Date", ascending=False)
+            df_show = df_dep[["Date", "Taxi", "Categorie", "Montant_Total"]].sort_values("Date", ascending=False)
             evt = st.dataframe(df_show, use_container_width=True, hide_index=True, on_select="rerun",
                                selection_mode="single-row",
                                column_config={"Montant_Total": st.column_config.NumberColumn(format="%.2f $")})
@@ -509,67 +643,65 @@ elif selected_menu == "Dépenses":
                 rid = df_show.index[idx];
                 r = df_dep.loc[rid]
                 if st.button("Charger"):
-                    st.session_state.edit_mode = True;
-                    st.session_state.edit_id = r["UUID"]
-                    try:
-                        st.session_state.d_date = pd.to_datetime(r["Date"])
-                    except:
-                        pass
-                    st.session_state.d_taxi = r["Taxi"];
-                    st.session_state.d_chauf = r["Chauffeur"]
-                    st.session_state.d_cat = r["Categorie"];
-                    st.session_state.d_tot = safe_float(r["Montant_Total"])
-                    st.session_state.d_det = r["Details"];
-                    st.rerun()
-        if st.button("Nouveau"): reset_dep(); st.rerun()
+                    charger_dep(r)
+                    st.rerun(scope="app")
+        if st.button("Nouveau"): reset_dep(); st.rerun(scope="app")
 
-    with col_form:
-        tit = "Modifier" if st.session_state.edit_mode else "Ajouter";
-        st.markdown(f"**{tit}**")
-        with st.form("crud_dep"):
-            c1, c2 = st.columns(2)
-            d1 = c1.date_input("Date", value=st.session_state.d_date)
-            t_val = st.session_state.d_taxi;
-            idx_t = l_taxis.index(str(t_val)) if str(t_val) in l_taxis else 0;
-            t1 = c2.selectbox("Taxi", l_taxis, index=idx_t)
-            c_val = st.session_state.d_chauf;
-            idx_c = l_chauf.index(c_val) if c_val in l_chauf else 0;
-            ch1 = c1.selectbox("Chauffeur", l_chauf, index=idx_c)
-            cat_idx = 0
-            if st.session_state.d_cat in CONFIG["categories"]: cat_idx = CONFIG["categories"].index(
-                st.session_state.d_cat)
-            cat1 = c2.selectbox("Catégorie", CONFIG["categories"], index=cat_idx)
-            c1, c2 = st.columns(2);
-            tot1 = c1.number_input("Total ($)", value=float(st.session_state.d_tot));
-            tax = c2.checkbox("Taxes incluses ?");
-            det1 = st.text_input("Détails", value=st.session_state.d_det)
-            c_s, c_d = st.columns([2, 1]);
-            sub = c_s.form_submit_button("Enregistrer", type="primary", use_container_width=True);
-            dele = False
-            if st.session_state.edit_mode: dele = c_d.form_submit_button("Supprimer", type="secondary")
-            if sub:
-                if not t1:
-                    st.error("Taxi requis")
-                else:
-                    if tax:
-                        div = 1 + (CONFIG["tps"] / 100) + (CONFIG["tvq"] / 100); ht = tot1 / div; tps = ht * (
-                                    CONFIG["tps"] / 100); tvq = ht * (CONFIG["tvq"] / 100)
+
+    if en_grille:
+        st.fragment(grille)("depenses", df_dep, l_taxis, l_chauf)
+    else:
+        col_list, col_form = st.columns([1, 1])
+        with col_list:
+            fragment_historique_dep(df_dep)
+
+        with col_form:
+            tit = "Modifier" if st.session_state.edit_mode else "Ajouter";
+            st.markdown(f"**{tit}**")
+            with st.form("crud_dep"):
+                c1, c2 = st.columns(2)
+                d1 = c1.date_input("Date", value=st.session_state.d_date)
+                t_val = st.session_state.d_taxi;
+                idx_t = l_taxis.index(str(t_val)) if str(t_val) in l_taxis else 0;
+                t1 = c2.selectbox("Taxi", l_taxis, index=idx_t)
+                c_val = st.session_state.d_chauf;
+                idx_c = l_chauf.index(c_val) if c_val in l_chauf else 0;
+                ch1 = c1.selectbox("Chauffeur", l_chauf, index=idx_c)
+                cat_idx = 0
+                if st.session_state.d_cat in CONFIG["categories"]: cat_idx = CONFIG["categories"].index(
+                    st.session_state.d_cat)
+                cat1 = c2.selectbox("Catégorie", CONFIG["categories"], index=cat_idx)
+                c1, c2 = st.columns(2);
+                tot1 = c1.number_input("Total ($)", value=float(st.session_state.d_tot));
+                tax = c2.checkbox("Taxes incluses ?");
+                det1 = st.text_input("Détails", value=st.session_state.d_det)
+                c_s, c_d = st.columns([2, 1]);
+                sub = c_s.form_submit_button("Enregistrer", type="primary", use_container_width=True);
+                dele = False
+                if st.session_state.edit_mode: dele = c_d.form_submit_button("Supprimer", type="secondary")
+                if sub:
+                    if not t1:
+                        st.error("Taxi requis")
                     else:
-                        ht, tps, tvq = tot1, 0.0, 0.0
-                    row = {"Date": d1, "Mois": d1.strftime("%Y-%m"), "Annee": str(d1.year),
-                           "Trimestre": f"T{(d1.month - 1) // 3 + 1}", "Taxi": t1, "Chauffeur": ch1, "Categorie": cat1,
-                           "Details": det1, "Montant_HT": round(ht, 2), "TPS": round(tps, 2), "TVQ": round(tvq, 2),
-                           "Montant_Total": tot1,
-                           "UUID": st.session_state.edit_id if st.session_state.edit_mode else str(uuid.uuid4())}
-                    if st.session_state.edit_mode: df_dep = df_dep[df_dep.UUID != st.session_state.edit_id]
-                    df_dep = pd.concat([df_dep, pd.DataFrame([row])], ignore_index=True);
-                    save_data("depenses", df_dep);
-                    st.success("OK");
-                    reset_dep();
-                    st.rerun()
-            if dele: df_dep = df_dep[df_dep.UUID != st.session_state.edit_id]; save_data("depenses",
-                                                                                         df_dep); st.warning(
-                "Supprimé"); reset_dep(); st.rerun()
+                        if tax:
+                            tx = taux.actuels(CONFIG, d1)  # taux en vigueur à la date de la facture
+                            div = 1 + (tx["tps"] / 100) + (tx["tvq"] / 100); ht = tot1 / div; tps = ht * (
+                                        tx["tps"] / 100); tvq = ht * (tx["tvq"] / 100)
+                        else:
+                            ht, tps, tvq = tot1, 0.0, 0.0
+                        row = {"Date": d1, "Mois": d1.strftime("%Y-%m"), "Annee": str(d1.year),
+                               "Trimestre": f"T{(d1.month - 1) // 3 + 1}", "Taxi": t1, "Chauffeur": ch1, "Categorie": cat1,
+                               "Details": det1, "Montant_HT": round(ht, 2), "TPS": round(tps, 2), "TVQ": round(tvq, 2),
+                               "Montant_Total": tot1,
+                               "UUID": st.session_state.edit_id if st.session_state.edit_mode else str(uuid.uuid4())}
+                        mois = [row["Mois"]] + cumuls.mois_touches(df_dep, [row["UUID"]], "Date")
+                        if enregistrer_ligne("depenses", row, mois):
+                            st.success("OK");
+                            reset_dep();
+                            st.rerun()
+                if dele:
+                    mois = cumuls.mois_touches(df_dep, [st.session_state.edit_id], "Date")
+                    if supprimer_ligne("depenses", mois): st.warning("Supprimé"); reset_dep(); st.rerun()
 
 # =============================================================================
 # 3. CHAUFFEURS
@@ -588,6 +720,20 @@ elif selected_menu == "Chauffeurs":
         for k in ["c_n", "c_p", "c_l", "c_a", "c_t", "c_m", "c_nt"]: st.session_state[k] = ""
 
 
+    def charger_c(r):
+        ouvrir_fiche(r)
+        st.session_state.c_n = r["Nom"];
+        st.session_state.c_p = r["Prenom"];
+        st.session_state.c_l = r["License_ID"]
+        st.session_state.c_a = r["Adresse"];
+        st.session_state.c_t = r["Telephone"];
+        st.session_state.c_m = r["Matricule"];
+        st.session_state.c_nt = r["Note"]
+
+
+    fiche = fiche_recherche("chauffeurs", df_c)
+    if fiche is not None: charger_c(fiche)
+
     with col_list:
         if not df_c.empty:
             evt = st.dataframe(df_c[["Nom", "Prenom", "License_ID"]], on_select="rerun", selection_mode="single-row",
@@ -597,15 +743,7 @@ elif selected_menu == "Chauffeurs":
                 rid = df_c.index[idx];
                 r = df_c.loc[rid]
                 if st.button("Modifier"):
-                    st.session_state.edit_mode = True;
-                    st.session_state.edit_id = r["UUID"]
-                    st.session_state.c_n = r["Nom"];
-                    st.session_state.c_p = r["Prenom"];
-                    st.session_state.c_l = r["License_ID"]
-                    st.session_state.c_a = r["Adresse"];
-                    st.session_state.c_t = r["Telephone"];
-                    st.session_state.c_m = r["Matricule"];
-                    st.session_state.c_nt = r["Note"]
+                    charger_c(r)
                     st.rerun()
         if st.button("Nouveau"): reset_c(); st.rerun()
     with col_form:
@@ -624,14 +762,13 @@ elif selected_menu == "Chauffeurs":
             if sub and n:
                 new = {"Nom": n, "Prenom": p, "License_ID": l, "Adresse": a, "Telephone": t, "Matricule": m, "Note": nt,
                        "UUID": st.session_state.edit_id if st.session_state.edit_mode else str(uuid.uuid4())}
-                if st.session_state.edit_mode: df_c = df_c[df_c.UUID != st.session_state.edit_id]
-                df_c = pd.concat([df_c, pd.DataFrame([new])], ignore_index=True);
-                save_data("chauffeurs", df_c);
-                st.success("OK");
-                reset_c();
-                st.rerun()
-            if dele: df_c = df_c[df_c.UUID != st.session_state.edit_id]; save_data("chauffeurs", df_c); st.warning(
-                "Supprimé"); reset_c(); st.rerun()
+                if enregistrer_ligne("chauffeurs", new):
+                    index_chauffeurs.clear(FLOTTE);
+                    st.success("OK");
+                    reset_c();
+                    st.rerun()
+            if dele and supprimer_ligne("chauffeurs"):
+                st.warning("Supprimé"); index_chauffeurs.clear(FLOTTE); reset_c(); st.rerun()
 
 # =============================================================================
 # 4. FLOTTE TAXIS
@@ -663,8 +800,7 @@ elif selected_menu == "Flotte Taxis":
                 real_idx = df_t.index[idx];
                 r = df_t.loc[real_idx]
                 if st.button("Modifier"):
-                    st.session_state.edit_mode = True;
-                    st.session_state.edit_id = r["UUID"]
+                    ouvrir_fiche(r)
                     st.session_state.t_id = r["Taxi_ID"];
                     st.session_state.t_im = r["Immatriculation"];
                     st.session_state.t_cd = r["Chauffeur_Defaut"]
@@ -683,97 +819,330 @@ elif selected_menu == "Flotte Taxis":
             if sub and tid:
                 new = {"Taxi_ID": tid, "Immatriculation": imm, "Chauffeur_Defaut": cd,
                        "UUID": st.session_state.edit_id if st.session_state.edit_mode else str(uuid.uuid4())}
-                if st.session_state.edit_mode: df_t = df_t[df_t.UUID != st.session_state.edit_id]
-                df_t = pd.concat([df_t, pd.DataFrame([new])], ignore_index=True);
-                save_data("taxis", df_t);
-                st.success("OK");
-                reset_t();
-                st.rerun()
-            if dele: df_t = df_t[df_t.UUID != st.session_state.edit_id]; save_data("taxis", df_t); st.warning(
-                "Supprimé"); reset_t(); st.rerun()
+                if enregistrer_ligne("taxis", new):
+                    index_chauffeurs.clear(FLOTTE);
+                    st.success("OK");
+                    reset_t();
+                    st.rerun()
+            if dele and supprimer_ligne("taxis"):
+                st.warning("Supprimé"); index_chauffeurs.clear(FLOTTE); reset_t(); st.rerun()
 
 # =============================================================================
 # 5. SYNTHÈSE
 # =============================================================================
 elif selected_menu == "Synthèse":
     st.header("📊 Tableau de Bord")
-    df_rev = load_data("revenus");
-    df_dep = load_data("depenses")
-    years = sorted(list(set(df_rev["Annee"].astype(str).tolist() + df_dep["Annee"].astype(str).tolist())), reverse=True)
-    if not years: years = [str(datetime.now().year)]
-    c1, c2 = st.columns(2);
-    sel_y = c1.selectbox("Année", years);
-    sel_v = c2.selectbox("Vue", ["Mois", "Trimestre", "Annuel"])
-
-    df_r = df_rev[df_rev["Annee"].astype(str) == str(sel_y)].copy()
-    for c in ["Salaire_Chauffeur", "Grand_Total_Remis", "Total_Brut", "Essence", "Lavage"]:
-        if c in df_r.columns: df_r[c] = pd.to_numeric(df_r[c], errors='coerce').fillna(0)
-
-    div = 1 + (CONFIG["tps"] / 100) + (CONFIG["tvq"] / 100)
-    df_r["Ess_TPS"] = ((df_r["Essence"] + df_r["Lavage"]) / div) * (CONFIG["tps"] / 100);
-    df_r["Ess_TVQ"] = ((df_r["Essence"] + df_r["Lavage"]) / div) * (CONFIG["tvq"] / 100)
-    grp = "Mois" if sel_v == "Mois" else ("Trimestre" if sel_v == "Trimestre" else "Annee")
-    syn_r = df_r.groupby(grp)[["Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis", "Ess_TPS", "Ess_TVQ"]].sum()
-
-    df_d = df_dep[df_dep["Annee"].astype(str) == str(sel_y)].copy()
-    if sel_v == "Trimestre": df_d["Trimestre"] = "T" + ((pd.to_datetime(df_d["Date"]).dt.month - 1) // 3 + 1).astype(
-        str)
-    grp_d = "Mois" if sel_v == "Mois" else ("Trimestre" if sel_v == "Trimestre" else "Annee")
-    for c in ["Montant_Total", "TPS", "TVQ"]:
-        if c in df_d.columns: df_d[c] = pd.to_numeric(df_d[c], errors='coerce').fillna(0)
-    syn_d = df_d.groupby(grp_d)[["Montant_Total", "TPS", "TVQ"]].sum()
-
-    final = syn_r.join(syn_d, lsuffix="_r", rsuffix="_d", how="outer").fillna(0)
-    final["TPS à Recevoir"] = final.get("Ess_TPS", 0) + final.get("TPS", 0);
-    final["TVQ à Recevoir"] = final.get("Ess_TVQ", 0) + final.get("TVQ", 0)
-    final["PROFIT NET"] = final.get("Grand_Total_Remis", 0) - final.get("Montant_Total", 0)
-    final = final.rename(
-        columns={"Total_Brut": "Revenu BRUT", "Salaire_Chauffeur": "Salaire (40%)", "Grand_Total_Remis": "Net Perçu",
-                 "Montant_Total": "Dépenses Garage"})
-
-    k1, k2, k3 = st.columns(3);
-    k1.metric("Revenu BRUT", f"{final['Revenu BRUT'].sum():.2f} $");
-    k2.metric("Salaires", f"{final['Salaire (40%)'].sum():.2f} $");
-    k3.metric("PROFIT NET", f"{final['PROFIT NET'].sum():.2f} $")
-    k4, k5 = st.columns(2);
-    k4.metric("Total TPS", f"{final['TPS à Recevoir'].sum():.2f} $");
-    k5.metric("Total TVQ", f"{final['TVQ à Recevoir'].sum():.2f} $")
-    st.divider()
 
-    cols_m = ["Revenu BRUT", "Salaire (40%)", "Net Perçu", "Dépenses Garage", "TPS à Recevoir", "TVQ à Recevoir",
-              "PROFIT NET"]
-    cfg = {c: st.column_config.NumberColumn(format="%.2f $") for c in cols_m}
-    st.dataframe(final[cols_m], column_config=cfg, use_container_width=True)
-
-    st.divider();
-    st.caption("Détail Taxes")
-    aud = []
-    for _, r in df_d.iterrows():
-        if r.get("TPS", 0) > 0: aud.append(
-            {"Date": r["Date"], "Type": "Dépense", "TPS": r["TPS"], "TVQ": r["TVQ"], "Total": r["Montant_Total"]})
-    for _, r in df_r.iterrows():
-        if r.get("Ess_TPS", 0) > 0: aud.append(
-            {"Date": r["Date_Debut"], "Type": "Essence", "TPS": r["Ess_TPS"], "TVQ": r["Ess_TVQ"],
-             "Total": r["Essence"] + r["Lavage"]})
-    if aud: st.dataframe(pd.DataFrame(aud).sort_values("Date", ascending=False), use_container_width=True)
+
+    # Fragments : changer d'année / de vue ne relance que la synthèse,
+    # filtrer ou paginer le détail ne relance que le détail des taxes.
+    @st.fragment
+    def fragment_detail_taxes(df_r, df_d, sel_y):
+        aud = detail_taxes.construire_detail_taxes(df_r, df_d, *taux.taxes_revenus(df_r, CONFIG))
+        if not aud.empty:
+            c1, c2, c3, c4 = st.columns(4)
+            f_src = c1.multiselect("Source", detail_taxes.TYPES, default=detail_taxes.TYPES)
+            f_deb = c2.date_input("Du", value=None, key="aud_deb")
+            f_fin = c3.date_input("Au", value=None, key="aud_fin")
+            f_min = c4.number_input("Montant min ($)", min_value=0.0, value=0.0, key="aud_min")
+            aud_f = detail_taxes.filtrer_detail(aud, f_src, f_deb, f_fin, f_min)
+
+            c1, c2, c3 = st.columns([1, 2, 1])
+            nb_p = detail_taxes.nb_pages(aud_f)
+            page = c1.number_input(f"Page (sur {nb_p})", min_value=1, max_value=nb_p, value=1,
+                                   key=f"aud_page_{sel_y}")
+            c2.caption(f"{len(aud_f)} lignes — TPS {aud_f['TPS'].sum():.2f} $ / TVQ {aud_f['TVQ'].sum():.2f} $")
+            c3.download_button("⬇️ Exporter CSV", detail_taxes.exporter_csv(aud_f), f"detail_taxes_{sel_y}.csv",
+                               "text/csv")
+            cfg_aud = {c: st.column_config.NumberColumn(format="%.2f $") for c in ["TPS", "TVQ", "Total"]}
+            cfg_aud["Date"] = st.column_config.DateColumn(format="YYYY-MM-DD")
+            st.dataframe(detail_taxes.paginer(aud_f, page), column_config=cfg_aud, use_container_width=True,
+                         hide_index=True)
+
+
+    @st.fragment
+    def fragment_synthese():
+        years = sorted(list(set(partitions.annees_presentes(engine, "revenus") +
+                                partitions.annees_presentes(engine, "depenses") +
+                                archives.annees_archivees(DOSSIER_ARCHIVES))),
+                       reverse=True)
+        if not years: years = [str(datetime.now().year)]
+        c1, c2 = st.columns(2);
+        sel_y = c1.selectbox("Année", years);
+        sel_v = c2.selectbox("Vue", ["Mois", "Trimestre", "Annuel"])
+
+        # Seules les colonnes utiles sont lues (tables vivantes comme archives)
+        cols_r = ["Date_Debut", "Mois", "Annee", "Trimestre", "Taxi", "Total_Brut", "Salaire_Chauffeur",
+                  "Grand_Total_Remis", "Essence", "Lavage"]
+        cols_d = ["Date", "Mois", "Annee", "Trimestre", "Taxi", "Categorie", "Montant_Total", "TPS", "TVQ"]
+
+        # Année close -> lecture memory-map des archives Arrow
+        archivee = archives.est_archivee(sel_y, DOSSIER_ARCHIVES)
+        if archivee:
+            try:
+                df_r = archives.lire_archive("revenus", sel_y, colonnes=cols_r, dossier=DOSSIER_ARCHIVES)
+                df_d = archives.lire_archive("depenses", sel_y, colonnes=cols_d, dossier=DOSSIER_ARCHIVES)
+            except RuntimeError as e:
+                st.error(f"🚨 {e}"); st.stop()
+        else:
+            df_r = load_data("revenus", columns=cols_r, where={"Annee": sel_y})
+            df_d = load_data("depenses", columns=cols_d, where={"Annee": sel_y})
+
+        with diagnostics.chrono("synthese_groupby"):
+            if archivee:
+                # Totaux précalculés à l'archivage (aucun groupby sur l'historique)
+                tot = archives.lire_totaux(sel_y, sel_v, DOSSIER_ARCHIVES)
+                syn_r, syn_d = tot[calculs.TOTAUX_REVENUS], tot[calculs.TOTAUX_DEPENSES]
+            else:
+                syn_r, syn_d = calculs.totaux_periode(df_r, df_d, sel_v, *taux.taxes_revenus(df_r, CONFIG))
+        final = calculs.assembler_synthese(syn_r, syn_d)
+
+        k1, k2, k3 = st.columns(3);
+        k1.metric("Revenu BRUT", f"{final['Revenu BRUT'].sum():.2f} $");
+        k2.metric("Salaires", f"{final['Salaire (40%)'].sum():.2f} $");
+        k3.metric("PROFIT NET", f"{final['PROFIT NET'].sum():.2f} $")
+        k4, k5 = st.columns(2);
+        k4.metric("Total TPS", f"{final['TPS à Recevoir'].sum():.2f} $");
+        k5.metric("Total TVQ", f"{final['TVQ à Recevoir'].sum():.2f} $")
+        st.divider()
+
+        cols_m = ["Revenu BRUT", "Salaire (40%)", "Net Perçu", "Dépenses Garage", "TPS à Recevoir", "TVQ à Recevoir",
+                  "PROFIT NET"]
+        cfg = {c: st.column_config.NumberColumn(format="%.2f $") for c in cols_m}
+        st.dataframe(final[cols_m], column_config=cfg, use_container_width=True)
+
+        st.divider();
+        st.caption("Détail Taxes")
+        fragment_detail_taxes(df_r, df_d, sel_y)
+
+        # Déclaration trimestrielle : export en continu (lots SQL -> CSV / XLSX), sommaire = chiffres ci-dessus
+        with st.expander("🧾 Déclaration TPS/TVQ trimestrielle"):
+            c1, c2, c3 = st.columns(3)
+            sel_t = c1.selectbox("Trimestre", ["T1", "T2", "T3", "T4"], key="decl_trim")
+            fmt = c2.radio("Format", ["xlsx", "csv"], horizontal=True, key="decl_fmt")
+            if c3.button("Préparer l'export", key="decl_go"):
+                import export_taxes
+                nom = f"taxes_{sel_y}_{sel_t}.{fmt}"
+                with tempfile.TemporaryDirectory() as d:
+                    with st.spinner("Export en cours..."):
+                        n, som = export_taxes.exporter(engine, sel_y, sel_t, CONFIG, os.path.join(d, nom),
+                                                               dossier=DOSSIER_ARCHIVES)
+                    with open(os.path.join(d, nom), "rb") as f:
+                        st.session_state["decl_export"] = (nom, f.read(), n, som)
+            if st.session_state.get("decl_export", ("",))[0].startswith(f"taxes_{sel_y}_{sel_t}."):
+                nom, contenu, n, som = st.session_state["decl_export"]
+                st.caption(f"{n} lignes taxables")
+                st.download_button(f"⬇️ {nom}", contenu, nom, key="decl_dl")
+                st.dataframe(som, column_config={c: st.column_config.NumberColumn(format="%.2f $")
+                                                 for c in som.columns[1:]}, use_container_width=True, hide_index=True)
+
+
+    fragment_synthese()
+
+# =============================================================================
+# 6. ANALYTIQUE (cumuls mensuels par taxi / chauffeur)
+# =============================================================================
+elif selected_menu == "Analytique":
+    st.subheader("📈 Rentabilité par Taxi / Chauffeur")
+    cumuls.assurer(engine, DOSSIER_ARCHIVES)
+
+
+    @st.fragment
+    def fragment_analytique():
+        annees = cumuls.annees(engine)
+        if not annees: st.info("Aucune donnée."); return
+        c1, c2 = st.columns([3, 1])
+        sel_a = c1.multiselect("Années", annees, default=annees[:1])
+        dim = c2.radio("Par", ["Taxi", "Chauffeur"], horizontal=True)
+        if not sel_a: st.info("Choisissez au moins une année."); return
+
+        df = charger_cumuls(FLOTTE, tuple(sorted(sel_a)))
+        with diagnostics.chrono("analytique_classement"):
+            cl = cumuls.classement(df, dim)
+
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Profit flotte", f"{cl['Profit'].sum():.2f} $")
+        k2.metric(f"Meilleur {dim}", str(cl.index[0]), f"{cl['Profit'].iloc[0]:.2f} $")
+        k3.metric("Moins rentable", str(cl.index[-1]), f"{cl['Profit'].iloc[-1]:.2f} $")
+
+        cols_m = ["Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis", "Depenses", "Profit", "Profit / Semaine"]
+        cfg = {c: st.column_config.NumberColumn(format="%.2f $") for c in cols_m}
+        cfg.update({"Total_Brut": st.column_config.NumberColumn("Revenu BRUT", format="%.2f $"),
+                    "Salaire_Chauffeur": st.column_config.NumberColumn("Salaire", format="%.2f $"),
+                    "Grand_Total_Remis": st.column_config.NumberColumn("Net Perçu", format="%.2f $"),
+                    "Depenses": st.column_config.NumberColumn("Dépenses Garage", format="%.2f $"),
+                    "Semaines": st.column_config.NumberColumn(format="%d"),
+                    "Tendance": st.column_config.LineChartColumn("Profit mensuel")})
+        evt = st.dataframe(cl.reset_index(), column_config=cfg, use_container_width=True, hide_index=True,
+                           on_select="rerun", selection_mode="single-row")
+
+        # DRILL-DOWN
+        if evt.selection.rows:
+            valeur = cl.index[evt.selection.rows[0]]
+            mensuel, repartition = cumuls.detail(df, dim, valeur)
+            st.divider()
+            st.markdown(f"### {dim} {valeur}")
+            st.line_chart(mensuel[["Grand_Total_Remis", "Depenses", "Profit"]].rename(
+                columns={"Grand_Total_Remis": "Net Perçu", "Depenses": "Dépenses Garage"}))
+            st.dataframe(repartition, use_container_width=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.2f $") for c in
+                                        ["Grand_Total_Remis", "Depenses", "Profit"]})
+        else:
+            st.caption("Sélectionnez une ligne pour le détail mensuel.")
+
+
+    fragment_analytique()
+
+# =============================================================================
+# 7. AUDIT DES COMPTEURS (voir audit_compteurs.py)
+# =============================================================================
+elif selected_menu == "Audit":
+    st.subheader("🛡️ Audit des compteurs et des valeurs")
+
+
+    @st.fragment
+    def fragment_audit():
+        c1, c2, c3 = st.columns([3, 1, 1])
+        seuil = c3.number_input("Seuil (z-score)", min_value=2.0, max_value=10.0, value=audit_compteurs.SEUIL_Z,
+                                step=0.5, help="Valeurs inhabituelles : écart à la médiane du taxi, en MAD")
+        with diagnostics.chrono("audit_compteurs"):
+            nb, res = audit_flotte(FLOTTE, donnees.versions(engine).get("revenus", 0), seuil)
+        types = c1.multiselect("Types", audit_compteurs.TYPES, default=audit_compteurs.TYPES)
+        taxi = c2.selectbox("Taxi", [""] + sorted(res["Taxi"].unique()))
+
+        k = st.columns(len(audit_compteurs.TYPES))
+        for col, t in zip(k, audit_compteurs.TYPES): col.metric(t, int((res["Type"] == t).sum()))
+        vue = res[res["Type"].isin(types)]
+        if taxi: vue = vue[vue["Taxi"] == taxi]
+        st.caption(f"{nb} semaines analysées (archives comprises) : {len(vue)} anomalie(s) affichée(s)")
+        if vue.empty: st.success("Aucune anomalie."); return
+
+        cfg = {"Date_Debut": st.column_config.DateColumn("Semaine du", format="YYYY-MM-DD"),
+               "Ecart": st.column_config.NumberColumn(format="%.2f", help="$ (compteurs), jours non couverts ou "
+                                                                          "chevauchés (dates), z-score (valeurs)")}
+        evt = st.dataframe(vue.drop(columns=["UUID"]), column_config=cfg, on_select="rerun",
+                           selection_mode="single-row", use_container_width=True, hide_index=True)
+        c1, c2 = st.columns(2)
+        c2.download_button("⬇️ Exporter CSV", vue.to_csv(index=False).encode("utf-8"), "anomalies_compteurs.csv",
+                           "text/csv")
+        if evt.selection.rows and c1.button("Ouvrir la semaine", type="primary"):
+            st.session_state.fiche_recherche = ("revenus", vue.iloc[evt.selection.rows[0]]["UUID"])
+            st.query_params["page"] = "Transactions"
+            st.rerun(scope="app")
+
+
+    fragment_audit()
 
 # =============================================================================
-# 6. PARAMETRES
+# 8. PARAMETRES
 # =============================================================================
 elif selected_menu == "Paramètres":
     st.header("⚙️ Configuration")
+    actuels = taux.actuels(CONFIG)
     with st.form("cfg"):
         c1, c2 = st.columns(2);
-        nc = c1.number_input("Coût Appel", value=CONFIG["cout_appel"]);
-        np = c2.number_input("% Salaire", value=CONFIG["pct_chauf"]);
-        ni = c1.number_input("% Impôt", value=CONFIG["taux_impot"]);
-        nt = c1.number_input("% TPS", value=CONFIG["tps"]);
-        nv = c2.number_input("% TVQ", value=CONFIG["tvq"]);
+        nc = c1.number_input("Coût Appel", value=actuels["cout_appel"]);
+        np = c2.number_input("% Salaire", value=actuels["pct_chauf"]);
+        ni = c1.number_input("% Impôt", value=actuels["taux_impot"]);
+        nt = c1.number_input("% TPS", value=actuels["tps"]);
+        nv = c2.number_input("% TVQ", value=actuels["tvq"]);
+        depuis = c2.date_input("Taux en vigueur à partir du", value=datetime.now())
         cat = st.text_area("Catégories", value="\n".join(CONFIG["categories"]))
         if st.form_submit_button("Sauvegarder"):
-            save_config({"cout_appel": nc, "pct_chauf": np, "taux_impot": ni, "tps": nt, "tvq": nv,
-                         "categories": [x.strip() for x in cat.split('\n') if x.strip()]});
+            # Un changement de taux ajoute un palier daté : les semaines antérieures gardent leurs taux
+            nouveaux = {"cout_appel": nc, "pct_chauf": np, "taux_impot": ni, "tps": nt, "tvq": nv}
+            cfg = {**CONFIG, "categories": [x.strip() for x in cat.split('\n') if x.strip()]}
+            if any(abs(nouveaux[k] - taux.actuels(CONFIG, depuis)[k]) > 1e-9 for k in taux.TAUX):
+                cfg = taux.ajouter(cfg, depuis, nouveaux)
+            configuration.sauvegarder(cfg, FILE_CONFIG);
             st.success("OK");
             st.rerun()
 
-verifier_tables_sql()
\ No newline at end of file
+    with st.expander("📅 Historique des taux"):
+        st.dataframe(taux.historique(CONFIG), use_container_width=True, hide_index=True)
+
+    # GABARITS PDF : une mise en page enregistrée est lue par position des mots (voir gabarits_pdf.py)
+    with st.expander("📐 Gabarits PDF"):
+        import gabarits_pdf
+        import lecture_pdf
+        st.caption("Téléversez une feuille modèle : une boîte [x0, top, x1, bottom] est proposée pour chaque "
+                   "champ depuis les libellés (modifiable). Les feuilles de même mise en page seront ensuite "
+                   "lues par position.")
+        modele = st.file_uploader("Feuille modèle", type="pdf", key="gabarit_modele")
+        if modele is not None:
+            g, mots = gabarits_pdf.proposer(modele.getvalue(), os.path.splitext(modele.name)[0],
+                                            lecture_pdf.LIBELLES_GABARIT)
+            nom_g = st.text_input("Nom du gabarit", value=g["nom"])
+            df_b = pd.DataFrame([{"Champ": c, **dict(zip(["x0", "top", "x1", "bottom"], g["champs"].get(c, [None] * 4)))}
+                                 for c in lecture_pdf.LIBELLES_GABARIT])
+            df_b = st.data_editor(df_b, disabled=["Champ"], hide_index=True, use_container_width=True,
+                                  key="gabarit_boites")
+            g["champs"] = {r.Champ: [float(r.x0), float(r.top), float(r.x1), float(r.bottom)]
+                           for r in df_b.dropna().itertuples()}
+            lu = gabarits_pdf.lire_champs(mots, g)
+            st.dataframe(pd.DataFrame({"Champ": list(lu), "Texte lu": list(lu.values())}), hide_index=True,
+                         use_container_width=True)
+            if st.checkbox("Afficher les mots de la page (coordonnées)"):
+                st.dataframe(pd.DataFrame(mots), hide_index=True, use_container_width=True)
+            if st.button("Enregistrer le gabarit", type="primary"):
+                gabarits_pdf.enregistrer({**g, "nom": nom_g.strip() or g["nom"]})
+                st.success(f"Gabarit '{nom_g}' enregistré ({len(g['champs'])} champs).")
+
+        existants = gabarits_pdf.charger()
+        if existants:
+            st.dataframe(pd.DataFrame([{"Gabarit": x["nom"], "Champs": ", ".join(x["champs"]),
+                                        "Page (pt)": " x ".join(map(str, x["taille"]))} for x in existants]),
+                         hide_index=True, use_container_width=True)
+            c1, c2 = st.columns([2, 1])
+            a_sup = c1.selectbox("Gabarit", [x["nom"] for x in existants], key="gabarit_sup")
+            if c2.button("Supprimer le gabarit"):
+                gabarits_pdf.supprimer(a_sup)
+                st.rerun()
+
+    # ARCHIVAGE DES ANNÉES CLOSES
+    st.divider()
+    st.subheader("🗄️ Archiver une année close")
+    st.caption(f"Déplace les revenus/dépenses de l'année vers des fichiers Arrow/Parquet ('{DOSSIER_ARCHIVES}'). "
+               "La Synthèse continue de les afficher.")
+    ouvertes = sorted([a for a in set(partitions.annees_presentes(engine, "revenus") +
+                                      partitions.annees_presentes(engine, "depenses"))
+                       if a != str(datetime.now().year)], reverse=True)
+    if ouvertes:
+        c1, c2 = st.columns([2, 1])
+        a_arch = c1.selectbox("Année à archiver", ouvertes)
+        if c2.button("Archiver l'année", type="primary"):
+            try:
+                res = archives.archiver_annee(engine, a_arch, CONFIG, DOSSIER_ARCHIVES)
+                st.success(f"Année {a_arch} archivée : {res['revenus']} revenus, {res['depenses']} dépenses.")
+            except Exception as e:
+                st.error(f"🚨 Archivage impossible : {e}")
+    else:
+        st.info("Aucune année close à archiver.")
+
+# =============================================================================
+# 9. DIAGNOSTICS (page cachée)
+# =============================================================================
+elif selected_menu == "Diagnostics":
+    st.header("🩺 Diagnostics performance")
+    if "dernier_rerun" in st.session_state:
+        total, detail = st.session_state.dernier_rerun
+        st.caption(f"Rerun précédent : {total * 1000:.1f} ms")
+        if detail:
+            df_det = pd.DataFrame([(n, d * 1000) for n, d in detail], columns=["Opération", "Durée (ms)"])
+            st.dataframe(df_det.groupby("Opération")["Durée (ms)"].agg(["count", "sum"]).rename(
+                columns={"count": "Appels", "sum": "Durée (ms)"}), use_container_width=True)
+
+    st.subheader("Fenêtre glissante (p50 / p95)")
+    cfg_ms = {c: st.column_config.NumberColumn(format="%.1f") for c in ["p50 (ms)", "p95 (ms)", "Max (ms)"]}
+    st.dataframe(pd.DataFrame(diagnostics.statistiques()), column_config=cfg_ms, use_container_width=True,
+                 hide_index=True)
+    st.subheader("Requêtes SQL les plus lentes")
+    st.dataframe(pd.DataFrame(diagnostics.requetes_lentes()), use_container_width=True, hide_index=True)
+
+    c1, c2 = st.columns(2)
+    if c1.button("Exporter (Prometheus)"): st.success(f"Écrit : {diagnostics.ecrire_prometheus()}")
+    if c2.button("Réinitialiser les compteurs"): diagnostics.reinitialiser(); st.rerun()
+
+# --- FIN DU RERUN : mesures pour la page Diagnostics + fichier Prometheus ---
+st.session_state.dernier_rerun = diagnostics.fin_rerun()
+diagnostics.ecrire_prometheus_periodique()
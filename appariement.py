@@ -0,0 +1,98 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+# --- APPARIEMENT CHAUFFEURS (Import PDF) ---
+# Index construit une fois à partir de la table chauffeurs :
+#   jetons normalisés (accents retirés) -> chauffeurs
+#   trigrammes -> jetons (similarité approximative, fautes de frappe / OCR)
+#   Matricule / License_ID -> chauffeur (identification directe)
+# La recherche ne parcourt que les listes de l'index, jamais toute la flotte.
+SEUIL_TRIGRAMME = 0.45
+BONUS_DEFAUT = 0.15
+
+
+def normaliser(txt):
+    txt = unicodedata.normalize("NFKD", str(txt or ""))
+    txt = "".join([c for c in txt if not unicodedata.combining(c)]).lower()
+    return re.sub(r"[^a-z0-9]+", " ", txt).strip()
+
+
+def trigrammes(mot):
+    m = f"  {mot} "
+    return {m[i:i + 3] for i in range(len(m) - 2)}
+
+
+class IndexChauffeurs:
+    def __init__(self, df_chauffeurs, df_taxis=None):
+        self.noms = []
+        self.jetons_chauffeur = []
+        self.par_jeton = defaultdict(set)
+        self.par_trigramme = defaultdict(set)
+        self.trigrammes_jeton = {}
+        self.par_identifiant = {}
+        self.defaut_taxi = {}
+
+        for r in df_chauffeurs.to_dict("records"):
+            nom = f"{r.get('Nom', '')} {r.get('Prenom', '')}"
+            i = len(self.noms)
+            self.noms.append(nom)
+            jetons = [j for j in normaliser(nom).split() if len(j) > 1]
+            self.jetons_chauffeur.append(jetons)
+            for j in jetons:
+                self.par_jeton[j].add(i)
+                if j not in self.trigrammes_jeton:
+                    self.trigrammes_jeton[j] = trigrammes(j)
+                    for t in self.trigrammes_jeton[j]: self.par_trigramme[t].add(j)
+            for col in ["Matricule", "License_ID"]:
+                ident = normaliser(r.get(col, "")).replace(" ", "")
+                if len(ident) >= 4: self.par_identifiant[ident] = i
+
+        if df_taxis is not None:
+            index_nom = {n: i for i, n in enumerate(self.noms)}
+            for r in df_taxis.to_dict("records"):
+                d = index_nom.get(str(r.get("Chauffeur_Defaut", "")))
+                if d is not None: self.defaut_taxi[str(r.get("Taxi_ID", ""))] = d
+
+    def _jetons_proches(self, jeton):
+        # Jetons de l'index partageant des trigrammes avec 'jeton' -> similarité de Jaccard
+        tri = trigrammes(jeton)
+        communs = defaultdict(int)
+        for t in tri:
+            for j in self.par_trigramme.get(t, ()): communs[j] += 1
+        res = {}
+        for j, n in communs.items():
+            sim = n / (len(tri) + len(self.trigrammes_jeton[j]) - n)
+            if sim >= SEUIL_TRIGRAMME: res[j] = sim
+        return res
+
+    def candidats(self, texte, taxi=None, n=5):
+        jetons = normaliser(texte).split()
+        scores = defaultdict(float)
+
+        # 1. Identifiants (Matricule / Licence) -> certitude
+        for j in jetons + ["".join(jetons)]:
+            if j in self.par_identifiant: scores[self.par_identifiant[j]] = max(scores[self.par_identifiant[j]], 1.0)
+
+        # 2. Jetons du nom : exacts puis approximatifs (meilleure similarité par jeton du chauffeur)
+        meilleurs = defaultdict(dict)
+        for j in [j for j in jetons if len(j) > 1]:
+            proches = {j: 1.0} if j in self.par_jeton else {}
+            if len(j) >= 3: proches.update({k: v for k, v in self._jetons_proches(j).items() if k not in proches})
+            for k, sim in proches.items():
+                for i in self.par_jeton[k]:
+                    if sim > meilleurs[i].get(k, 0): meilleurs[i][k] = sim
+        for i, sims in meilleurs.items():
+            nb = len(self.jetons_chauffeur[i]) or 1
+            scores[i] = max(scores[i], sum(sims.values()) / nb)
+
+        # 3. A priori : chauffeur par défaut du taxi
+        d = self.defaut_taxi.get(str(taxi)) if taxi is not None else None
+        if d is not None: scores[d] += BONUS_DEFAUT
+
+        classes = sorted(scores.items(), key=lambda x: (-x[1], self.noms[x[0]]))[:n]
+        return [(self.noms[i], round(s, 3)) for i, s in classes]
+
+    def meilleur(self, texte, taxi=None, seuil=0.5):
+        res = self.candidats(texte, taxi, n=1)
+        return res[0][0] if res and res[0][1] >= seuil else None
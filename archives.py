@@ -0,0 +1,162 @@
+import os
+import pandas as pd
+from sqlalchemy import text
+
+import calculs
+import donnees
+import recherche
+import taux
+
+# pyarrow (IPC / Parquet) est importé au premier accès à une archive (verifier_pyarrow) : les pages qui ne
+# lisent pas d'archive n'en paient pas le chargement
+pa = pa_ipc = pq = None
+
+# --- CONFIGURATION ARCHIVES ---
+# Une année close = un dossier "archives/annee=2024/" contenant :
+#   revenus.arrow / depenses.arrow (Arrow IPC non compressé -> lecture memory-map)
+#   totaux.parquet (totaux précalculés par Mois / Trimestre / Annee)
+DOSSIER_ARCHIVES = "archives"
+TABLES_ARCHIVABLES = ["revenus", "depenses"]
+
+MONTANTS = {
+    "revenus": ["Meter_Deb", "Meter_Fin", "Meter_Total", "Fixe", "Total_Brut", "Redevance",
+                "Base_Salaire", "Salaire_Chauffeur", "STS", "Credits", "Prix_Fixes", "Visa", "Essence", "Lavage",
+                "Divers", "Impot", "Grand_Total_Remis"],
+    "depenses": ["Montant_HT", "TPS", "TVQ", "Montant_Total"]
+}
+ENTIERS = {"revenus": donnees.COLS_ENTIERS, "depenses": []}
+
+
+def verifier_pyarrow():
+    global pa, pa_ipc, pq
+    if pa is not None: return
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Le module 'pyarrow' est requis pour les archives (pip install pyarrow).")
+    pa, pa_ipc, pq = pyarrow, pyarrow.ipc, pyarrow.parquet
+
+
+def dossier_annee(annee, dossier=DOSSIER_ARCHIVES):
+    return os.path.join(dossier, f"annee={annee}")
+
+
+def chemin_archive(table, annee, dossier=DOSSIER_ARCHIVES):
+    return os.path.join(dossier_annee(annee, dossier), f"{table}.arrow")
+
+
+def annees_archivees(dossier=DOSSIER_ARCHIVES):
+    if not os.path.isdir(dossier): return []
+    annees = [d.split("=", 1)[1] for d in os.listdir(dossier) if d.startswith("annee=")]
+    return sorted([a for a in annees if os.path.exists(chemin_archive("revenus", a, dossier))], reverse=True)
+
+
+def est_archivee(annee, dossier=DOSSIER_ARCHIVES):
+    return os.path.exists(chemin_archive("revenus", str(annee), dossier))
+
+
+# --- PRÉPARATION ---
+def _typer(table, df):
+    df = df.copy()
+    for c in MONTANTS[table]:
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0).astype(float)
+    for c in df.columns:
+        if c not in MONTANTS[table] + ENTIERS[table]:
+            df[c] = df[c].astype(str).replace('nan', '').replace('None', '')
+    return _entiers(table, df)
+
+
+def _entiers(table, df):
+    # Aussi appliqué à la lecture : les archives écrites avant COLS_ENTIERS ont Nb_Appels en float
+    for c in ENTIERS.get(table, []):
+        if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).round().astype("int64")
+    return df
+
+
+def _totaux(df_r, df_d, config):
+    # Mêmes règles que la Synthèse (calculs.totaux_periode, taux en vigueur à chaque date), pour chaque vue
+    blocs = []
+    tps, tvq = taux.taxes_revenus(df_r, config)
+    for vue in calculs.VUES:
+        syn_r, syn_d = calculs.totaux_periode(df_r, df_d, vue, tps, tvq)
+        final = syn_r.join(syn_d, how="outer").fillna(0)
+        final.index.name = "Periode"
+        final = final.reset_index()
+        final.insert(0, "Vue", vue)
+        blocs.append(final)
+    return pd.concat(blocs, ignore_index=True)
+
+
+def _ecrire_arrow(df, chemin):
+    tmp = chemin + ".tmp"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa_ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, chemin)
+
+
+# --- ARCHIVAGE ---
+def archiver_annee(engine, annee, config, dossier=DOSSIER_ARCHIVES):
+    verifier_pyarrow()
+    annee = str(annee)
+    lignes = {}
+    for table in TABLES_ARCHIVABLES:
+        df = pd.read_sql(text(f"SELECT * FROM {table} WHERE Annee = :a"), engine, params={"a": annee})
+        lignes[table] = _typer(table, df)
+    if lignes["revenus"].empty and lignes["depenses"].empty:
+        raise ValueError(f"Aucune donnée pour l'année {annee}.")
+
+    # Une archive existante est complétée (ex : lignes saisies après un premier archivage)
+    if est_archivee(annee, dossier):
+        for table in TABLES_ARCHIVABLES:
+            ancien = lire_archive(table, annee, dossier=dossier)
+            lignes[table] = pd.concat([ancien, lignes[table]], ignore_index=True).drop_duplicates("UUID", keep="last")
+
+    # 1. Écriture des fichiers (temp + rename) AVANT toute suppression
+    os.makedirs(dossier_annee(annee, dossier), exist_ok=True)
+    for table, df in lignes.items(): _ecrire_arrow(df, chemin_archive(table, annee, dossier))
+    totaux = _totaux(lignes["revenus"], lignes["depenses"], config)
+    pq.write_table(pa.Table.from_pandas(totaux, preserve_index=False),
+                   os.path.join(dossier_annee(annee, dossier), "totaux.parquet"))
+
+    # 2. Purge des tables vivantes (une seule transaction)
+    donnees.preparer_versions(engine)
+    with engine.begin() as conn:
+        for table in TABLES_ARCHIVABLES:
+            conn.execute(text(f"DELETE FROM {table} WHERE Annee = :a"), {"a": annee})
+            recherche.indexer(conn, engine, table, retires=lignes[table]["UUID"])
+            donnees.incrementer_version(conn, table)
+    return {t: len(df) for t, df in lignes.items()}
+
+
+# --- LECTURE ---
+def lire_archive(table, annee, colonnes=None, dossier=DOSSIER_ARCHIVES):
+    verifier_pyarrow()
+    chemin = chemin_archive(table, str(annee), dossier)
+    if not os.path.exists(chemin): return pd.DataFrame(columns=colonnes or [])
+    # memory-map : seules les colonnes projetées sont matérialisées en pandas
+    with pa.memory_map(chemin, "r") as source:
+        tbl = pa_ipc.open_file(source).read_all()
+        if colonnes: tbl = tbl.select([c for c in colonnes if c in tbl.column_names])
+        return _entiers(table, tbl.to_pandas())
+
+
+def lire_archive_par_lots(table, annee, colonnes=None, taille=50000, dossier=DOSSIER_ARCHIVES):
+    # Lots de 'taille' lignes convertis un à un (fichier memory-mappé : rien n'est chargé d'avance)
+    verifier_pyarrow()
+    chemin = chemin_archive(table, str(annee), dossier)
+    if not os.path.exists(chemin): return
+    with pa.memory_map(chemin, "r") as source:
+        tbl = pa_ipc.open_file(source).read_all()
+        if colonnes: tbl = tbl.select([c for c in colonnes if c in tbl.column_names])
+        for lot in tbl.to_batches(max_chunksize=taille): yield _entiers(table, lot.to_pandas())
+
+
+def lire_totaux(annee, vue, dossier=DOSSIER_ARCHIVES):
+    verifier_pyarrow()
+    chemin = os.path.join(dossier_annee(str(annee), dossier), "totaux.parquet")
+    df = pq.read_table(chemin, filters=[("Vue", "=", vue)]).to_pandas()
+    return df.drop(columns=["Vue"]).set_index("Periode")
@@ -0,0 +1,131 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import archives
+import donnees
+import flottes
+
+# --- AUDIT DES COMPTEURS ET VALEURS HEBDOMADAIRES ---
+# Tout l'historique des revenus (tables SQL + années archivées) est trié par taxi puis par date. Chaque semaine
+# est comparée à la précédente du MÊME taxi par décalage vectorisé (groupby().shift(), aucune boucle Python) :
+#   Écart compteur      Meter_Deb > Meter_Fin de la semaine précédente (distance non déclarée)
+#   Recul compteur      Meter_Deb < Meter_Fin précédent, ou Meter_Fin < Meter_Deb dans la même semaine
+#   Chevauchement       Date_Debut <= Date_Fin de la semaine précédente
+#   Semaine manquante   jours non couverts entre Date_Fin précédente et Date_Debut
+#   Valeur inhabituelle Essence / Visa / Nb_Appels loin de l'habitude du taxi (z-score robuste : médiane et MAD)
+# Les semaines sans relevé (Meter_Deb et Meter_Fin à 0) sont ignorées pour les compteurs : la suivante est
+# comparée au dernier relevé connu.
+#   python audit_compteurs.py --sortie anomalies.csv
+COLS = ["Date_Debut", "Date_Fin", "Taxi", "Chauffeur", "Meter_Deb", "Meter_Fin", "Essence", "Visa", "Nb_Appels",
+        "UUID"]
+TYPES = ["Écart compteur", "Recul compteur", "Chevauchement", "Semaine manquante", "Valeur inhabituelle"]
+COLONNES = ["Type", "Taxi", "Date_Debut", "Chauffeur", "Champ", "Valeur", "Attendu", "Ecart", "UUID"]
+CHAMPS_STATS = ["Essence", "Visa", "Nb_Appels"]
+TOLERANCE = 0.01  # $ d'écart toléré entre deux relevés (arrondis)
+SEUIL_Z = 3.5  # z-score robuste au-delà duquel une valeur est signalée
+MIN_SEMAINES = 8  # historique minimal d'un taxi avant de juger ses valeurs
+
+
+# --- LECTURE ---
+def charger(engine, dossier=archives.DOSSIER_ARCHIVES):
+    morceaux = [archives.lire_archive("revenus", a, COLS, dossier) for a in archives.annees_archivees(dossier)]
+    morceaux.append(donnees.load_data(engine, "revenus", COLS))
+    morceaux = [m for m in morceaux if len(m)]
+    if not morceaux: return donnees.typer(pd.DataFrame(columns=COLS))
+    return donnees.typer(pd.concat(morceaux, ignore_index=True))
+
+
+# --- CONTRÔLES ---
+def _montant(s):
+    return s.round(2).map("{:.2f}".format)
+
+
+def _jour(s):
+    return s.dt.strftime("%Y-%m-%d").fillna("")
+
+
+def _anomalies(df, masque, type_, champ, valeur, attendu, ecart, format_=_montant):
+    # Seules les lignes signalées sont mises en texte (Valeur / Attendu)
+    a = df.loc[masque, ["Taxi", "Date_Debut", "Chauffeur", "UUID"]].copy()
+    a.insert(0, "Type", type_)
+    a["Champ"], a["Valeur"], a["Attendu"] = champ, format_(valeur[masque]), format_(attendu[masque])
+    a["Ecart"] = ecart[masque].round(2)
+    return a
+
+
+def auditer(df, seuil=SEUIL_Z, tolerance=TOLERANCE):
+    # df : revenus typés (voir charger) -> DataFrame COLONNES, une ligne par anomalie
+    df = df.assign(Taxi=df["Taxi"].astype(str))
+    df = df[df["Taxi"] != ""].sort_values(["Taxi", "Date_Debut", "Date_Fin"], kind="stable", ignore_index=True)
+    taxi = df["Taxi"]
+    res = []
+
+    # Compteurs : dernier relevé connu du même taxi
+    lu = (df["Meter_Deb"] != 0) | (df["Meter_Fin"] != 0)
+    deb, fin = df["Meter_Deb"].where(lu), df["Meter_Fin"].where(lu)
+    recul = fin - deb
+    res.append(_anomalies(df, recul < -tolerance, TYPES[1], "Meter_Fin", fin, deb, recul))
+    # Un Meter_Fin en recul (souvent oublié, à 0) n'est pas une référence : marqué -1, la semaine suivante n'est
+    # pas jugée (les semaines sans relevé, elles, sont sautées par ffill)
+    fin_prec = fin.mask(recul < -tolerance, -1.0).groupby(taxi).ffill().groupby(taxi).shift()
+    fin_prec = fin_prec.where(fin_prec >= 0)
+    saut = deb - fin_prec
+    res.append(_anomalies(df, saut > tolerance, TYPES[0], "Meter_Deb", deb, fin_prec, saut))
+    res.append(_anomalies(df, saut < -tolerance, TYPES[1], "Meter_Deb", deb, fin_prec, saut))
+
+    # Dates : semaine précédente du même taxi (écart en jours)
+    date_prec = df["Date_Fin"].groupby(taxi).shift()
+    jours = (df["Date_Debut"] - date_prec).dt.days.astype("float64")
+    attendu = date_prec + pd.Timedelta(days=1)
+    res.append(_anomalies(df, jours <= 0, TYPES[2], "Date_Debut", df["Date_Debut"], attendu, jours - 1, _jour))
+    res.append(_anomalies(df, jours > 1, TYPES[3], "Date_Debut", df["Date_Debut"], attendu, jours - 1, _jour))
+
+    # Valeurs : z-score robuste par taxi, seulement avec assez d'historique
+    assez = taxi.map(taxi.value_counts()) >= MIN_SEMAINES
+    for c in CHAMPS_STATS:
+        x = df[c]
+        med = x.groupby(taxi).transform("median")
+        mad = (x - med).abs().groupby(taxi).transform("median")
+        z = 0.6745 * (x - med) / mad.where(mad > 0)
+        res.append(_anomalies(df, assez & (z.abs() > seuil), TYPES[4], c, x, med, z))
+
+    out = pd.concat(res, ignore_index=True)[COLONNES]
+    return out.sort_values(["Taxi", "Date_Debut", "Type"], kind="stable", ignore_index=True)
+
+
+def resume(anomalies):
+    # Nombre d'anomalies par taxi et par type (tous les types en colonnes, même absents)
+    t = anomalies.groupby(["Taxi", "Type"]).size().unstack(fill_value=0)
+    return t.reindex(columns=TYPES, fill_value=0)
+
+
+# --- LIGNE DE COMMANDE ---
+def main():
+    p = argparse.ArgumentParser(description="Audit des compteurs (continuité) et des valeurs inhabituelles.")
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"))
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte de flottes.json : sa base et ses archives (remplace --db et --dossier)")
+    p.add_argument("--dossier", default=archives.DOSSIER_ARCHIVES, help="dossier des archives")
+    p.add_argument("--seuil", type=float, default=SEUIL_Z, help="z-score robuste des valeurs inhabituelles")
+    p.add_argument("--sortie", default=None, help="fichier CSV des anomalies")
+    a = p.parse_args()
+
+    t0 = time.perf_counter()
+    engine, dossier = (flottes.source(a.flotte)[:2] if a.flotte else (create_engine(a.db), a.dossier))
+    df = charger(engine, dossier)
+    t1 = time.perf_counter()
+    res = auditer(df, a.seuil)
+    t2 = time.perf_counter()
+    print(resume(res).to_string() if len(res) else "Aucune anomalie.")
+    print(f"{len(df)} semaines lues en {t1 - t0:.2f} s, {len(res)} anomalie(s) trouvée(s) en {t2 - t1:.2f} s")
+    if a.sortie:
+        res.to_csv(a.sortie, index=False)
+        print(f"-> {a.sortie}")
+
+
+if __name__ == "__main__":
+    main()
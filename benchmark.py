@@ -0,0 +1,220 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import appariement
+import calculs
+import donnees
+import generer_donnees
+import lecture_pdf
+
+# --- BANC D'ESSAI DE BOUT EN BOUT ---
+# Pour chaque échelle (taxis x chauffeurs x années) : flotte synthétique, puis chronométrage des opérations
+# clés sur une base SQLite locale (chemin app_taxi.py) et sur le magasin CSV (chemin MonTaxi.py).
+#   python benchmark.py --echelles 10x20x1,50x100x3 --repetitions 5 --sortie bench.json
+#   python benchmark.py --echelles 10x20x1 --comparer bench.json
+ECHELLES_DEFAUT = "10x20x1,50x100x3"
+PDF_EXEMPLE = "test_taxi_parfait.pdf"
+TAILLE_HISTORIQUE = 50
+GRAINE = 31
+
+
+def chronometrer(fn, repetitions):
+    durees = []
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        fn()
+        durees.append(time.perf_counter() - t0)
+    return {"min_ms": min(durees) * 1000, "median_ms": statistics.median(durees) * 1000,
+            "max_ms": max(durees) * 1000}
+
+
+def ligne_test(tables):
+    # Une semaine de plus pour le premier taxi (mêmes règles que le formulaire)
+    d = tables["revenus"]["Date_Debut"].max() + pd.Timedelta(days=7)
+    saisie = {c: 0.0 for c in calculs.SAISIES}
+    saisie.update({"Meter_Deb": 1000.0, "Meter_Fin": 2200.0, "Nb_Appels": 40.0, "Essence": 200.0})
+    calc = calculs.calculer_reglement(saisie, generer_donnees.CONFIG_DEFAUT)
+    return {"Date_Debut": d, **calculs.champs_periode(d), "Taxi": tables["taxis"]["Taxi_ID"].iloc[0],
+            "Chauffeur": tables["taxis"]["Chauffeur_Defaut"].iloc[0], **saisie, **calc, "UUID": str(uuid.uuid4())}
+
+
+# --- MAGASIN SQLITE (app_taxi.py) ---
+def operations_sql(engine, tables, pdf, config):
+    annee = tables["revenus"]["Annee"].max()
+    base = donnees.load_data(engine, "revenus")
+    cols_r = ["Date_Debut", "Mois", "Annee", "Trimestre", "Taxi", "Total_Brut", "Salaire_Chauffeur",
+              "Grand_Total_Remis", "Essence", "Lavage"]
+    cols_d = ["Date", "Mois", "Annee", "Trimestre", "Taxi", "Categorie", "Montant_Total", "TPS", "TVQ"]
+    cle = base.iloc[len(base) // 2]
+
+    def synthese():
+        df_r = donnees.load_data(engine, "revenus", cols_r, {"Annee": annee})
+        df_d = donnees.load_data(engine, "depenses", cols_d, {"Annee": annee})
+        return calculs.calculer_synthese(df_r, df_d, "Mois", config["tps"], config["tvq"])
+
+    def historique():
+        df = donnees.load_data(engine, "revenus")
+        return df[["Date_Debut", "Taxi", "Chauffeur", "Grand_Total_Remis"]].sort_values(
+            "Date_Debut", ascending=False).head(TAILLE_HISTORIQUE)
+
+    def doublon():
+        df = donnees.load_data(engine, "revenus")
+        return df[(df["Date_Debut"] == cle["Date_Debut"]) & (df["Taxi"].astype(str) == str(cle["Taxi"]))]
+
+    index = appariement.IndexChauffeurs(donnees.load_data(engine, "chauffeurs"), donnees.load_data(engine, "taxis"))
+    return {
+        "chargement": lambda: donnees.load_data(engine, "revenus"),
+        "enregistrement_ligne": lambda: donnees.inserer_ligne(engine, "revenus", ligne_test(tables)),
+        "synthese_annee": synthese,
+        "page_historique": historique,
+        "controle_doublon": doublon,
+        "import_pdf": lambda: importer_pdf(pdf, index, config),
+    }
+
+
+# --- MAGASIN CSV (MonTaxi.py) ---
+def lire_csv(chemin):
+    with open(chemin, 'r', encoding='utf-8') as f: return list(csv.DictReader(f))
+
+
+def operations_csv(dossier, tables, pdf, config):
+    f_rev = os.path.join(dossier, donnees.FICHIERS_CSV["revenus"])
+    f_dep = os.path.join(dossier, donnees.FICHIERS_CSV["depenses"])
+    annee = tables["revenus"]["Annee"].max()
+    nouvelle = donnees.vers_csv("revenus", pd.DataFrame([ligne_test(tables)])).iloc[0].tolist()
+    cle = lire_csv(f_rev)[len(tables["revenus"]) // 2]
+
+    def enregistrement():
+        # crud_trans : lecture complète puis réécriture du fichier
+        with open(f_rev, 'r', encoding='utf-8') as f: rows = list(csv.reader(f))
+        with open(f_rev, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(rows[0])
+            w.writerows([r for r in rows[1:] if r[-1] != nouvelle[-1]] + [nouvelle])
+
+    def synthese():
+        # calculer_synthese : balayage ligne à ligne des deux fichiers
+        stats = {}
+        div = 1 + config["tps"] / 100 + config["tvq"] / 100
+        for row in lire_csv(f_rev):
+            if row["Annee"] != annee: continue
+            s = stats.setdefault(row["Mois"], [0.0] * 5)
+            s[0] += float(row["Total_Brut"]); s[1] += float(row["Salaire_Chauffeur"])
+            s[2] += float(row["Grand_Total_Remis"])
+            ht = (float(row["Essence"]) + float(row["Lavage"])) / div
+            s[3] += ht * config["tps"] / 100; s[4] += ht * config["tvq"] / 100
+        for row in lire_csv(f_dep):
+            if row["Annee"] != annee: continue
+            s = stats.setdefault(row["Mois"], [0.0] * 5)
+            s[3] += float(row["TPS"]); s[4] += float(row["TVQ"])
+        return stats
+
+    def historique():
+        # charger_tab_trans : toutes les lignes sont insérées dans la liste
+        with open(f_rev, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f); next(reader, None)
+            return [(r[0], r[5], r[6], r[-2] + " $", r[-1]) for r in reader if len(r) > 1]
+
+    def doublon():
+        return [r for r in lire_csv(f_rev) if r["Date_Debut"] == cle["Date_Debut"] and r["Taxi_ID"] == cle["Taxi_ID"]]
+
+    df_c = pd.read_csv(os.path.join(dossier, "chauffeurs.csv"), dtype=str, keep_default_na=False)
+    df_t = pd.read_csv(os.path.join(dossier, "taxis.csv"), dtype=str, keep_default_na=False)
+    index = appariement.IndexChauffeurs(df_c, df_t)
+    return {
+        "chargement": lambda: lire_csv(f_rev),
+        "enregistrement_ligne": enregistrement,
+        "synthese_annee": synthese,
+        "page_historique": historique,
+        "controle_doublon": doublon,
+        "import_pdf": lambda: importer_pdf(pdf, index, config),
+    }
+
+
+def importer_pdf(pdf, index, config):
+    data, _ = lecture_pdf.analyser_pdf(pdf, config["cout_appel"])
+    if data: data["Chauffeur"] = index.meilleur(data.get("Chauffeur_Raw", ""), data.get("Taxi"))
+    return data
+
+
+# --- EXÉCUTION ---
+def lire_echelle(txt):
+    t, c, a = [int(x) for x in txt.lower().split("x")]
+    return t, c, a
+
+
+def executer(echelles, repetitions, magasins):
+    config = generer_donnees.CONFIG_DEFAUT
+    pdf = open(PDF_EXEMPLE, "rb").read() if os.path.exists(PDF_EXEMPLE) else None
+    resultats = []
+    for txt in echelles:
+        nb_t, nb_c, nb_a = lire_echelle(txt)
+        tables = generer_donnees.generer(nb_t, nb_c, nb_a, graine=GRAINE)
+        lignes = len(tables["revenus"])
+        tmp = tempfile.mkdtemp(prefix="montaxi_bench_")
+        try:
+            ops = {}
+            if "sqlite" in magasins:
+                engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+                generer_donnees.ecrire_sql(tables, engine)
+                ops["sqlite"] = operations_sql(engine, tables, pdf, config)
+            if "csv" in magasins:
+                generer_donnees.ecrire_csv(tables, tmp)
+                ops["csv"] = operations_csv(tmp, tables, pdf, config)
+            for magasin, table_ops in ops.items():
+                for nom, fn in table_ops.items():
+                    if nom == "import_pdf" and pdf is None: continue
+                    fn()  # échauffement (caches disque / imports paresseux)
+                    mesure = chronometrer(fn, repetitions)
+                    resultats.append({"echelle": txt, "magasin": magasin, "operation": nom, "lignes": lignes,
+                                      **{k: round(v, 3) for k, v in mesure.items()}})
+                    print(f"{txt:>12} {magasin:>6} {nom:<22} {mesure['median_ms']:10.2f} ms (méd.)")
+                if magasin == "sqlite": engine.dispose()
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return {"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "pandas": pd.__version__, "repetitions": repetitions, "resultats": resultats}
+
+
+def comparer(actuel, reference):
+    cle = lambda r: (r["echelle"], r["magasin"], r["operation"])
+    ref = {cle(r): r for r in reference["resultats"]}
+    print(f"\n--- Comparaison avec la référence du {reference.get('date', '?')} ---")
+    for r in actuel["resultats"]:
+        ancien = ref.get(cle(r))
+        if not ancien: continue
+        ratio = r["median_ms"] / ancien["median_ms"] if ancien["median_ms"] else 0
+        print(f"{r['echelle']:>12} {r['magasin']:>6} {r['operation']:<22} "
+              f"{ancien['median_ms']:10.2f} -> {r['median_ms']:10.2f} ms  (x{ratio:.2f})")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Banc d'essai MonTaxi (SQLite et CSV) sur flottes synthétiques.")
+    p.add_argument("--echelles", default=ECHELLES_DEFAUT, help="taxis x chauffeurs x années, séparées par des virgules")
+    p.add_argument("--repetitions", type=int, default=5)
+    p.add_argument("--magasins", default="sqlite,csv")
+    p.add_argument("--sortie", default=None, help="fichier JSON des résultats")
+    p.add_argument("--comparer", default=None, help="JSON d'une exécution précédente")
+    a = p.parse_args()
+
+    res = executer(a.echelles.split(","), a.repetitions, a.magasins.split(","))
+    if a.sortie:
+        with open(a.sortie, 'w', encoding='utf-8') as f: json.dump(res, f, indent=2, ensure_ascii=False)
+    if a.comparer:
+        with open(a.comparer, 'r', encoding='utf-8') as f: comparer(res, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# --- BANC D'ESSAI DU DÉMARRAGE (app_taxi.py) ---
+# Pour chaque page, dans un processus Python neuf (streamlit.testing.AppTest, sans navigateur) :
+#   froid : premier rendu après le lancement (imports de l'application, connexion, premières requêtes)
+#   chaud : premier rendu d'une nouvelle session, modules et caches déjà chargés par le processus
+# La page est choisie par l'URL (?page=...), comme un lien direct vers app_taxi.py.
+#   python benchmark_demarrage.py --db sqlite:///montaxi_synthetique.db --repetitions 5 --sortie demarrage.json
+#   python benchmark_demarrage.py --db sqlite:///montaxi_synthetique.db --comparer demarrage.json
+APP = "app_taxi.py"
+PAGES = ["Transactions", "Dépenses", "Chauffeurs", "Flotte Taxis", "Synthèse", "Analytique", "Paramètres",
+         "Diagnostics"]
+# Modules à chargement différé : ils ne doivent apparaître que sur les pages qui s'en servent
+MODULES_LOURDS = ["pypdf", "pdfplumber", "pyarrow.parquet", "fpdf"]
+DELAI = 120
+
+
+# --- PROCESSUS ENFANT (une page) ---
+def mesurer_page(page, repetitions):
+    from streamlit.testing.v1 import AppTest  # streamlit est déjà chargé par le serveur avant le premier rendu
+
+    def rendu():
+        at = AppTest.from_file(APP, default_timeout=DELAI)
+        at.query_params["page"] = page
+        if page == "Diagnostics": at.query_params["diag"] = "1"
+        t0 = time.perf_counter()
+        at.run()
+        duree = time.perf_counter() - t0
+        if at.exception: raise RuntimeError(f"{page} : {at.exception[0].value}")
+        return duree * 1000
+
+    froid = rendu()
+    chauds = [rendu() for _ in range(repetitions)]
+    return {"page": page, "froid_ms": round(froid, 1), "chaud_median_ms": round(statistics.median(chauds), 1),
+            "chaud_min_ms": round(min(chauds), 1),
+            "modules_lourds": [m for m in MODULES_LOURDS if m in sys.modules]}
+
+
+# --- EXÉCUTION ---
+def executer(pages, repetitions, db):
+    env = {**os.environ, "MONTAXI_DB": db} if db else dict(os.environ)
+    dossier = os.path.dirname(os.path.abspath(__file__))
+    resultats = []
+    for page in pages:
+        p = subprocess.run([sys.executable, os.path.abspath(__file__), "--enfant", page,
+                            "--repetitions", str(repetitions)], cwd=dossier, env=env, capture_output=True, text=True)
+        if p.returncode != 0:
+            print(f"{page:<14} ÉCHEC : {(p.stderr.strip().splitlines() or ['?'])[-1]}")
+            continue
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        resultats.append(r)
+        print(f"{page:<14} froid {r['froid_ms']:9.1f} ms   chaud {r['chaud_median_ms']:9.1f} ms (méd.)   "
+              f"modules lourds : {', '.join(r['modules_lourds']) or '-'}")
+    return {"date": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+            "repetitions": repetitions, "resultats": resultats}
+
+
+def comparer(actuel, reference):
+    ref = {r["page"]: r for r in reference["resultats"]}
+    print(f"\n--- Comparaison avec la référence du {reference.get('date', '?')} ---")
+    for r in actuel["resultats"]:
+        ancien = ref.get(r["page"])
+        if not ancien: continue
+        print(f"{r['page']:<14} froid {ancien['froid_ms']:9.1f} -> {r['froid_ms']:9.1f} ms   "
+              f"chaud {ancien['chaud_median_ms']:9.1f} -> {r['chaud_median_ms']:9.1f} ms")
+
+
+def main():
+    p = argparse.ArgumentParser(description="Temps de premier rendu de chaque page de app_taxi.py (froid / chaud).")
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB"), help="URL SQLAlchemy (défaut : MONTAXI_DB)")
+    p.add_argument("--pages", default=",".join(PAGES))
+    p.add_argument("--repetitions", type=int, default=5, help="rendus à chaud par page")
+    p.add_argument("--sortie", default=None, help="fichier JSON des résultats")
+    p.add_argument("--comparer", default=None, help="JSON d'une exécution précédente")
+    p.add_argument("--enfant", default=None, help=argparse.SUPPRESS)
+    a = p.parse_args()
+
+    if a.enfant:
+        print(json.dumps(mesurer_page(a.enfant, a.repetitions), ensure_ascii=False))
+        return
+    res = executer(a.pages.split(","), a.repetitions, a.db)
+    if a.sortie:
+        with open(a.sortie, 'w', encoding='utf-8') as f: json.dump(res, f, indent=2, ensure_ascii=False)
+    if a.comparer:
+        with open(a.comparer, 'r', encoding='utf-8') as f: comparer(res, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
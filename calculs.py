@@ -0,0 +1,122 @@
+import pandas as pd
+from datetime import timedelta
+
+import taux
+
+# --- FORMULE DE RÈGLEMENT (Transactions) ---
+# Fonctionne sur des valeurs simples (formulaire) comme sur des colonnes pandas (traitement en lot).
+SAISIES = ["Meter_Deb", "Meter_Fin", "Fixe", "Nb_Appels", "STS", "Credits", "Prix_Fixes", "Visa", "Essence",
+           "Lavage", "Divers", "Impot"]
+DEDUCTIONS = ["STS", "Credits", "Visa", "Essence", "Lavage", "Divers", "Prix_Fixes"]
+
+
+def calculer_reglement(v, config):
+    mt = v["Meter_Fin"] - v["Meter_Deb"]
+    brut = mt + v["Fixe"]
+    redev = v["Nb_Appels"] * config["cout_appel"]
+    base = brut - redev
+    sal = base * (config["pct_chauf"] / 100)
+    imp_calc = sal * (config["taux_impot"] / 100)
+    if isinstance(v["Impot"], pd.Series):
+        imp = v["Impot"].where(v["Impot"] > 0, imp_calc)
+    else:
+        imp = v["Impot"] if v["Impot"] > 0 else imp_calc
+    ded = sum([v[c] for c in DEDUCTIONS])
+    net = brut - sal - ded + imp
+    return {"Meter_Total": mt, "Total_Brut": brut, "Redevance": redev, "Base_Salaire": base,
+            "Salaire_Chauffeur": round(sal, 2), "Impot": round(imp, 2), "Grand_Total_Remis": round(net, 2)}
+
+
+def _num(v):
+    try:
+        return float(str(v).replace(',', '.').replace('$', '').replace(' ', '').strip() or 0)
+    except:
+        return 0.0
+
+
+def saisie_depuis_pdf(data):
+    # Montants lus par lecture_pdf.analyser_pdf -> champs du formulaire (un total compteur seul = Meter_Fin)
+    s = {c: _num(data.get(c, 0)) for c in SAISIES}
+    if _num(data.get("Meter_Total", 0)) > 0: s["Meter_Deb"], s["Meter_Fin"] = 0.0, _num(data["Meter_Total"])
+    s["Nb_Appels"] = int(s["Nb_Appels"])
+    return s
+
+
+def champs_periode(d):
+    return {"Date_Fin": d + timedelta(days=6), "Mois": d.strftime("%Y-%m"), "Annee": str(d.year),
+            "Trimestre": f"T{(d.month - 1) // 3 + 1}"}
+
+
+# --- RECALCUL EN LOT (grille d'édition, règlement en lot) ---
+# Mêmes règles que les formulaires, appliquées à toutes les lignes en une passe vectorisée,
+# avec les taux en vigueur à la date de chaque ligne (taux.en_vigueur).
+def periode_colonnes(dates):
+    d = pd.to_datetime(dates, errors='coerce')
+    return {"Mois": d.dt.strftime("%Y-%m"), "Annee": d.dt.year.astype("Int64").astype(str),
+            "Trimestre": "T" + d.dt.quarter.astype("Int64").astype(str)}
+
+
+def recalculer_revenus(df, config):
+    df = df.copy()
+    df["Date_Debut"] = pd.to_datetime(df["Date_Debut"], errors='coerce')
+    df["Date_Fin"] = df["Date_Debut"] + timedelta(days=6)
+    for c, s in periode_colonnes(df["Date_Debut"]).items(): df[c] = s
+    for c in SAISIES: df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0)
+    t = taux.en_vigueur(df["Date_Debut"], config)
+    for c, s in calculer_reglement({c: df[c] for c in SAISIES}, {**config, **t}).items(): df[c] = s
+    return df
+
+
+def ventiler_taxes(total, taxes_incluses, tps, tvq):
+    # Total TTC -> HT / TPS / TVQ (formulaire Dépenses, case "Taxes incluses ?")
+    total = pd.to_numeric(total, errors='coerce').fillna(0.0)
+    ht = total.where(~taxes_incluses, total / (1 + (tps / 100) + (tvq / 100)))
+    return {"Montant_HT": ht.round(2), "TPS": (ht * (tps / 100)).where(taxes_incluses, 0.0).round(2),
+            "TVQ": (ht * (tvq / 100)).where(taxes_incluses, 0.0).round(2), "Montant_Total": total}
+
+
+def recalculer_depenses(df, taxes_incluses, config):
+    df = df.copy()
+    df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
+    for c, s in periode_colonnes(df["Date"]).items(): df[c] = s
+    t = taux.en_vigueur(df["Date"], config)
+    for c, s in ventiler_taxes(df["Montant_Total"], taxes_incluses.astype(bool), t["tps"], t["tvq"]).items():
+        df[c] = s
+    return df
+
+
+# --- SYNTHÈSE (totaux par période) ---
+VUES = {"Mois": "Mois", "Trimestre": "Trimestre", "Annuel": "Annee"}
+TOTAUX_REVENUS = ["Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis", "Ess_TPS", "Ess_TVQ"]
+TOTAUX_DEPENSES = ["Montant_Total", "TPS", "TVQ"]
+
+
+def totaux_periode(df_r, df_d, vue, tps, tvq):
+    # Taxes implicites essence/lavage + trimestre des dépenses recalculé depuis la date
+    # tps / tvq : taux en % (valeur unique ou Series alignée sur df_r, voir taux.taxes_revenus)
+    grp = VUES[vue]
+    div = 1 + (tps / 100) + (tvq / 100)
+    df_r = df_r.copy()
+    df_r["Ess_TPS"] = ((df_r["Essence"] + df_r["Lavage"]) / div) * (tps / 100)
+    df_r["Ess_TVQ"] = ((df_r["Essence"] + df_r["Lavage"]) / div) * (tvq / 100)
+    syn_r = df_r.groupby(grp)[TOTAUX_REVENUS].sum()
+
+    df_d = df_d.copy()
+    if vue == "Trimestre":
+        df_d["Trimestre"] = "T" + ((pd.to_datetime(df_d["Date"]).dt.month - 1) // 3 + 1).astype(str)
+    syn_d = df_d.groupby(grp)[TOTAUX_DEPENSES].sum()
+    return syn_r, syn_d
+
+
+def assembler_synthese(syn_r, syn_d):
+    final = syn_r.join(syn_d, lsuffix="_r", rsuffix="_d", how="outer").fillna(0)
+    final["TPS à Recevoir"] = final.get("Ess_TPS", 0) + final.get("TPS", 0)
+    final["TVQ à Recevoir"] = final.get("Ess_TVQ", 0) + final.get("TVQ", 0)
+    final["PROFIT NET"] = final.get("Grand_Total_Remis", 0) - final.get("Montant_Total", 0)
+    return final.rename(
+        columns={"Total_Brut": "Revenu BRUT", "Salaire_Chauffeur": "Salaire (40%)", "Grand_Total_Remis": "Net Perçu",
+                 "Montant_Total": "Dépenses Garage"})
+
+
+def calculer_synthese(df_r, df_d, vue, tps, tvq):
+    return assembler_synthese(*totaux_periode(df_r, df_d, vue, tps, tvq))
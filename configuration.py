@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import threading
+
+# --- CONFIGURATION PARTAGÉE (app_taxi.py, MonTaxi.py, outils en ligne de commande) ---
+# Un seul schéma de clés pour config_taxi.json. Le fichier n'est relu que si sa date de modification change
+# (un rerun Streamlit ne coûte qu'un os.stat) et n'est écrit que sur sauvegarde explicite, de façon atomique
+# (fichier temporaire + os.replace) : une autre session ne lit jamais un fichier à moitié écrit.
+FILE_CONFIG = "config_taxi.json"
+DEFAULT_CONFIG = {
+    "cout_appel": 1.05, "pct_chauf": 40.0, "taux_impot": 18.0,
+    "tps": 5.0, "tvq": 9.975,
+    "categories": ["Réparation mécanique", "Carrosserie", "Pneus", "Assurance", "SAAQ", "Admin", "Pièces", "Autre"]
+}
+# Anciennes clés (MonTaxi.py, premières versions de app_taxi.py) -> clés communes
+ALIAS = {"pourcent_chauffeur": "pct_chauf", "taux_tps": "tps", "taux_tvq": "tvq", "cats": "categories"}
+NUMERIQUES = ["cout_appel", "pct_chauf", "taux_impot", "tps", "tvq"]
+
+_cache = {}
+_verrou = threading.Lock()
+
+
+def normaliser(brut):
+    config = {k: v for k, v in DEFAULT_CONFIG.items()}
+    for k, v in brut.items():
+        cle = ALIAS.get(k, k)
+        if cle != k and cle in brut: continue  # la clé commune l'emporte sur l'ancienne
+        config[cle] = v
+    for k in NUMERIQUES:
+        try:
+            config[k] = float(str(config[k]).replace(',', '.'))
+        except:
+            config[k] = DEFAULT_CONFIG[k]
+    if not isinstance(config["categories"], list) or not config["categories"]:
+        config["categories"] = list(DEFAULT_CONFIG["categories"])
+    return config
+
+
+def _signature(chemin):
+    try:
+        st = os.stat(chemin)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+def charger(chemin=FILE_CONFIG):
+    # Copie du dictionnaire en cache : l'appelant peut la modifier sans toucher au cache
+    sig = _signature(chemin)
+    with _verrou:
+        e = _cache.get(chemin)
+        if e is None or e[0] != sig:
+            config = normaliser({})
+            if sig is not None:
+                try:
+                    with open(chemin, 'r', encoding='utf-8') as f: config = normaliser(json.load(f))
+                except:
+                    if e is not None: config = e[1]  # fichier illisible : on garde la dernière version valide
+            e = _cache[chemin] = (sig, config)
+    return {k: (list(v) if isinstance(v, list) else v) for k, v in e[1].items()}
+
+
+def sauvegarder(config, chemin=FILE_CONFIG):
+    # Les clés absentes de 'config' (ex : ajoutées par l'autre application) sont conservées
+    config = normaliser({**charger(chemin), **config})
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    fd, tmp = tempfile.mkstemp(prefix=".config_", suffix=".tmp", dir=dossier)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, chemin)
+    except:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    with _verrou:
+        _cache[chemin] = (_signature(chemin), config)
+    return charger(chemin)
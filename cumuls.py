@@ -0,0 +1,163 @@
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+import archives
+import donnees
+import partitions
+
+# --- CUMULS MENSUELS (Analytique) ---
+# Table dérivée "cumuls_mensuels" : une ligne par (Taxi, Chauffeur, Mois) avec les sommes revenus / dépenses.
+# Maintenue de façon incrémentale : chaque enregistrement ne recalcule que les mois touchés.
+# Les années archivées restent dans les cumuls : archives Arrow et lignes vivantes de la même année s'additionnent.
+TABLE_CUMULS = "cumuls_mensuels"
+TABLES_SOURCES = ["revenus", "depenses"]
+CLES = ["Taxi", "Chauffeur", "Mois"]
+SOMMES_REVENUS = ["Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis"]
+MESURES = ["Semaines", *SOMMES_REVENUS, "Nb_Depenses", "Depenses"]
+COLONNES = [*CLES, "Annee", *MESURES]
+
+
+def creer_table(engine):
+    if TABLE_CUMULS in sqlalchemy.inspect(engine).get_table_names(): return False
+    dtypes = {c: sqlalchemy.types.String(64) for c in [*CLES, "Annee"]}
+    dtypes.update({c: sqlalchemy.types.Float() for c in MESURES})
+    pd.DataFrame(columns=COLONNES).to_sql(TABLE_CUMULS, engine, if_exists='fail', index=False, dtype=dtypes)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX idx_{TABLE_CUMULS}_mois ON {TABLE_CUMULS} (Mois)"))
+    return True
+
+
+def assurer(engine, dossier=archives.DOSSIER_ARCHIVES):
+    # Première utilisation : table créée puis remplie depuis l'historique complet
+    if creer_table(engine): reconstruire(engine, dossier)
+
+
+# --- AGRÉGATS SQL (GROUP BY côté base, seuls les mois demandés sont lus) ---
+def _num(engine, col):
+    return f"CAST(COALESCE(NULLIF({col}, ''), '0') AS {'REAL' if partitions.est_sqlite(engine) else 'DECIMAL(12,2)'})"
+
+
+def _filtre_mois(mois):
+    mois = sorted({str(m) for m in mois})
+    annees = sorted({m[:4] for m in mois})
+    params = {f"m{i}": m for i, m in enumerate(mois)}
+    params.update({f"a{i}": a for i, a in enumerate(annees)})
+    clause = (f"Annee IN ({', '.join(':a' + str(i) for i in range(len(annees)))}) "
+              f"AND Mois IN ({', '.join(':m' + str(i) for i in range(len(mois)))})")
+    return clause, params
+
+
+def _agreger_sql(engine, mois=None):
+    where, params = _filtre_mois(mois) if mois is not None else ("1 = 1", {})
+    s_rev = ", ".join([f"SUM({_num(engine, c)}) AS {c}" for c in SOMMES_REVENUS])
+    rev = pd.read_sql(text(f"SELECT Taxi, Chauffeur, Mois, COUNT(*) AS Semaines, {s_rev} FROM revenus "
+                           f"WHERE {where} GROUP BY Taxi, Chauffeur, Mois"), engine, params=params)
+    dep = pd.read_sql(text(f"SELECT Taxi, Chauffeur, Mois, COUNT(*) AS Nb_Depenses, "
+                           f"SUM({_num(engine, 'Montant_Total')}) AS Depenses FROM depenses "
+                           f"WHERE {where} GROUP BY Taxi, Chauffeur, Mois"), engine, params=params)
+    return _fusionner(rev, dep)
+
+
+def _agreger_archive(annee, dossier=archives.DOSSIER_ARCHIVES, mois=None):
+    rev = archives.lire_archive("revenus", annee, colonnes=[*CLES, *SOMMES_REVENUS], dossier=dossier)
+    dep = archives.lire_archive("depenses", annee, colonnes=[*CLES, "Montant_Total"], dossier=dossier)
+    if mois is not None:
+        rev, dep = rev[rev["Mois"].isin(mois)], dep[dep["Mois"].isin(mois)]
+    rev = rev.groupby(CLES, as_index=False).agg(Semaines=("Mois", "size"), **{c: (c, "sum") for c in SOMMES_REVENUS})
+    dep = dep.groupby(CLES, as_index=False).agg(Nb_Depenses=("Mois", "size"), Depenses=("Montant_Total", "sum"))
+    return _fusionner(rev, dep)
+
+
+def _fusionner(rev, dep):
+    for df in (rev, dep):
+        for c in CLES: df[c] = df[c].fillna("").astype(str)
+    df = rev.merge(dep, on=CLES, how="outer")
+    df["Annee"] = df["Mois"].str[:4]
+    for c in MESURES: df[c] = pd.to_numeric(df.get(c), errors='coerce').fillna(0.0).astype(float)
+    return df[COLONNES]
+
+
+def _cumuler(engine, dossier, mois=None):
+    # Lignes vivantes + archives : une année archivée peut encore recevoir des lignes en SQL, les deux s'additionnent
+    blocs = [_agreger_sql(engine, mois)]
+    annees = archives.annees_archivees(dossier)
+    if mois is not None: annees = [a for a in annees if a in {m[:4] for m in mois}]
+    for a in annees:
+        try:
+            blocs.append(_agreger_archive(a, dossier, mois))
+        except RuntimeError:
+            pass
+    return pd.concat(blocs, ignore_index=True).groupby([*CLES, "Annee"], as_index=False)[MESURES].sum()[COLONNES]
+
+
+# --- MAINTENANCE ---
+def rafraichir(engine, mois, dossier=archives.DOSSIER_ARCHIVES):
+    # Recalcule uniquement les mois touchés par un enregistrement (DELETE + INSERT dans une transaction)
+    mois = sorted({str(m) for m in mois if str(m or "").strip()})
+    if not mois: return 0
+    creer_table(engine)
+    df = _cumuler(engine, dossier, mois)
+    where, params = _filtre_mois(mois)
+    donnees.preparer_versions(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {TABLE_CUMULS} WHERE {where}"), params)
+        df.to_sql(TABLE_CUMULS, conn, if_exists='append', index=False)
+        donnees.incrementer_version(conn, TABLE_CUMULS)
+    return len(df)
+
+
+def reconstruire(engine, dossier=archives.DOSSIER_ARCHIVES):
+    creer_table(engine)
+    df = _cumuler(engine, dossier)
+    donnees.preparer_versions(engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {TABLE_CUMULS}"))
+        df.to_sql(TABLE_CUMULS, conn, if_exists='append', index=False)
+        donnees.incrementer_version(conn, TABLE_CUMULS)
+    return len(df)
+
+
+def mois_touches(df, uuids, col_date):
+    # Mois des lignes ciblées (avant modification) -> à recalculer avec le mois de la nouvelle ligne
+    sel = df[df["UUID"].isin(uuids)]
+    return pd.to_datetime(sel[col_date], errors='coerce').dt.strftime("%Y-%m").dropna().tolist()
+
+
+# --- LECTURE / ANALYSES ---
+def annees(engine):
+    df = pd.read_sql(text(f"SELECT DISTINCT Annee FROM {TABLE_CUMULS}"), engine)
+    return sorted([a for a in df["Annee"].astype(str) if a.strip()], reverse=True)
+
+
+def charger(engine, annees=None):
+    sql, params = f"SELECT * FROM {TABLE_CUMULS}", {}
+    if annees:
+        sql += f" WHERE Annee IN ({', '.join(':a' + str(i) for i in range(len(annees)))})"
+        params = {f"a{i}": str(a) for i, a in enumerate(annees)}
+    df = pd.read_sql(text(sql), engine, params=params)
+    df[MESURES] = df[MESURES].astype(float)
+    df["Profit"] = df["Grand_Total_Remis"] - df["Depenses"]
+    return df
+
+
+def classement(df, dim):
+    # Une ligne par Taxi (ou Chauffeur) + série mensuelle du profit pour la mini-courbe
+    mois = sorted(df["Mois"].unique())
+    par_mois = df.pivot_table(index=dim, columns="Mois", values="Profit", aggfunc="sum", fill_value=0.0)
+    par_mois = par_mois.reindex(columns=mois, fill_value=0.0)
+    res = df.groupby(dim)[["Semaines", "Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis", "Depenses",
+                           "Profit"]].sum()
+    res["Profit / Semaine"] = (res["Profit"] / res["Semaines"].where(res["Semaines"] > 0)).fillna(0.0)
+    res["Tendance"] = par_mois.reindex(res.index).values.round(2).tolist()
+    return res.sort_values("Profit", ascending=False)
+
+
+def detail(df, dim, valeur):
+    # Drill-down : évolution mensuelle + répartition selon l'autre dimension
+    autre = "Chauffeur" if dim == "Taxi" else "Taxi"
+    sel = df[df[dim].astype(str) == str(valeur)]
+    mensuel = sel.groupby("Mois")[["Total_Brut", "Grand_Total_Remis", "Depenses", "Profit"]].sum()
+    repartition = sel.groupby(autre)[["Semaines", "Grand_Total_Remis", "Depenses", "Profit"]].sum().sort_values(
+        "Profit", ascending=False)
+    return mensuel, repartition
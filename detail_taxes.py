@@ -0,0 +1,69 @@
+import math
+import pandas as pd
+
+# --- DÉTAIL DES TAXES (Dépenses + Essence/Lavage) ---
+# Construction vectorisée : un masque + un calcul de colonnes par source, puis un seul concat.
+TYPES = ["Dépense", "Essence", "Lavage"]
+COLONNES = ["Date", "Type", "Source", "Taxi", "TPS", "TVQ", "Total"]
+TAILLE_PAGE = 50
+
+
+def _num(df, col):
+    if col not in df.columns: return pd.Series(0.0, index=df.index)
+    return pd.to_numeric(df[col], errors='coerce').fillna(0.0)
+
+
+def _txt(df, col):
+    if col not in df.columns: return pd.Series("", index=df.index)
+    return df[col].astype(str).replace('nan', '').replace('None', '')
+
+
+def _date(df, col):
+    if col not in df.columns: return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    return pd.to_datetime(df[col], errors='coerce', format="mixed")
+
+
+def construire_detail_taxes(df_r, df_d, tps, tvq):
+    # tps / tvq : taux en % (valeur unique ou Series alignée sur l'index de df_r)
+    blocs = []
+    div = 1 + (tps / 100) + (tvq / 100)
+    for col in ["Essence", "Lavage"]:
+        val = _num(df_r, col)
+        ht = val / div
+        bloc = pd.DataFrame({"Date": _date(df_r, "Date_Debut"), "Type": col, "Source": f"{col} (Trans.)",
+                             "Taxi": _txt(df_r, "Taxi"), "TPS": ht * (tps / 100), "TVQ": ht * (tvq / 100),
+                             "Total": val})
+        blocs.append(bloc[val > 0])
+
+    t_d, v_d = _num(df_d, "TPS"), _num(df_d, "TVQ")
+    bloc = pd.DataFrame({"Date": _date(df_d, "Date"), "Type": "Dépense", "Source": _txt(df_d, "Categorie"),
+                         "Taxi": _txt(df_d, "Taxi"), "TPS": t_d, "TVQ": v_d, "Total": _num(df_d, "Montant_Total")})
+    blocs.append(bloc[(t_d > 0) | (v_d > 0)])
+
+    res = pd.concat(blocs, ignore_index=True)[COLONNES]
+    return res.sort_values("Date", ascending=False, kind="stable", ignore_index=True)
+
+
+def filtrer_detail(df, types=None, debut=None, fin=None, montant_min=0.0):
+    masque = pd.Series(True, index=df.index)
+    if types: masque &= df["Type"].isin(types)
+    if debut is not None: masque &= df["Date"] >= pd.Timestamp(debut)
+    if fin is not None: masque &= df["Date"] <= pd.Timestamp(fin)
+    if montant_min: masque &= df["Total"] >= montant_min
+    return df[masque]
+
+
+def nb_pages(df, taille=TAILLE_PAGE):
+    return max(1, math.ceil(len(df) / taille))
+
+
+def paginer(df, page, taille=TAILLE_PAGE):
+    # page commence à 1
+    debut = (max(1, int(page)) - 1) * taille
+    return df.iloc[debut:debut + taille]
+
+
+def exporter_csv(df):
+    out = df.copy()
+    out["Date"] = out["Date"].dt.strftime("%Y-%m-%d")
+    return out.round({"TPS": 2, "TVQ": 2, "Total": 2}).to_csv(index=False).encode("utf-8")
@@ -0,0 +1,143 @@
+import os
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+from sqlalchemy import event
+
+# --- INSTRUMENTATION ---
+# Mesures en mémoire du processus (partagées entre sessions Streamlit), fenêtre glissante par opération.
+TAILLE_FENETRE = 500
+NB_REQUETES_LENTES = 20
+FICHIER_PROMETHEUS = os.environ.get("MONTAXI_METRICS", "montaxi_metrics.prom")
+INTERVALLE_EXPORT = 15  # secondes entre deux écritures automatiques
+
+_verrou = threading.Lock()
+_mesures = defaultdict(lambda: deque(maxlen=TAILLE_FENETRE))
+_compteurs = defaultdict(lambda: [0, 0.0])  # nom -> [nombre, somme secondes]
+_requetes_lentes = []
+_local = threading.local()
+_dernier_export = [0.0]
+
+
+# --- ENREGISTREMENT ---
+def enregistrer(nom, duree):
+    with _verrou:
+        _mesures[nom].append(duree)
+        _compteurs[nom][0] += 1
+        _compteurs[nom][1] += duree
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None: rerun.append((nom, duree))
+
+
+@contextmanager
+def chrono(nom):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        enregistrer(nom, time.perf_counter() - t0)
+
+
+def chronometrer(nom):
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with chrono(nom): return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+# --- DÉCOUPAGE PAR RERUN ---
+def debut_rerun():
+    _local.rerun = []
+    _local.t0 = time.perf_counter()
+
+
+def fin_rerun():
+    detail = getattr(_local, "rerun", None) or []
+    total = time.perf_counter() - getattr(_local, "t0", time.perf_counter())
+    _local.rerun = None
+    enregistrer("rerun", total)
+    return total, detail
+
+
+# --- SQLALCHEMY ---
+def instrumenter_moteur(engine):
+    if getattr(engine, "_montaxi_instrumente", False): return engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _avant(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("t_requete", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _apres(conn, cursor, statement, parameters, context, executemany):
+        duree = time.perf_counter() - conn.info["t_requete"].pop()
+        enregistrer("sql", duree)
+        with _verrou:
+            _requetes_lentes.append((duree, " ".join(statement.split())[:300]))
+            _requetes_lentes.sort(key=lambda x: -x[0])
+            del _requetes_lentes[NB_REQUETES_LENTES:]
+
+    engine._montaxi_instrumente = True
+    return engine
+
+
+# --- STATISTIQUES ---
+def _quantile(valeurs, q):
+    if not valeurs: return 0.0
+    v = sorted(valeurs)
+    return v[min(len(v) - 1, int(round(q * (len(v) - 1))))]
+
+
+def statistiques():
+    with _verrou:
+        copie = {k: list(v) for k, v in _mesures.items()}
+        totaux = {k: tuple(v) for k, v in _compteurs.items()}
+    return [{"Opération": k, "Appels": totaux[k][0], "p50 (ms)": _quantile(v, 0.5) * 1000,
+             "p95 (ms)": _quantile(v, 0.95) * 1000, "Max (ms)": max(v) * 1000, "Total (s)": totaux[k][1]}
+            for k, v in sorted(copie.items())]
+
+
+def requetes_lentes():
+    with _verrou:
+        return [{"Durée (ms)": d * 1000, "Requête": q} for d, q in _requetes_lentes]
+
+
+def reinitialiser():
+    with _verrou:
+        _mesures.clear()
+        _compteurs.clear()
+        _requetes_lentes.clear()
+
+
+# --- EXPORT PROMETHEUS (textfile collector de node_exporter) ---
+def ecrire_prometheus(chemin=FICHIER_PROMETHEUS):
+    lignes = ["# HELP montaxi_operation_seconds Durée des opérations MonTaxi.",
+              "# TYPE montaxi_operation_seconds summary"]
+    for s in statistiques():
+        op = s["Opération"]
+        lignes.append(f'montaxi_operation_seconds{{operation="{op}",quantile="0.5"}} {s["p50 (ms)"] / 1000:.6f}')
+        lignes.append(f'montaxi_operation_seconds{{operation="{op}",quantile="0.95"}} {s["p95 (ms)"] / 1000:.6f}')
+        lignes.append(f'montaxi_operation_seconds_sum{{operation="{op}"}} {s["Total (s)"]:.6f}')
+        lignes.append(f'montaxi_operation_seconds_count{{operation="{op}"}} {s["Appels"]}')
+    # Écriture atomique : le collecteur ne lit jamais un fichier à moitié écrit
+    tmp = chemin + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f: f.write("\n".join(lignes) + "\n")
+    os.replace(tmp, chemin)
+    return chemin
+
+
+def ecrire_prometheus_periodique(chemin=FICHIER_PROMETHEUS, intervalle=INTERVALLE_EXPORT):
+    # Appelé à chaque rerun : écrit au plus une fois par intervalle
+    maintenant = time.monotonic()
+    if maintenant - _dernier_export[0] < intervalle: return None
+    _dernier_export[0] = maintenant
+    try:
+        return ecrire_prometheus(chemin)
+    except OSError:
+        return None
@@ -0,0 +1,278 @@
+import uuid
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+import partitions
+import recherche
+
+# --- SCHÉMA DES TABLES ---
+SCHEMAS = {
+    "taxis": ["Taxi_ID", "Immatriculation", "Chauffeur_Defaut", "UUID", "Version"],
+    "chauffeurs": ["Nom", "Prenom", "License_ID", "Adresse", "Matricule", "Telephone", "Note", "UUID", "Version"],
+    "depenses": ["Date", "Mois", "Annee", "Trimestre", "Taxi", "Chauffeur", "Categorie", "Details", "Montant_HT",
+                 "TPS", "TVQ", "Montant_Total", "UUID", "Version"],
+    "revenus": ["Date_Debut", "Date_Fin", "Mois", "Annee", "Trimestre", "Taxi", "Chauffeur",
+                "Meter_Deb", "Meter_Fin", "Meter_Total", "Fixe", "Total_Brut", "Nb_Appels",
+                "Redevance", "Base_Salaire", "Salaire_Chauffeur", "STS", "Credits", "Prix_Fixes",
+                "Visa", "Essence", "Lavage", "Divers", "Impot", "Grand_Total_Remis", "UUID", "Version"]
+}
+
+# --- TYPES RETOURNÉS PAR load_data ---
+# Les colonnes sont stockées en TEXT : la conversion est faite une seule fois ici,
+# les pages n'ont plus à refaire pd.to_numeric / astype(str).
+COLS_MONTANTS = ["Meter_Deb", "Meter_Fin", "Meter_Total", "Fixe", "Total_Brut", "Redevance",
+                 "Base_Salaire", "Salaire_Chauffeur", "STS", "Credits", "Prix_Fixes", "Visa", "Essence", "Lavage",
+                 "Divers", "Impot", "Grand_Total_Remis", "Montant_HT", "TPS", "TVQ", "Montant_Total"]
+COLS_ENTIERS = ["Nb_Appels"]  # comptes : int64 (pas de "3.0" appels dans les grilles et exports)
+COLS_DATES = ["Date_Debut", "Date_Fin", "Date"]
+COLS_CATEGORIES = ["Taxi", "Chauffeur", "Categorie"]
+COL_VERSION = "Version"
+
+# --- FORMAT CSV DE MonTaxi.py (verifier_fichiers) : noms de fichiers, en-têtes, renommage depuis SQL ---
+FICHIERS_CSV = {"revenus": "revenus_hebdo.csv", "depenses": "depenses_flotte.csv", "chauffeurs": "chauffeurs.csv",
+                "taxis": "taxis.csv"}
+ENTETES_CSV = {
+    "revenus": ["Date_Debut", "Date_Fin", "Mois", "Annee", "Trimestre", "Taxi_ID", "Chauffeur", "Meter_Debut",
+                "Meter_Fin", "Meter_Total", "Fixe", "Total_Brut", "Nb_Appels", "Redevance_Calc", "Total_Sujet_Salaire",
+                "Salaire_Chauffeur", "STS", "Credits_Comptes", "Prix_Fixes", "Visa_Debit", "Essence", "Lavage",
+                "Divers", "Impot_Ajoute", "Grand_Total_Remis", "UUID"],
+    "depenses": ["Date", "Mois", "Annee", "Taxi_ID", "Chauffeur", "Categorie", "Details", "Montant_HT", "TPS", "TVQ",
+                 "Montant_Total", "UUID"],
+    "chauffeurs": ["Nom", "Prenom", "Matricule", "Telephone", "Note", "UUID"],
+    "taxis": ["Taxi_ID", "Immatriculation", "Chauffeur_Defaut", "UUID"]
+}
+RENOMMAGE_CSV = {"Taxi": "Taxi_ID", "Meter_Deb": "Meter_Debut", "Redevance": "Redevance_Calc",
+                 "Base_Salaire": "Total_Sujet_Salaire", "Credits": "Credits_Comptes", "Visa": "Visa_Debit",
+                 "Impot": "Impot_Ajoute"}
+
+# --- VERSIONS DES TABLES ---
+# Compteur incrémenté dans la même transaction que chaque écriture : les lecteurs (API, caches)
+# savent si une table a changé sans la relire.
+TABLE_VERSIONS = "versions_tables"
+_versions_pretes = set()
+
+
+def creer_tables(engine):
+    # revenus / depenses : partitionnés (partitions.py) ; autres tables : TEXT simple si absentes
+    for table in partitions.TABLES_PARTITIONNEES: partitions.creer_ou_convertir(engine, table, SCHEMAS[table])
+    existantes = sqlalchemy.inspect(engine).get_table_names()
+    for table, cols in SCHEMAS.items():
+        if table in partitions.TABLES_PARTITIONNEES or table in existantes: continue
+        pd.DataFrame(columns=cols).to_sql(table, engine, if_exists='fail', index=False,
+                                          dtype={c: sqlalchemy.types.Text() for c in cols})
+    migrer_colonnes(engine)
+
+
+def migrer_colonnes(engine):
+    # Bases créées avant l'ajout d'une colonne au schéma (ex : Version) -> colonne ajoutée, lignes à 0
+    for table, cols in SCHEMAS.items(): partitions.assurer_colonnes(engine, table, cols)
+
+
+def preparer_versions(engine):
+    if str(engine.url) in _versions_pretes: return
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE IF NOT EXISTS {TABLE_VERSIONS} "
+                          f"(nom VARCHAR(64) PRIMARY KEY, version INTEGER NOT NULL)"))
+    _versions_pretes.add(str(engine.url))
+
+
+def incrementer_version(conn, table):
+    # preparer_versions() doit avoir été appelé AVANT d'ouvrir la transaction (verrou SQLite)
+    res = conn.execute(text(f"UPDATE {TABLE_VERSIONS} SET version = version + 1 WHERE nom = :t"), {"t": table})
+    if res.rowcount == 0:
+        conn.execute(text(f"INSERT INTO {TABLE_VERSIONS} (nom, version) VALUES (:t, 1)"), {"t": table})
+
+
+def versions(engine):
+    preparer_versions(engine)
+    with engine.connect() as conn:
+        return {n: int(v) for n, v in conn.execute(text(f"SELECT nom, version FROM {TABLE_VERSIONS}"))}
+
+
+def _colonne_valide(table, col):
+    if col not in SCHEMAS.get(table, []): raise ValueError(f"Colonne inconnue '{col}' pour la table '{table}'")
+    return col
+
+
+def construire_requete(engine, table, columns=None, where=None):
+    # where : {colonne: valeur} (égalité) ou {colonne: [v1, v2]} (IN) -> paramètres liés, jamais concaténés
+    if table not in SCHEMAS: raise ValueError(f"Table inconnue '{table}'")
+    cols = ", ".join([_colonne_valide(table, c) for c in columns]) if columns else "*"
+    src, clauses, params = table, [], {}
+    for i, (col, val) in enumerate((where or {}).items()):
+        _colonne_valide(table, col)
+        if isinstance(val, (list, tuple, set)):
+            noms = [f"w{i}_{j}" for j in range(len(val))]
+            clauses.append(f"{col} IN ({', '.join(':' + n for n in noms)})" if noms else "1 = 0")
+            params.update({n: str(v) for n, v in zip(noms, val)})
+        else:
+            clauses.append(f"{col} = :w{i}")
+            params[f"w{i}"] = str(val)
+            if col == "Annee": src = partitions.source_annee(engine, table, val)
+    sql = f"SELECT {cols} FROM {src}"
+    if clauses: sql += " WHERE " + " AND ".join(clauses)
+    return text(sql), params
+
+
+def typer(df):
+    for c in df.columns:
+        if c in COLS_MONTANTS:
+            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0).astype("float64")
+        elif c in COLS_ENTIERS:
+            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).round().astype("int64")
+        elif c in COLS_DATES:
+            df[c] = pd.to_datetime(df[c], errors='coerce', format="mixed")
+        elif c == COL_VERSION:
+            df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0).astype("int64")
+        else:
+            s = df[c].astype(object).where(df[c].notna(), "").astype(str)
+            s = s.mask(s.isin(["nan", "None", "NaT"]), "")
+            df[c] = s.astype("category") if c in COLS_CATEGORIES else s
+    return df
+
+
+def load_data(engine, table, columns=None, where=None):
+    requete, params = construire_requete(engine, table, columns, where)
+    df = pd.read_sql(requete, engine, params=params)
+    if not columns and "UUID" not in df.columns: df["UUID"] = [str(uuid.uuid4()) for _ in range(len(df))]
+    return typer(df)
+
+
+def lire_par_lots(engine, table, columns=None, where=None, taille=50000):
+    # Même requête que load_data, lue par lots de 'taille' lignes (curseur côté serveur sous MySQL) :
+    # la mémoire reste bornée quelle que soit la taille de la table
+    requete, params = construire_requete(engine, table, columns, where)
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for lot in pd.read_sql(requete, conn, params=params, chunksize=taille):
+            yield typer(lot)
+
+
+def vers_texte(df):
+    # Inverse de typer() : dates au format AAAA-MM-JJ, reste en texte
+    df = df.copy()
+    for c in df.columns:
+        if c in COLS_DATES:
+            df[c] = pd.to_datetime(df[c], errors='coerce', format="mixed").dt.strftime("%Y-%m-%d").fillna("")
+        else:
+            df[c] = df[c].astype(object).where(df[c].notna(), "").astype(str)
+    return df
+
+
+def vers_csv(table, df):
+    # Colonnes SQL -> en-têtes et ordre des CSV de MonTaxi.py (colonnes absentes vides), valeurs en texte
+    return vers_texte(df.rename(columns=RENOMMAGE_CSV)).reindex(columns=ENTETES_CSV[table], fill_value="")
+
+
+def save_data(engine, table, df):
+    df = vers_texte(df)
+    if "Annee" in df.columns: partitions.assurer_partitions(engine, table, df["Annee"].unique())
+    preparer_versions(engine)
+    # DELETE + INSERT dans une transaction : un 'replace' supprimerait le partitionnement
+    with engine.begin() as conn:
+        partitions.vider_table(conn, engine, table)
+        df.to_sql(table, conn, if_exists='append', index=False)
+        recherche.indexer(conn, engine, table, df, tout=True)
+        incrementer_version(conn, table)
+
+
+def ajouter_lignes(engine, table, df):
+    # INSERT seul (sans réécrire la table) ; toutes les lignes dans la même transaction
+    df = vers_texte(df)
+    if "Annee" in df.columns: partitions.assurer_partitions(engine, table, df["Annee"].unique())
+    preparer_versions(engine)
+    with engine.begin() as conn:
+        df.to_sql(table, conn, if_exists='append', index=False)
+        recherche.indexer(conn, engine, table, df)
+        incrementer_version(conn, table)
+
+
+# --- ÉCRITURE LIGNE À LIGNE (CONCURRENCE OPTIMISTE) ---
+# Chaque ligne porte un numéro de Version. Modifier / supprimer ne réussit que si la version en base est
+# encore celle lue à l'ouverture de la fiche (compare-and-set par UUID) : deux postes qui éditent en même temps
+# ne s'écrasent plus, le second reçoit ConflitVersion au lieu d'effacer le travail du premier.
+class ConflitVersion(Exception):
+    def __init__(self, table, uuids):
+        self.table = table
+        self.uuids = [uuids] if isinstance(uuids, str) else list(uuids)
+        quoi = f"La ligne {self.uuids[0]}" if len(self.uuids) == 1 else f"{len(self.uuids)} lignes"
+        super().__init__(f"{quoi} de '{table}' modifiée(s) ou supprimée(s) par un autre poste.")
+
+
+def _supprimer_si_version(conn, engine, table, cles):
+    # DELETE conditionnel sur les tables physiques : leur rowcount est fiable (pas celui de la vue SQLite)
+    # cles : [(uuid, version lue), ...] -> renvoie les UUID introuvables à cette version (conflits)
+    ordres = [text(f"DELETE FROM {t} WHERE UUID = :u AND COALESCE(NULLIF(Version, ''), '0') = :v")
+              for t in partitions.tables_physiques(conn, engine, table)]
+    conflits = []
+    for u, v in cles:
+        p = {"u": str(u), "v": str(int(v))}
+        if not any(conn.execute(o, p).rowcount for o in ordres): conflits.append(p["u"])
+    return conflits
+
+
+def inserer_ligne(engine, table, ligne):
+    ajouter_lignes(engine, table, pd.DataFrame([{**ligne, COL_VERSION: 1}]))
+    return 1
+
+
+def modifier_ligne(engine, table, ligne, version):
+    # Ancienne version retirée puis nouvelle insérée (elle peut changer de partition) dans une transaction
+    nouvelle = int(version) + 1
+    df = vers_texte(pd.DataFrame([{**ligne, COL_VERSION: nouvelle}]))
+    if "Annee" in df.columns: partitions.assurer_partitions(engine, table, df["Annee"].unique())
+    preparer_versions(engine)
+    with engine.begin() as conn:
+        if _supprimer_si_version(conn, engine, table, [(ligne["UUID"], version)]):
+            raise ConflitVersion(table, ligne["UUID"])
+        df.to_sql(table, conn, if_exists='append', index=False)
+        recherche.indexer(conn, engine, table, df)
+        incrementer_version(conn, table)
+    return nouvelle
+
+
+def supprimer_ligne(engine, table, uid, version):
+    preparer_versions(engine)
+    with engine.begin() as conn:
+        if _supprimer_si_version(conn, engine, table, [(uid, version)]): raise ConflitVersion(table, uid)
+        recherche.indexer(conn, engine, table, retires=[uid])
+        incrementer_version(conn, table)
+
+
+# --- ÉDITION EN LOT (grille) ---
+def diff_lignes(avant, apres, colonnes):
+    # Grille éditée vs instantané chargé -> (lignes ajoutées, lignes modifiées, lignes supprimées)
+    apres = apres.copy()
+    uid = apres["UUID"].astype(object).where(apres["UUID"].notna(), "").astype(str).str.strip()
+    nouvelles = ~uid.isin(set(avant["UUID"].astype(str))) | (uid == "")
+    apres.loc[nouvelles, "UUID"] = [str(uuid.uuid4()) for _ in range(int(nouvelles.sum()))]
+    ajouts, gardees = apres[nouvelles], apres[~nouvelles]
+    supprimees = avant[~avant["UUID"].astype(str).isin(set(uid[~nouvelles]))]
+
+    ref = avant.set_index(avant["UUID"].astype(str)).loc[uid[~nouvelles]]
+    a, b = vers_texte(ref[colonnes]).reset_index(drop=True), vers_texte(gardees[colonnes]).reset_index(drop=True)
+    for c in colonnes:
+        if c in COLS_MONTANTS + COLS_ENTIERS:
+            a[c] = pd.to_numeric(a[c], errors='coerce').fillna(0.0).round(2)
+            b[c] = pd.to_numeric(b[c], errors='coerce').fillna(0.0).round(2)
+    change = (a != b).any(axis=1).to_numpy()
+    modifiees = gardees[change].copy()
+    modifiees["Version"] = ref["Version"].to_numpy()[change]
+    return ajouts, modifiees, supprimees
+
+
+def appliquer_lot(engine, table, ajouts, modifiees, supprimees):
+    # Tout ou rien, en UNE transaction : une seule ligne en conflit annule le lot (ConflitVersion)
+    cles = list(zip(modifiees["UUID"], modifiees["Version"])) + list(zip(supprimees["UUID"], supprimees["Version"]))
+    nouvelles = pd.concat([ajouts.assign(Version=1), modifiees.assign(Version=modifiees["Version"].astype(int) + 1)],
+                          ignore_index=True)
+    nouvelles = vers_texte(nouvelles[[c for c in SCHEMAS[table] if c in nouvelles.columns]])
+    if "Annee" in nouvelles.columns: partitions.assurer_partitions(engine, table, nouvelles["Annee"].unique())
+    preparer_versions(engine)
+    with engine.begin() as conn:
+        conflits = _supprimer_si_version(conn, engine, table, cles)
+        if conflits: raise ConflitVersion(table, conflits)
+        if len(nouvelles): nouvelles.to_sql(table, conn, if_exists='append', index=False)
+        recherche.indexer(conn, engine, table, nouvelles, retires=supprimees["UUID"])
+        incrementer_version(conn, table)
+    return {"ajoutees": len(ajouts), "modifiees": len(modifiees), "supprimees": len(supprimees)}
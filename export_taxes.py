@@ -0,0 +1,157 @@
+import argparse
+import csv
+import os
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import archives
+import configuration
+import detail_taxes
+import donnees
+import flottes
+import taux
+
+# --- DÉCLARATION TPS/TVQ TRIMESTRIELLE ---
+# Toutes les lignes taxables d'un trimestre : TPS/TVQ des dépenses + taxes implicites essence/lavage (mêmes
+# règles que la Synthèse et son détail des taxes, taux en vigueur à la date de chaque ligne). Les lignes sont
+# lues par lots (SQL ou archive), passent par un générateur de DataFrames et sont écrites au fil de l'eau en
+# CSV ou en XLSX (openpyxl write_only) : la mémoire reste bornée par la taille d'un lot.
+# Un sommaire par mois + total du trimestre accompagne l'export (feuille « Sommaire » en XLSX, fichier
+# *_sommaire.csv en CSV), avec les mêmes chiffres que les colonnes « TPS / TVQ à Recevoir » de la Synthèse.
+#   python export_taxes.py 2025 T2 --sortie taxes_2025_T2.xlsx
+TAILLE_LOT = 50000
+COLONNES = ["Date", "Mois", "Type", "Source", "Taxi", "TPS", "TVQ", "Total"]
+COLS_R = ["Date_Debut", "Mois", "Taxi", "Essence", "Lavage"]
+COLS_D = ["Date", "Mois", "Taxi", "Categorie", "Montant_Total", "TPS", "TVQ"]
+SOMMAIRE = ["TPS Essence/Lavage", "TVQ Essence/Lavage", "TPS Dépenses", "TVQ Dépenses", "TPS à Recevoir",
+            "TVQ à Recevoir"]
+
+
+def mois_trimestre(annee, trimestre):
+    q = int(str(trimestre).upper().lstrip("T"))
+    return [f"{annee}-{m:02d}" for m in range(3 * q - 2, 3 * q + 1)]
+
+
+# --- LECTURE PAR LOTS ---
+def _lots_source(engine, table, cols, annee, mois, taille, dossier):
+    if archives.est_archivee(annee, dossier):
+        for lot in archives.lire_archive_par_lots(table, annee, cols, taille, dossier):
+            yield lot[lot["Mois"].astype(str).isin(mois)]
+    else:
+        yield from donnees.lire_par_lots(engine, table, cols, {"Annee": annee, "Mois": mois}, taille)
+
+
+def _mise_en_forme(detail):
+    detail = detail.sort_values("Date", kind="stable", ignore_index=True)
+    detail.insert(1, "Mois", detail["Date"].dt.strftime("%Y-%m"))
+    return detail[COLONNES]
+
+
+def lots_taxables(engine, annee, trimestre, config, taille=TAILLE_LOT, dossier=archives.DOSSIER_ARCHIVES):
+    # Générateur : un DataFrame (COLONNES) par lot lu ; dépenses puis essence / lavage
+    annee, mois = str(annee), mois_trimestre(annee, trimestre)
+    vide_r, vide_d = pd.DataFrame(columns=COLS_R), pd.DataFrame(columns=COLS_D)
+    for lot in _lots_source(engine, "depenses", COLS_D, annee, mois, taille, dossier):
+        yield _mise_en_forme(detail_taxes.construire_detail_taxes(vide_r, lot, 0.0, 0.0))
+    for lot in _lots_source(engine, "revenus", COLS_R, annee, mois, taille, dossier):
+        yield _mise_en_forme(detail_taxes.construire_detail_taxes(lot, vide_d, *taux.taxes_revenus(lot, config)))
+
+
+# --- SOMMAIRE (cumulé pendant l'écriture) ---
+def _suivre(lots, totaux):
+    for lot in lots:
+        totaux.append(lot.groupby(["Mois", "Type"])[["TPS", "TVQ"]].sum())
+        yield lot
+
+
+def sommaire(totaux, annee, trimestre):
+    mois = mois_trimestre(annee, trimestre)
+    t = pd.concat(totaux).groupby(level=[0, 1]).sum() if totaux else pd.DataFrame(
+        columns=["TPS", "TVQ"], index=pd.MultiIndex.from_tuples([], names=["Mois", "Type"]))
+    depense = t.index.get_level_values("Type") == "Dépense"
+    ess = t[~depense].groupby(level="Mois").sum().reindex(mois).fillna(0.0)
+    dep = t[depense].groupby(level="Mois").sum().reindex(mois).fillna(0.0)
+    df = pd.DataFrame({"TPS Essence/Lavage": ess["TPS"], "TVQ Essence/Lavage": ess["TVQ"],
+                       "TPS Dépenses": dep["TPS"], "TVQ Dépenses": dep["TVQ"]}, index=mois).astype(float)
+    df["TPS à Recevoir"] = df["TPS Essence/Lavage"] + df["TPS Dépenses"]
+    df["TVQ à Recevoir"] = df["TVQ Essence/Lavage"] + df["TVQ Dépenses"]
+    df.loc[f"{str(trimestre).upper()} {annee}"] = df.sum()
+    df.index.name = "Période"
+    return df.round(2).reset_index()
+
+
+# --- ÉCRITURE ---
+def _lignes(lot):
+    lot = lot.round({"TPS": 2, "TVQ": 2, "Total": 2})
+    lot["Date"] = lot["Date"].dt.date
+    return lot.itertuples(index=False, name=None)
+
+
+def ecrire_csv(lots, chemin):
+    n = 0
+    with open(chemin, 'w', newline='', encoding='utf-8') as f:
+        w = csv.writer(f)
+        w.writerow(COLONNES)
+        for lot in lots:
+            w.writerows(_lignes(lot))
+            n += len(lot)
+    return n
+
+
+def ecrire_xlsx(lots, chemin, fin):
+    # fin() -> DataFrame du sommaire, appelé une fois toutes les lignes écrites
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws_s = wb.create_sheet("Sommaire")  # premier onglet, rempli à la fin
+    ws = wb.create_sheet("Lignes")
+    ws.append(COLONNES)
+    n = 0
+    for lot in lots:
+        for ligne in _lignes(lot): ws.append(ligne)
+        n += len(lot)
+    som = fin()
+    ws_s.append(list(som.columns))
+    for ligne in som.itertuples(index=False, name=None): ws_s.append(list(ligne))
+    wb.save(chemin)
+    return n
+
+
+def exporter(engine, annee, trimestre, config, chemin, taille=TAILLE_LOT, dossier=archives.DOSSIER_ARCHIVES):
+    # -> (nombre de lignes écrites, sommaire) ; format selon l'extension (.xlsx, sinon CSV)
+    totaux = []
+    lots = _suivre(lots_taxables(engine, annee, trimestre, config, taille, dossier), totaux)
+    if chemin.lower().endswith(".xlsx"):
+        n = ecrire_xlsx(lots, chemin, lambda: sommaire(totaux, annee, trimestre))
+        return n, sommaire(totaux, annee, trimestre)
+    n = ecrire_csv(lots, chemin)
+    som = sommaire(totaux, annee, trimestre)
+    som.to_csv(os.path.splitext(chemin)[0] + "_sommaire.csv", index=False)
+    return n, som
+
+
+def main():
+    p = argparse.ArgumentParser(description="Export des lignes taxables (TPS/TVQ) d'un trimestre, CSV ou XLSX.")
+    p.add_argument("annee")
+    p.add_argument("trimestre", choices=["T1", "T2", "T3", "T4"])
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"))
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte de flottes.json : sa base, ses archives et sa config (remplace --db)")
+    p.add_argument("--config", default=None, help=f"défaut : {configuration.FILE_CONFIG} (ou celle de la flotte)")
+    p.add_argument("--sortie", default=None, help="fichier .csv ou .xlsx (défaut : taxes_<annee>_<trimestre>.csv)")
+    p.add_argument("--taille", type=int, default=TAILLE_LOT, help="lignes lues par lot")
+    a = p.parse_args()
+
+    if a.flotte:
+        engine, dossier, fichier_config = flottes.source(a.flotte)
+    else:
+        engine, dossier, fichier_config = create_engine(a.db), archives.DOSSIER_ARCHIVES, configuration.FILE_CONFIG
+    sortie = a.sortie or f"taxes_{a.annee}_{a.trimestre}.csv"
+    n, som = exporter(engine, a.annee, a.trimestre, configuration.charger(a.config or fichier_config), sortie,
+                      a.taille, dossier)
+    print(som.to_string(index=False))
+    print(f"{n} lignes taxables -> {sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+import sqlalchemy
+from sqlalchemy import create_engine
+
+# --- FLOTTES (une base + un dossier de données par flotte) ---
+# flottes.json décrit les flottes gérées ; chacune a sa base ("db" : URL complète, ou "schema" : autre base
+# sur le serveur par défaut) et son dossier de données (CSV de MonTaxi.py, config_taxi.json, archives, sauvegardes).
+# Sans fichier : une seule flotte, la base MONTAXI_DB et le dossier courant (comportement d'origine).
+# Un moteur SQLAlchemy par URL, créé au premier usage puis gardé en cache avec un pool borné : changer de flotte
+# ne recrée aucun moteur et ne touche pas aux données des autres flottes.
+#   {"defaut": "montaxi31",
+#    "flottes": {"montaxi31": {"libelle": "MonTaxi31", "db": "mysql+pymysql://root:@localhost/montaxi31_db"},
+#                "coop_b": {"libelle": "Coop B", "schema": "coop_b_db", "dossier": "flottes/coop_b"}}}
+#   python flottes.py            (flottes configurées + temps d'ouverture / de bascule)
+FILE_FLOTTES = "flottes.json"
+URL_DEFAUT = os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db")
+FLOTTE_DEFAUT = "montaxi31"
+POOL = 3  # connexions gardées ouvertes par flotte
+DEBORDEMENT = 2  # connexions supplémentaires temporaires
+RECYCLAGE = 1800  # secondes : connexions renouvelées avant le wait_timeout MySQL
+FICHIERS = {"config": "config_taxi.json", "revenus": "revenus_hebdo.csv", "depenses": "depenses_flotte.csv",
+            "chauffeurs": "chauffeurs.csv", "archives": "archives", "sauvegardes": "sauvegardes"}
+
+_cache = {}
+_verrou = threading.Lock()
+
+
+def _par_defaut():
+    return {"defaut": FLOTTE_DEFAUT, "flottes": {FLOTTE_DEFAUT: {"libelle": "MonTaxi31", "db": URL_DEFAUT}}}
+
+
+def charger(chemin=FILE_FLOTTES):
+    # Relu seulement si le fichier change (même principe que configuration.charger)
+    try:
+        sig = os.stat(chemin).st_mtime_ns
+    except OSError:
+        return _par_defaut()
+    with _verrou:
+        e = _cache.get(chemin)
+        if e is None or e[0] != sig:
+            try:
+                with open(chemin, 'r', encoding='utf-8') as f: brut = json.load(f)
+                if not brut.get("flottes"): raise ValueError("aucune flotte")
+                flottes = {"defaut": brut.get("defaut") or next(iter(brut["flottes"])), "flottes": brut["flottes"]}
+            except:
+                flottes = e[1] if e else _par_defaut()  # fichier illisible : dernière version valide
+            e = _cache[chemin] = (sig, flottes)
+    return e[1]
+
+
+def noms(chemin=FILE_FLOTTES):
+    return list(charger(chemin)["flottes"])
+
+
+def defaut(chemin=FILE_FLOTTES):
+    # MONTAXI_FLOTTE (une copie de l'application par flotte) l'emporte sur flottes.json
+    f = charger(chemin)
+    nom = os.environ.get("MONTAXI_FLOTTE") or f["defaut"]
+    return nom if nom in f["flottes"] else next(iter(f["flottes"]))
+
+
+def _flotte(nom, chemin=FILE_FLOTTES):
+    f = charger(chemin)["flottes"]
+    if nom not in f: raise KeyError(f"Flotte inconnue : '{nom}' ({', '.join(f)})")
+    return f[nom]
+
+
+def libelle(nom, chemin=FILE_FLOTTES):
+    return _flotte(nom, chemin).get("libelle") or nom
+
+
+def url(nom, chemin=FILE_FLOTTES):
+    f = _flotte(nom, chemin)
+    if f.get("db"): return f["db"]
+    if f.get("schema"):
+        return sqlalchemy.engine.make_url(URL_DEFAUT).set(database=f["schema"]).render_as_string(hide_password=False)
+    return URL_DEFAUT
+
+
+def dossier(nom, chemin=FILE_FLOTTES):
+    return _flotte(nom, chemin).get("dossier") or "."
+
+
+def fichier(nom, quoi, chemin=FILE_FLOTTES):
+    # Chemin d'un fichier de données de la flotte (voir FICHIERS) ; le dossier est créé au besoin
+    d = dossier(nom, chemin)
+    os.makedirs(d, exist_ok=True)
+    return os.path.join(d, FICHIERS[quoi])
+
+
+def source(nom, chemin=FILE_FLOTTES):
+    # (moteur, dossier des archives, fichier de configuration) d'une même flotte : jamais mélangés entre flottes
+    return moteur(nom, chemin), fichier(nom, "archives", chemin), fichier(nom, "config", chemin)
+
+
+# --- MOTEURS (un par URL, pool borné) ---
+@lru_cache(maxsize=None)  # une entrée par base configurée : le nombre de flottes borne le cache
+def _moteur(u):
+    options = {"pool_pre_ping": True, "pool_recycle": RECYCLAGE}
+    if not u.startswith("sqlite"): options.update(pool_size=POOL, max_overflow=DEBORDEMENT)
+    return create_engine(u, **options)
+
+
+def moteur(nom, chemin=FILE_FLOTTES):
+    return _moteur(url(nom, chemin))
+
+
+# --- LIGNE DE COMMANDE ---
+def main():
+    p = argparse.ArgumentParser(description="Flottes configurées et temps de bascule entre elles.")
+    p.add_argument("--flottes", default=FILE_FLOTTES)
+    p.add_argument("--bascules", type=int, default=100, help="bascules mesurées après la première ouverture")
+    a = p.parse_args()
+
+    liste = noms(a.flottes)
+    for nom in liste:
+        t0 = time.perf_counter()
+        with moteur(nom, a.flottes).connect(): pass
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"{nom:<15} {libelle(nom, a.flottes):<20} {dossier(nom, a.flottes):<20} "
+              f"{url(nom, a.flottes).split('@')[-1]:<35} ouverture {ms:7.1f} ms")
+    t0 = time.perf_counter()
+    for i in range(a.bascules):
+        with moteur(liste[i % len(liste)], a.flottes).connect(): pass
+    print(f"Bascule (moteur en cache + connexion du pool) : "
+          f"{(time.perf_counter() - t0) * 1000 / max(a.bascules, 1):.2f} ms en moyenne")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import argparse
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+
+# --- GABARITS DE MISE EN PAGE (feuilles hebdomadaires PDF) ---
+# Un gabarit = l'empreinte d'une mise en page (libellés fixes et leur position) + une boîte par champ
+# [x0, top, x1, bottom] en points pdfplumber. Il est enregistré une fois à partir d'une feuille modèle ;
+# une feuille dont l'empreinte correspond est ensuite lue directement par position des mots
+# (lecture_pdf.analyser_pdf). Une feuille non reconnue repasse par la recherche par mots-clés.
+#   python gabarits_pdf.py mots modele.pdf                       (mots et coordonnées de la page 1)
+#   python gabarits_pdf.py enregistrer modele.pdf --nom coop_a   (boîtes proposées depuis les libellés)
+#   python gabarits_pdf.py enregistrer modele.pdf --nom coop_a --champ Essence=300,420,360,432
+#   python gabarits_pdf.py tester feuille.pdf | lister | supprimer coop_a
+FILE_GABARITS = "gabarits_pdf.json"
+SEUIL_EMPREINTE = 0.8  # similarité minimale (Jaccard) entre les libellés de la feuille et ceux du gabarit
+GRILLE = 10  # points : pas de position des libellés dans l'empreinte
+TOLERANCE = 2  # points : marge autour d'une boîte à la lecture
+MARGE = 30  # points : élargissement horizontal d'une boîte proposée (montants plus longs que sur le modèle)
+ECART = 15  # points : un blanc plus large sépare deux colonnes sur une même ligne
+CHAMPS_TEXTE = ["Taxi", "Chauffeur_Raw", "Date_Debut"]
+
+_RE_LIBELLE = re.compile(r"^[A-ZÀ-Ý'/():-]{3,}$")
+_RE_POINTILLES = re.compile(r"^[._\-–]{2,}$")
+
+_cache = {}
+_verrou = threading.Lock()
+
+
+# --- MOTS ET EMPREINTE ---
+def mots_page(contenu):
+    # Mots de la première page avec leur boîte, dans l'ordre de lecture, et taille de la page
+    import pdfplumber  # différé, comme dans lecture_pdf
+    with pdfplumber.open(io.BytesIO(contenu)) as pdf:
+        page = pdf.pages[0]
+        mots = [{k: (w[k] if k == "text" else round(float(w[k]), 1)) for k in ("text", "x0", "top", "x1", "bottom")}
+                for w in page.extract_words()]
+        return mots, [round(float(page.width)), round(float(page.height))]
+
+
+def empreinte(mots):
+    # Libellés en majuscules (les valeurs et les noms varient d'une semaine à l'autre) + position arrondie
+    return sorted({f"{m['text']}@{round(m['x0'] / GRILLE)},{round(m['top'] / GRILLE)}" for m in mots
+                   if _RE_LIBELLE.match(m["text"])})
+
+
+def similarite(a, b):
+    a, b = set(a), set(b)
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+# --- STOCKAGE (gabarits_pdf.json, relu seulement s'il change) ---
+def charger(chemin=FILE_GABARITS):
+    try:
+        sig = os.stat(chemin).st_mtime_ns
+    except OSError:
+        return []
+    with _verrou:
+        e = _cache.get(chemin)
+        if e is None or e[0] != sig:
+            try:
+                with open(chemin, 'r', encoding='utf-8') as f: gabarits = json.load(f)
+            except:
+                gabarits = e[1] if e else []
+            e = _cache[chemin] = (sig, gabarits)
+    return [dict(g) for g in e[1]]
+
+
+def sauvegarder(gabarits, chemin=FILE_GABARITS):
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    fd, tmp = tempfile.mkstemp(prefix=".gabarits_", suffix=".tmp", dir=dossier)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(gabarits, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, chemin)
+    except:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+
+def enregistrer(gabarit, chemin=FILE_GABARITS):
+    # Un gabarit du même nom est remplacé
+    sauvegarder([g for g in charger(chemin) if g["nom"] != gabarit["nom"]] + [gabarit], chemin)
+
+
+def supprimer(nom, chemin=FILE_GABARITS):
+    sauvegarder([g for g in charger(chemin) if g["nom"] != nom], chemin)
+
+
+# --- CRÉATION D'UN GABARIT ---
+def _jeton(texte):
+    return re.sub(r"[^\w']", "", texte.split("/")[0]).upper()
+
+
+def boite_valeur(mots, libelle, texte=False):
+    # Boîte de la valeur écrite juste à droite du libellé, sur la même ligne (None si le libellé est absent).
+    # Montant : premier nombre après le libellé ; texte : mots contigus. La boîte est élargie sans empiéter
+    # sur le libellé ni sur la colonne suivante.
+    cible = [t for t in (_jeton(x) for x in libelle.split()) if t]
+    for i in range(len(mots) - len(cible) + 1):
+        bloc = mots[i:i + len(cible)]
+        if [_jeton(m["text"]) for m in bloc] != cible: continue
+        fin = bloc[-1]
+        suite = sorted([m for m in mots if abs(m["top"] - fin["top"]) < 3 and m["x0"] > fin["x1"]
+                        and not _RE_POINTILLES.match(m["text"])], key=lambda m: m["x0"])
+        if texte:
+            valeur = suite[:1]
+            for m in suite[1:]:
+                if m["x0"] - valeur[-1]["x1"] > ECART: break
+                valeur.append(m)
+        else:
+            valeur = [m for m in suite if re.search(r"\d", m["text"])][:1]
+        if not valeur: continue
+        apres = [m["x0"] for m in suite if m["x0"] > valeur[-1]["x1"]]
+        return [round(max(fin["x1"] + 1, valeur[0]["x0"] - (0 if texte else MARGE)), 1),
+                round(min(m["top"] for m in valeur) - 1, 1),
+                round(min(apres + [valeur[-1]["x1"] + MARGE * (4 if texte else 1) + 1]) - 1, 1),
+                round(max(m["bottom"] for m in valeur) + 1, 1)]
+    return None
+
+
+def proposer(contenu, nom, libelles):
+    # libelles : {champ: [libellés possibles]} -> une boîte par champ trouvé sur la feuille modèle
+    mots, taille = mots_page(contenu)
+    champs = {}
+    for champ, options in libelles.items():
+        for lib in options:
+            b = boite_valeur(mots, lib, champ in CHAMPS_TEXTE)
+            if b:
+                champs[champ] = b
+                break
+    return {"nom": nom, "taille": taille, "empreinte": empreinte(mots), "champs": champs}, mots
+
+
+# --- LECTURE PAR POSITION ---
+def reconnaitre(contenu, chemin=FILE_GABARITS):
+    # -> (gabarit, score, mots) ; gabarit None si aucun ne correspond (ou aucun enregistré : pas de lecture)
+    gabarits = charger(chemin)
+    if not gabarits: return None, 0.0, None
+    mots, taille = mots_page(contenu)
+    emp = empreinte(mots)
+    score, gabarit = max(((similarite(emp, g["empreinte"]), g) for g in gabarits
+                          if all(abs(a - b) <= GRILLE for a, b in zip(g["taille"], taille))),
+                         key=lambda c: c[0], default=(0.0, None))
+    return (gabarit if score >= SEUIL_EMPREINTE else None), score, mots
+
+
+def lire_champs(mots, gabarit):
+    # Texte brut de chaque champ : mots dont le centre tombe dans la boîte, dans l'ordre de lecture
+    res = {}
+    for champ, (x0, top, x1, bottom) in gabarit["champs"].items():
+        dans = [m for m in mots if x0 - TOLERANCE <= (m["x0"] + m["x1"]) / 2 <= x1 + TOLERANCE
+                and top - TOLERANCE <= (m["top"] + m["bottom"]) / 2 <= bottom + TOLERANCE
+                and not _RE_POINTILLES.match(m["text"])]
+        res[champ] = " ".join(m["text"] for m in dans)
+    return res
+
+
+# --- LIGNE DE COMMANDE ---
+def main():
+    import lecture_pdf
+    p = argparse.ArgumentParser(description="Gabarits de mise en page des feuilles hebdomadaires PDF.")
+    p.add_argument("action", choices=["mots", "enregistrer", "tester", "lister", "supprimer"])
+    p.add_argument("cible", nargs="?", help="fichier PDF (ou nom du gabarit pour 'supprimer')")
+    p.add_argument("--nom", default=None)
+    p.add_argument("--champ", action="append", default=[], help="Champ=x0,top,x1,bottom (remplace la proposition)")
+    p.add_argument("--gabarits", default=FILE_GABARITS)
+    a = p.parse_args()
+
+    if a.action == "lister":
+        for g in charger(a.gabarits): print(f"{g['nom']:<20} {g['taille']}  champs : {', '.join(g['champs'])}")
+    elif a.action == "supprimer":
+        supprimer(a.cible, a.gabarits)
+    else:
+        with open(a.cible, "rb") as f: contenu = f.read()
+        if a.action == "mots":
+            for m in mots_page(contenu)[0]:
+                print(f"{m['x0']:7.1f} {m['top']:7.1f} {m['x1']:7.1f} {m['bottom']:7.1f}  {m['text']}")
+        elif a.action == "enregistrer":
+            g, _ = proposer(contenu, a.nom or os.path.splitext(os.path.basename(a.cible))[0],
+                            lecture_pdf.LIBELLES_GABARIT)
+            for c in a.champ:
+                champ, boite = c.split("=", 1)
+                g["champs"][champ] = [float(x) for x in boite.split(",")]
+            enregistrer(g, a.gabarits)
+            for champ, b in g["champs"].items(): print(f"{champ:<15} {b}")
+            print(f"Gabarit '{g['nom']}' enregistré ({len(g['champs'])} champs) -> {a.gabarits}")
+        else:
+            g, score, mots = reconnaitre(contenu, a.gabarits)
+            print(f"Gabarit : {g['nom'] if g else 'aucun'} (similarité {score:.2f})")
+            if g:
+                for champ, txt in lire_champs(mots, g).items(): print(f"{champ:<15} {txt}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import os
+import uuid
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+import calculs
+import configuration
+import cumuls
+import donnees
+import taux
+
+# --- GÉNÉRATEUR DE FLOTTE SYNTHÉTIQUE ---
+# N taxis, M chauffeurs, Y années de feuilles hebdomadaires + dépenses garage.
+# Sortie CSV (format MonTaxi.py) ou SQL (schéma app_taxi.py).
+#   python generer_donnees.py --taxis 50 --chauffeurs 100 --annees 3 --format sql --db sqlite:///flotte.db
+#   python generer_donnees.py --taxis 10 --chauffeurs 20 --annees 1 --format csv --dossier flotte_csv
+NOMS = ["Tremblay", "Gagnon", "Roy", "Côté", "Bouchard", "Gauthier", "Morin", "Lavoie", "Fortin", "Gagné",
+        "Ouellet", "Pelletier", "Bélanger", "Lévesque", "Bergeron", "Leblanc", "Paquette", "Girard", "Simard",
+        "Boucher", "Caron", "Beaulieu", "Cloutier", "Dubé", "Poirier", "Fournier", "Lapointe", "Leclerc", "Lefebvre",
+        "Poulin", "Benali", "Haddad", "Joseph", "Nguyen", "Diallo", "Saint-Louis", "Mansour", "Pierre", "Khan"]
+PRENOMS = ["Jean", "Marc", "Luc", "Pierre", "Michel", "André", "Sylvie", "Nathalie", "Karim", "Mohamed", "Ahmed",
+           "Stéphane", "François", "Isabelle", "Julie", "Patrick", "Daniel", "Yves", "Samir", "Fatima", "Rachid",
+           "Wilson", "Jocelyn", "Hélène", "Louis", "Mathieu", "Sophie", "Olivier", "Nadia", "Éric"]
+DETAILS = {"Réparation mécanique": ["Freins", "Joints", "Suspension", "Alternateur"],
+           "Carrosserie": ["Pare-chocs", "Portière", "Peinture"], "Pneus": ["Pneus hiver", "Pneus été", "Balancement"],
+           "Assurance": ["Prime mensuelle"], "SAAQ": ["Immatriculation", "Permis"], "Admin": ["Frais dossier"],
+           "Pièces": ["Essuie-glaces", "Ampoules", "Batterie"], "Autre": ["Divers"]}
+CONFIG_DEFAUT = configuration.DEFAULT_CONFIG
+PROBA_CHAUFFEUR_DEFAUT = 0.8
+DEPENSES_PAR_MOIS = 1.5  # moyenne par taxi
+
+def _uuids(n):
+    return [str(uuid.uuid4()) for _ in range(n)]
+
+
+def _periode(dates):
+    # Version vectorisée de calculs.champs_periode
+    d = pd.to_datetime(pd.Series(dates))
+    return {"Mois": d.dt.strftime("%Y-%m"), "Annee": d.dt.year.astype(str),
+            "Trimestre": "T" + ((d.dt.month - 1) // 3 + 1).astype(str)}
+
+
+# --- FLOTTE ---
+def generer_flotte(nb_taxis, nb_chauffeurs, rng):
+    noms = rng.choice(NOMS, nb_chauffeurs)
+    prenoms = rng.choice(PRENOMS, nb_chauffeurs)
+    matricules = 100000000 + rng.permutation(nb_chauffeurs) * 7919 + rng.integers(0, 7919, nb_chauffeurs)
+    df_c = pd.DataFrame({
+        "Nom": noms, "Prenom": prenoms, "License_ID": [f"{n[0].upper()}{m}" for n, m in zip(noms, matricules)],
+        "Adresse": "", "Matricule": matricules.astype(str),
+        "Telephone": [f"819{x:07d}" for x in rng.integers(0, 10 ** 7, nb_chauffeurs)], "Note": "",
+        "UUID": _uuids(nb_chauffeurs), "Version": 1})
+    noms_complets = (df_c["Nom"] + " " + df_c["Prenom"]).tolist()
+
+    ids = [str(100 + i) for i in range(nb_taxis)]
+    df_t = pd.DataFrame({
+        "Taxi_ID": ids, "Immatriculation": [f"T{rng.integers(10000, 99999)}" for _ in ids],
+        "Chauffeur_Defaut": [noms_complets[i % nb_chauffeurs] for i in range(nb_taxis)], "UUID": _uuids(nb_taxis),
+        "Version": 1})
+    return df_t, df_c
+
+
+# --- REVENUS HEBDOMADAIRES ---
+def lundis(annees):
+    res = []
+    for a in annees:
+        d = date(a, 1, 1)
+        d += timedelta(days=(7 - d.weekday()) % 7)
+        while d.year == a:
+            res.append(d)
+            d += timedelta(days=7)
+    return res
+
+
+def generer_revenus(df_t, df_c, annees, config, rng):
+    semaines = lundis(annees)
+    nb_t, nb_s = len(df_t), len(semaines)
+    n = nb_t * nb_s
+    noms = (df_c["Nom"] + " " + df_c["Prenom"]).to_numpy()
+
+    # Une ligne par (taxi, semaine) ; le compteur du taxi avance d'une semaine à l'autre
+    taxi = np.repeat(df_t["Taxi_ID"].to_numpy(), nb_s)
+    d_deb = np.tile(np.array(semaines, dtype="datetime64[D]"), nb_t)
+    mt = rng.normal(1250, 250, n).clip(300).round(2)
+    depart = np.repeat(rng.uniform(10000, 90000, nb_t).round(2), nb_s)
+    fin = depart + mt.reshape(nb_t, nb_s).cumsum(axis=1).ravel()
+
+    defaut = np.repeat(df_t["Chauffeur_Defaut"].to_numpy(), nb_s)
+    remplace = rng.random(n) > PROBA_CHAUFFEUR_DEFAUT
+    chauffeur = np.where(remplace, rng.choice(noms, n), defaut)
+
+    def parfois(p, bas, haut):
+        return np.where(rng.random(n) < p, rng.uniform(bas, haut, n), 0.0).round(2)
+
+    v = {"Meter_Deb": (fin - mt).round(2), "Meter_Fin": fin.round(2), "Fixe": parfois(0.5, 20, 150),
+         "Nb_Appels": rng.poisson(40, n).astype(float), "STS": parfois(0.4, 10, 80),
+         "Credits": parfois(0.6, 20, 200), "Prix_Fixes": parfois(0.3, 10, 100), "Visa": rng.uniform(80, 400, n).round(2),
+         "Essence": rng.uniform(150, 300, n).round(2), "Lavage": parfois(0.5, 12, 30), "Divers": parfois(0.1, 5, 40),
+         "Impot": np.zeros(n)}
+    v = {k: pd.Series(a) for k, a in v.items()}
+    dates = pd.Series(d_deb).astype("datetime64[ns]")
+    t = taux.en_vigueur(dates, config)
+    calc = {k: c.round(2) for k, c in calculs.calculer_reglement(v, {**config, **t}).items()}
+
+    df = pd.DataFrame({"Date_Debut": dates, "Date_Fin": dates + pd.Timedelta(days=6), **_periode(dates),
+                       "Taxi": taxi, "Chauffeur": chauffeur, **v, **calc, "UUID": _uuids(n),
+                       "Version": 1})
+    return df[donnees.SCHEMAS["revenus"]]
+
+
+# --- DÉPENSES GARAGE ---
+def generer_depenses(df_t, annees, config, rng):
+    jours = pd.date_range(f"{min(annees)}-01-01", f"{max(annees)}-12-31")
+    n = int(rng.poisson(DEPENSES_PAR_MOIS * 12 * len(annees) * len(df_t)))
+    cats = list(DETAILS.keys())
+    categorie = rng.choice(cats, n)
+    ht = rng.gamma(2.0, 150, n).round(2)
+    dates = pd.Series(rng.choice(jours, n)).sort_values(ignore_index=True)
+    t = taux.en_vigueur(dates, config)
+    tps, tvq = (ht * t["tps"] / 100).round(2).to_numpy(), (ht * t["tvq"] / 100).round(2).to_numpy()
+    taxi = rng.choice(df_t["Taxi_ID"].to_numpy(), n)
+    defaut = dict(zip(df_t["Taxi_ID"], df_t["Chauffeur_Defaut"]))
+    df = pd.DataFrame({"Date": dates, **_periode(dates), "Taxi": taxi, "Chauffeur": [defaut[t] for t in taxi],
+                       "Categorie": categorie, "Details": [rng.choice(DETAILS[c]) for c in categorie],
+                       "Montant_HT": ht, "TPS": tps, "TVQ": tvq, "Montant_Total": (ht + tps + tvq).round(2),
+                       "UUID": _uuids(n), "Version": 1})
+    return df[donnees.SCHEMAS["depenses"]]
+
+
+def generer(nb_taxis, nb_chauffeurs, nb_annees, config=None, graine=None, derniere_annee=None):
+    config = {**CONFIG_DEFAUT, **(config or {})}
+    rng = np.random.default_rng(graine)
+    fin = derniere_annee or date.today().year - 1
+    annees = list(range(fin - nb_annees + 1, fin + 1))
+    df_t, df_c = generer_flotte(nb_taxis, nb_chauffeurs, rng)
+    return {"taxis": df_t, "chauffeurs": df_c, "revenus": generer_revenus(df_t, df_c, annees, config, rng),
+            "depenses": generer_depenses(df_t, annees, config, rng)}
+
+
+# --- ÉCRITURE ---
+def ecrire_csv(tables, dossier):
+    os.makedirs(dossier, exist_ok=True)
+    for nom, df in tables.items():
+        df = donnees.vers_csv(nom, df)
+        chemin = os.path.join(dossier, donnees.FICHIERS_CSV[nom])
+        with open(chemin, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(df.columns)
+            w.writerows(df.itertuples(index=False, name=None))
+    return dossier
+
+
+def ecrire_sql(tables, engine):
+    donnees.creer_tables(engine)
+    for nom, df in tables.items():
+        donnees.save_data(engine, nom, df)
+    cumuls.reconstruire(engine)
+    return engine
+
+
+def main():
+    p = argparse.ArgumentParser(description="Génère une flotte synthétique (CSV MonTaxi ou base SQL app_taxi).")
+    p.add_argument("--taxis", type=int, default=10)
+    p.add_argument("--chauffeurs", type=int, default=20)
+    p.add_argument("--annees", type=int, default=1)
+    p.add_argument("--format", choices=["csv", "sql"], default="csv")
+    p.add_argument("--db", default="sqlite:///montaxi_synthetique.db")
+    p.add_argument("--dossier", default="donnees_synthetiques")
+    p.add_argument("--graine", type=int, default=None)
+    a = p.parse_args()
+
+    tables = generer(a.taxis, a.chauffeurs, a.annees, graine=a.graine)
+    if a.format == "csv":
+        cible = ecrire_csv(tables, a.dossier)
+    else:
+        ecrire_sql(tables, create_engine(a.db))
+        cible = a.db
+    print(f"{len(tables['revenus'])} revenus, {len(tables['depenses'])} dépenses, "
+          f"{len(tables['chauffeurs'])} chauffeurs, {len(tables['taxis'])} taxis -> {cible}")
+
+
+if __name__ == "__main__":
+    main()
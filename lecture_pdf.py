@@ -0,0 +1,381 @@
+import io
+import multiprocessing
+import re
+import threading
+import time
+from datetime import datetime
+from multiprocessing.connection import wait
+
+import diagnostics
+import gabarits_pdf
+import ocr_pdf
+
+# --- MOTS-CLÉS (lecture sans gabarit) ---
+MOTS_CLES = {
+    "Meter_Total": ["TOTAL SEMAINE METER", "TOTAL METER", "TOTAL:"],
+    "Fixe": ["MONTANTS FIXES", "MONTANT FIXE"],
+    "STS": ["TOTAUX STS", "STS"],
+    "Credits": ["TOTAUX CREDITS", "CREDITS"],
+    "Prix_Fixes": ["TOTAUX PRIX FIXES", "PRIX FIXES"],
+    "Visa": ["TOTAUX VISE", "TOTAUX VISA", "DEBIT"],
+    "Essence": ["TOTAUX ESSENCE", "ESSENCE"],
+    "Lavage": ["LAVAGE AUTO", "LAVAGE"],
+    "Divers": ["DEPENSES"],
+    "Impot": ["POUR IMPOT", "IMPOT"],
+}
+# Libellés cherchés sur une feuille modèle pour proposer les boîtes d'un gabarit (gabarits_pdf.proposer)
+LIBELLES_GABARIT = {**MOTS_CLES, "Nb_Appels": ["NOMBRES D'APPELS"], "Taxi": ["NO"], "Chauffeur_Raw": ["CHAUFFEUR"],
+                    "Date_Debut": ["LUNDI"]}
+MOIS = {"jan": 1, "fev": 2, "fév": 2, "mar": 3, "avr": 4, "mai": 5, "jui": 6, "juil": 7, "aou": 8, "aoû": 8,
+        "sep": 9, "oct": 10, "nov": 11, "dec": 12, "déc": 12}
+
+
+def _date_lundi(jour, mois_txt):
+    try:
+        m_txt = mois_txt.lower()[:3]
+        m_num = 4
+        for k, v in MOIS.items():
+            if k in m_txt: m_num = v
+        return datetime(datetime.now().year, m_num, int(jour))
+    except:
+        return None
+
+
+def _montant(txt):
+    m = re.search(r"-?\d[\d\s]*(?:[.,]\d+)?", txt or "")
+    return float(m.group(0).replace(' ', '').replace(',', '.')) if m else 0.0
+
+
+def _valeurs_gabarit(textes, cout_appel):
+    # Texte de chaque boîte -> valeurs typées ; une boîte de montant vide vaut 0 (même mise en page, rien saisi)
+    data = {}
+    for champ, txt in textes.items():
+        if champ == "Taxi":
+            m = re.search(r"\d+", txt)
+            if m: data["Taxi"] = m.group(0)
+        elif champ == "Chauffeur_Raw":
+            if txt: data[champ] = txt
+        elif champ == "Date_Debut":
+            m = re.search(r"(\d{1,2})\s+([a-zA-Zéû]+)", txt)
+            d = _date_lundi(m.group(1), m.group(2)) if m else None
+            if d: data[champ] = d
+        elif champ == "Nb_Appels":
+            # Un montant (appels x coût) est reconverti en nombre d'appels, comme la recherche par mots-clés
+            v = _montant(txt)
+            data[champ] = int(round(v / cout_appel)) if re.search(r"[.,]\d{2}", txt) else int(v)
+        else:
+            data[champ] = abs(_montant(txt))
+    return data
+
+
+# --- MOTEURS DE LECTURE (pypdf sur place ; les autres en processus isolé, voir courir_moteurs) ---
+def _lecture_gabarit(contenu):
+    # Mise en page enregistrée -> texte de chaque boîte (voir gabarits_pdf.py) ; None si aucun gabarit ne correspond
+    gabarit, score, mots = gabarits_pdf.reconnaitre(contenu)
+    return (gabarit["nom"], score, gabarits_pdf.lire_champs(mots, gabarit)) if gabarit else None
+
+
+def _texte_pypdf(contenu):
+    # Texte brut
+    from pypdf import PdfReader
+    return "".join((page.extract_text() or "") + "\n" for page in PdfReader(io.BytesIO(contenu)).pages)
+
+
+def _texte_pdfplumber(contenu):
+    # Texte layout + contenu des tableaux
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(contenu)) as pdf:
+        page = pdf.pages[0]
+        texte = page.extract_text(layout=True) or ""
+        for t in page.extract_tables():
+            for r in t: texte += "\n" + " ".join([str(c) for c in r if c])
+    return texte
+
+
+MOTEURS = {"gabarit": _lecture_gabarit, "pypdf": _texte_pypdf, "pdfplumber": _texte_pdfplumber}
+
+
+# --- COURSE DES MOTEURS ---
+# pypdf (quelques ms) est lu d'abord, dans le processus : une feuille texte ordinaire s'arrête là. Les moteurs
+# lents (gabarit, pdfplumber) courent ensuite en même temps, chacun dans un processus de lecture gardé vivant
+# d'une feuille à l'autre (démarré une seule fois, pas un processus par moteur et par fichier) et avec son
+# délai : un PDF malformé qui bloque un moteur ne fige pas la session (le processus est tué, puis remplacé à la
+# feuille suivante). Le premier résultat exploitable gagne : un gabarit complet l'emporte ; sinon un texte où
+# l'on retrouve au moins MIN_LIBELLES libellés de MOTS_CLES.
+DELAIS = {"gabarit": 10, "pypdf": 10, "pdfplumber": 20}  # secondes
+MIN_LIBELLES = 3
+_contexte = None
+_ouvriers = []  # processus de lecture libres (ou finissant une lecture abandonnée)
+_verrou_ouvriers = threading.Lock()
+
+
+def _boucle(conn):
+    # Processus de lecture : (moteur, octets) -> (résultat, erreur, durée s), jusqu'à fermeture du tube
+    while True:
+        try:
+            nom, contenu = conn.recv()
+        except EOFError:
+            return
+        t0 = time.perf_counter()
+        try:
+            res, err = MOTEURS[nom](contenu), None
+        except Exception as e:
+            res, err = None, f"{type(e).__name__}: {e}"
+        conn.send((res, err, time.perf_counter() - t0))
+
+
+class _Ouvrier:
+    def __init__(self):
+        ctx = contexte()
+        self.conn, enfant = ctx.Pipe()
+        self.p = ctx.Process(target=_boucle, args=(enfant,), daemon=True)
+        self.p.start()
+        enfant.close()
+        self.fin = None  # échéance de la lecture en cours (None : libre)
+
+    def lire(self, nom, contenu):
+        self.conn.send((nom, contenu))
+        self.fin = time.monotonic() + DELAIS[nom]
+
+    def libre(self):
+        # Lecture abandonnée (moteur perdant) terminée depuis : résultat jeté, l'ouvrier resert ; au-delà de son
+        # délai, il est arrêté
+        if self.fin is not None and self.p.is_alive() and self.conn.poll():
+            try:
+                self.conn.recv()
+                self.fin = None
+            except EOFError:
+                pass
+        if self.fin is not None and time.monotonic() > self.fin: self.arreter()
+        return self.fin is None and self.p.is_alive()
+
+    def arreter(self):
+        self.p.kill()
+        self.p.join()
+
+
+def contexte():
+    # forkserver (Linux) : processus neuf sans les fils d'exécution de Streamlit, moteurs déjà importés ;
+    # spawn ailleurs (Windows). Partagé avec l'OCR (ocr_pdf.lire_texte)
+    global _contexte
+    if _contexte is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _contexte = multiprocessing.get_context("forkserver")
+            _contexte.set_forkserver_preload(["lecture_pdf", "pypdf", "pdfplumber"])
+        else:
+            _contexte = multiprocessing.get_context("spawn")
+    return _contexte
+
+
+def libelles_trouves(texte):
+    t = (texte or "").upper()
+    return sum(any(k.upper() in t for k in mots) for mots in MOTS_CLES.values())
+
+
+def _texte_exploitable(texte):
+    return len((texte or "").strip()) > 10 and libelles_trouves(texte) >= MIN_LIBELLES
+
+
+def _gabarit_complet(res, cout_appel):
+    return res is not None and all(c in _valeurs_gabarit(res[2], cout_appel) for c in LIBELLES_GABARIT)
+
+
+def _gagnant(resultats, en_cours, cout_appel):
+    if "gabarit" in resultats and _gabarit_complet(resultats["gabarit"][0], cout_appel): return "gabarit"
+    if "gabarit" in en_cours: return None
+    return next((n for n, (res, _, _) in resultats.items() if n != "gabarit" and _texte_exploitable(res)), None)
+
+
+def _prendre(n):
+    with _verrou_ouvriers:
+        libres = [o for o in _ouvriers if o.libre()]
+        _ouvriers[:] = [o for o in _ouvriers if o not in libres and o.p.is_alive()] + libres[n:]
+    return libres[:n] + [_Ouvrier() for _ in range(n - len(libres[:n]))]
+
+
+def _rendre(ouvriers):
+    with _verrou_ouvriers:
+        _ouvriers.extend(o for o in ouvriers if o.p.is_alive())
+
+
+def courir_moteurs(contenu, noms, cout_appel):
+    # -> ({moteur: (résultat, erreur, durée s)}, gagnant ou None) ; ordre du dict = ordre d'arrivée
+    debut = time.perf_counter()
+    ouvriers = _prendre(len(noms))
+    en_cours, resultats = {}, {}
+    try:
+        for nom, o in zip(noms, ouvriers):
+            o.lire(nom, contenu)
+            en_cours[nom] = o
+
+        gagnant = None
+        while en_cours and gagnant is None:
+            ecoule = time.perf_counter() - debut
+            for nom in [n for n in en_cours if ecoule >= DELAIS[n]]:
+                en_cours.pop(nom).arreter()
+                resultats[nom] = (None, f"délai de {DELAIS[nom]} s dépassé", ecoule)
+            if not en_cours: break
+            prets = wait([o.conn for o in en_cours.values()], timeout=min(DELAIS[n] for n in en_cours) - ecoule)
+            for nom, o in list(en_cours.items()):
+                if o.conn not in prets: continue
+                try:
+                    resultats[nom] = o.conn.recv()
+                    o.fin = None
+                except EOFError:
+                    o.p.join(1)
+                    resultats[nom] = (None, f"processus interrompu (code {o.p.exitcode})",
+                                      time.perf_counter() - debut)
+                del en_cours[nom]
+            gagnant = _gagnant(resultats, en_cours, cout_appel)
+
+        # Moteurs encore en cours : le résultat est déjà choisi ; leur ouvrier finit sa lecture et resservira
+        for nom in en_cours: resultats[nom] = (None, "arrêté", time.perf_counter() - debut)
+    finally:
+        _rendre(ouvriers)
+    return resultats, gagnant
+
+
+def _courir_sur_place(contenu, noms, cout_appel):
+    # Repli sans isolation (ex : appelant déjà dans un processus démon), dans l'ordre historique
+    resultats = {}
+    for nom in noms:
+        t0 = time.perf_counter()
+        try:
+            resultats[nom] = (MOTEURS[nom](contenu), None, time.perf_counter() - t0)
+        except Exception as e:
+            resultats[nom] = (None, f"{type(e).__name__}: {e}", time.perf_counter() - t0)
+        gagnant = _gagnant(resultats, [], cout_appel)
+        if gagnant: return resultats, gagnant
+    return resultats, None
+
+
+# --- INTELLIGENCE PDF (GABARIT + MOTEURS EN COURSE + OCR) ---
+# pypdf / pdfplumber sont importés au premier usage : importer ce module ne coûte rien
+# (app_taxi.py, outils en ligne de commande) tant qu'aucun PDF n'est lu.
+# travailleurs_ocr : processus pour l'OCR d'un scan (défaut : nb de cœurs ; 1 si l'appelant parallélise déjà)
+def analyser_pdf(source, cout_appel, travailleurs_ocr=None):
+    data = {}
+    debug_log = "--- DIAGNOSTIC LECTURE ---\n"
+    full_text = ""
+
+    # 1. LECTURE EN MÉMOIRE (octets, chemin ou fichier téléversé -> aucun fichier temporaire)
+    if isinstance(source, (bytes, bytearray)):
+        contenu = bytes(source)
+    elif isinstance(source, str):
+        with open(source, "rb") as f: contenu = f.read()
+    else:
+        contenu = source.getvalue() if hasattr(source, "getvalue") else source.read()
+
+    # MOTEUR A : PYPDF sur place (quelques ms) ; une feuille texte lisible n'a pas besoin de pdfplumber
+    resultats, gagnant = _courir_sur_place(contenu, ["pypdf"], cout_appel)
+
+    # MOTEURS 0 / B : GABARIT (s'il en existe) et PDFPLUMBER (si pypdf n'a pas suffi) en course
+    lents = (["gabarit"] if gabarits_pdf.charger() else []) + ([] if gagnant else ["pdfplumber"])
+    if lents:
+        try:
+            course, g = courir_moteurs(contenu, lents, cout_appel)
+        except (AssertionError, OSError) as e:
+            debug_log += f"ℹ️ Moteurs exécutés sans isolation ({e}).\n"
+            course, g = _courir_sur_place(contenu, lents, cout_appel)
+        else:
+            # Aucun moteur n'a répondu (processus morts) : relecture sans isolation, sauf délai dépassé
+            repli = [n for n, (_, err, _) in course.items() if err and not err.startswith("délai")]
+            if repli and all(err for _, err, _ in course.values()):
+                debug_log += "ℹ️ Aucun résultat des processus de lecture : relecture sans isolation.\n"
+                sur_place, g = _courir_sur_place(contenu, repli, cout_appel)
+                course.update(sur_place)
+        resultats.update(course)
+        gagnant = "gabarit" if g == "gabarit" else gagnant or g
+    for nom, (res, err, duree) in resultats.items():
+        if err != "arrêté": diagnostics.enregistrer(f"moteur_{nom}", duree)
+        if err:
+            etat = f"{'⏹️' if err == 'arrêté' else '⏱️' if err.startswith('délai') else '❌'} {err}"
+        elif nom == "gabarit":
+            etat = f"gabarit '{res[0]}' (similarité {res[1]:.2f})" if res else "aucun gabarit correspondant"
+        else:
+            etat = f"{len(res.strip())} chars, {libelles_trouves(res)} libellés"
+        debug_log += f"{'🏁' if nom == gagnant else '  '} {nom} : {duree * 1000:.0f} ms, {etat}\n"
+
+    g = resultats.get("gabarit", (None,))[0]
+    if g:
+        data = _valeurs_gabarit(g[2], cout_appel)
+        if gagnant == "gabarit": return data, debug_log
+    # Sans texte exploitable, le texte le plus riche reste préférable à rien (comportement d'avant la course)
+    textes = [res for n, (res, _, _) in resultats.items() if n != "gabarit" and res]
+    if gagnant:
+        full_text = resultats[gagnant][0]
+    elif textes:
+        full_text = max(textes, key=lambda t: (libelles_trouves(t), len(t.strip())))
+
+    # MOTEUR C : OCR LOCAL (scan / photo -> Tesseract, voir ocr_pdf.py)
+    if len(full_text.strip()) < 10:
+        ok, raison = ocr_pdf.disponible()
+        if not ok:
+            debug_log += f"ℹ️ OCR indisponible ({raison}).\n"
+        else:
+            try:
+                full_text, mesures = ocr_pdf.lire_texte(contenu, travailleurs_ocr)
+                for m in mesures:
+                    debug_log += (f"   page {m['page']} : rendu {m['rendu_ms']:.0f} ms, OCR {m['ocr_ms']:.0f} ms"
+                                  f"{' (cache)' if m['cache'] else ''}\n")
+                    if not m["cache"]: diagnostics.enregistrer("ocr_page", m["ocr_ms"] / 1000)
+                if len(full_text.strip()) > 10: debug_log += f"✅ OCR : {len(full_text)} chars lus.\n"
+            except Exception as e:
+                debug_log += f"❌ OCR : {e}\n"
+
+    # DIAGNOSTIC FINAL
+    if not full_text.strip():
+        return None, debug_log + "\n🚨 RÉSULTAT : FICHIER VIDE OU IMAGE.\nCe PDF est un scan illisible (OCR indisponible ou sans résultat).\nSolution : Saisissez les montants manuellement."
+
+    # --- EXTRACTION DES DONNÉES (champs non lus par un gabarit) ---
+    # On remplace les sauts de ligne multiples par un espace pour faciliter la regex
+    text_search = re.sub(r'\s+', ' ', full_text)
+
+    def find(keywords):
+        nonlocal debug_log
+        if isinstance(keywords, str): keywords = [keywords]
+        for k in keywords:
+            # Regex : Mot clé ... chiffres
+            # On cherche un motif large : Mot clé + jusqu'à 100 caractères + un montant
+            pattern = rf"{re.escape(k)}.*?(-?[\d\s]+[.,]\d{{2}})"
+            match = re.search(pattern, text_search, re.IGNORECASE)
+            if match:
+                try:
+                    val = float(match.group(1).replace(' ', '').replace(',', '.'))
+                    debug_log += f"   [OK] {k} -> {val}\n"
+                    return abs(val)
+                except:
+                    pass
+        return 0.0
+
+    for champ, mots_cles in MOTS_CLES.items():
+        if champ not in data: data[champ] = find(mots_cles)
+
+    # Appels (Entier)
+    if "Nb_Appels" not in data:
+        app_money = find(["NOMBRES D'APPELS X", "APPELS X"])
+        if app_money > 0:
+            data["Nb_Appels"] = int(round(app_money / cout_appel))
+        else:
+            m = re.search(r"NOMBRES D'APPELS.*?(\d+)", text_search, re.IGNORECASE)
+            if m:
+                data["Nb_Appels"] = int(m.group(1))
+            else:
+                data["Nb_Appels"] = 0
+
+    # Date & Taxi
+    # On cherche les motifs dans le texte brut original (avec sauts de ligne) pour la précision
+    mt = re.search(r"NO[:\s]*(\d+)", full_text);
+    if mt and "Taxi" not in data: data["Taxi"] = mt.group(1)
+
+    mc = re.search(r"CHAUFFEUR[:\s]*(.+)", full_text)
+    if mc and "Chauffeur_Raw" not in data:
+        row = mc.group(1).split("NO:")[0]
+        data["Chauffeur_Raw"] = row.strip()
+
+    md = re.search(r"LUNDI[:\s]*(\d{1,2})[\s\n]+([a-zA-Zéû]+)", full_text, re.IGNORECASE)
+    if md and "Date_Debut" not in data:
+        d = _date_lundi(md.group(1), md.group(2))
+        if d: data["Date_Debut"] = d
+
+    return data, debug_log
@@ -0,0 +1,123 @@
+import argparse
+import hashlib
+import importlib.util
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# --- OCR LOCAL DES FEUILLES SCANNÉES ---
+# Dernier recours de lecture_pdf.analyser_pdf quand pypdf et pdfplumber ne trouvent aucun texte (scan, photo
+# de téléphone). Chaque page est rendue en image (pypdfium2, installé avec pdfplumber) puis lue par Tesseract
+# (optionnel : pip install pytesseract + binaire tesseract avec la langue 'fra'), une page par processus.
+# Le texte est mis en cache par empreinte SHA-256 de l'image de la page : une feuille re-téléversée n'est
+# pas relue. Le texte obtenu repasse par la même extraction (mots-clés) que les PDF texte.
+#   python ocr_pdf.py scan.pdf --travailleurs 1,2,4    (temps par page, sans cache, pour dimensionner)
+DOSSIER_CACHE = ".cache_ocr"
+DPI = 300
+LANGUE = "fra+eng"
+CONFIG_TESSERACT = "--psm 6"  # un seul bloc de texte : garde « libellé ..... montant » sur une ligne
+
+
+@lru_cache(maxsize=1)
+def disponible():
+    # -> (True, "") ou (False, raison) ; vérifié une fois par processus
+    try:
+        if importlib.util.find_spec("pypdfium2") is None: raise ImportError("No module named 'pypdfium2'")
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True, ""
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+def nb_pages(contenu):
+    import pypdfium2 as pdfium
+    doc = pdfium.PdfDocument(contenu)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
+
+
+def _rendre(contenu, index):
+    import pypdfium2 as pdfium
+    doc = pdfium.PdfDocument(contenu)
+    try:
+        return doc[index].render(scale=DPI / 72, grayscale=True).to_pil()
+    finally:
+        doc.close()
+
+
+def cle_page(image):
+    h = hashlib.sha256(image.tobytes())
+    h.update(f"|{image.size}|{LANGUE}|{CONFIG_TESSERACT}".encode())
+    return h.hexdigest()
+
+
+def _ecrire_cache(chemin, texte):
+    fd, tmp = tempfile.mkstemp(prefix=".ocr_", suffix=".tmp", dir=os.path.dirname(chemin))
+    with os.fdopen(fd, 'w', encoding='utf-8') as f: f.write(texte)
+    os.replace(tmp, chemin)
+
+
+# --- UNE PAGE (processus de travail) ---
+def _ocr_page(args):
+    contenu, index, dossier_cache = args
+    t0 = time.perf_counter()
+    image = _rendre(contenu, index)
+    t1 = time.perf_counter()
+    chemin = os.path.join(dossier_cache, cle_page(image) + ".txt") if dossier_cache else None
+    if chemin and os.path.exists(chemin):
+        with open(chemin, 'r', encoding='utf-8') as f: texte = f.read()
+        en_cache = True
+    else:
+        import pytesseract
+        texte = pytesseract.image_to_string(image, lang=LANGUE, config=CONFIG_TESSERACT)
+        en_cache = False
+        if chemin: _ecrire_cache(chemin, texte)
+    t2 = time.perf_counter()
+    return {"page": index + 1, "texte": texte, "cache": en_cache, "rendu_ms": (t1 - t0) * 1000,
+            "ocr_ms": (t2 - t1) * 1000}
+
+
+# --- DOCUMENT ---
+def lire_texte(contenu, travailleurs=None, dossier_cache=DOSSIER_CACHE):
+    # -> (texte des pages dans l'ordre, mesures par page : page, cache, rendu_ms, ocr_ms)
+    n = nb_pages(contenu)
+    if dossier_cache: os.makedirs(dossier_cache, exist_ok=True)
+    taches = [(contenu, i, dossier_cache) for i in range(n)]
+    travailleurs = min(travailleurs or os.cpu_count() or 1, n)
+    if travailleurs <= 1:
+        pages = [_ocr_page(t) for t in taches]
+    else:
+        # Même démarrage que les moteurs de lecture_pdf (forkserver : pas de fork du processus Streamlit)
+        import lecture_pdf
+        with ProcessPoolExecutor(max_workers=travailleurs, mp_context=lecture_pdf.contexte()) as ex:
+            pages = list(ex.map(_ocr_page, taches))
+    return "\n".join(p["texte"] for p in pages), [{k: v for k, v in p.items() if k != "texte"} for p in pages]
+
+
+# --- DIMENSIONNEMENT (ligne de commande) ---
+def main():
+    p = argparse.ArgumentParser(description="OCR d'un PDF scanné : temps par page selon le nombre de processus.")
+    p.add_argument("pdf")
+    p.add_argument("--travailleurs", default="1", help="liste séparée par des virgules, ex : 1,2,4")
+    p.add_argument("--cache", action="store_true", help="utiliser le cache (par défaut : tout est relu)")
+    a = p.parse_args()
+
+    ok, raison = disponible()
+    if not ok: raise SystemExit(f"OCR indisponible : {raison}")
+    with open(a.pdf, "rb") as f: contenu = f.read()
+    for t in [int(x) for x in a.travailleurs.split(",")]:
+        t0 = time.perf_counter()
+        _, mesures = lire_texte(contenu, t, DOSSIER_CACHE if a.cache else None)
+        total = time.perf_counter() - t0
+        ocr = sorted(m["ocr_ms"] for m in mesures)
+        print(f"{t:>3} processus : {len(mesures)} pages en {total:.2f} s  "
+              f"(OCR/page méd. {ocr[len(ocr) // 2]:.0f} ms, max {ocr[-1]:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
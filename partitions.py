@@ -0,0 +1,231 @@
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+# --- PARTITIONNEMENT PAR ANNÉE ---
+# MySQL  : partitionnement natif RANGE COLUMNS(Annee), une partition "pAAAA" par année + "pmax".
+# SQLite : une table par année ("revenus_2025") + "revenus_autres", réunies par la vue "revenus".
+#          Des triggers INSTEAD OF routent INSERT / UPDATE / DELETE vers la bonne table,
+#          le reste de l'application continue donc d'écrire dans "revenus" comme avant.
+TABLES_PARTITIONNEES = ["revenus", "depenses"]
+
+
+def est_sqlite(engine):
+    return engine.dialect.name == "sqlite"
+
+
+def _annee_valide(annee):
+    annee = str(annee).strip()
+    return annee if len(annee) == 4 and annee.isdigit() else None
+
+
+# =============================================================================
+# MYSQL
+# =============================================================================
+def _mysql_partitions(conn, table):
+    res = conn.execute(text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION"), {"t": table}).fetchall()
+    return [(r[0], str(r[1]).strip("'")) for r in res]
+
+
+def _mysql_clause(annees):
+    parts = [f"PARTITION p{a} VALUES LESS THAN ('{int(a) + 1}')" for a in sorted(set(annees))]
+    parts.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return "PARTITION BY RANGE COLUMNS(Annee) (" + ", ".join(parts) + ")"
+
+
+def _mysql_creer(conn, table, cols, annees):
+    defs = ", ".join(["`Annee` VARCHAR(10) NOT NULL DEFAULT ''" if c == "Annee" else f"`{c}` TEXT" for c in cols])
+    conn.execute(text(f"CREATE TABLE {table} ({defs}) {_mysql_clause(annees)}"))
+
+
+def _mysql_convertir(conn, table):
+    # Table historique (tout en TEXT, non partitionnée) -> conversion en place
+    annees = [_annee_valide(r[0]) for r in conn.execute(text(f"SELECT DISTINCT Annee FROM {table}"))]
+    conn.execute(text(f"UPDATE {table} SET Annee = '' WHERE Annee IS NULL"))
+    conn.execute(text(f"ALTER TABLE {table} MODIFY `Annee` VARCHAR(10) NOT NULL DEFAULT ''"))
+    conn.execute(text(f"ALTER TABLE {table} {_mysql_clause([a for a in annees if a])}"))
+
+
+def _mysql_assurer(conn, table, annee):
+    parts = _mysql_partitions(conn, table)
+    if not parts or any(nom == f"p{annee}" for nom, _ in parts): return False
+    # Partition qui contient l'année -> découpée en [bas, annee[ + [annee, annee+1[ + [annee+1, borne[
+    bas = None
+    for nom, borne in parts:
+        if borne == "MAXVALUE" or annee < borne: break
+        bas = borne
+    suivante = str(int(annee) + 1)
+    nouvelles = []
+    if bas != annee: nouvelles.append(f"PARTITION p_avant_{annee} VALUES LESS THAN ('{annee}')")
+    nouvelles.append(f"PARTITION p{annee} VALUES LESS THAN ('{suivante}')")
+    if borne != suivante:
+        fin = "MAXVALUE" if borne == "MAXVALUE" else f"'{borne}'"
+        nouvelles.append(f"PARTITION {nom} VALUES LESS THAN ({fin})")
+    conn.execute(text(f"ALTER TABLE {table} REORGANIZE PARTITION {nom} INTO ({', '.join(nouvelles)})"))
+    return True
+
+
+# =============================================================================
+# SQLITE
+# =============================================================================
+def _sqlite_objet(conn, nom):
+    r = conn.execute(text("SELECT type FROM sqlite_master WHERE name = :n"), {"n": nom}).fetchone()
+    return r[0] if r else None
+
+
+def _sqlite_annees(conn, table):
+    noms = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :p"),
+                        {"p": f"{table}_%"}).fetchall()
+    return sorted([n[0][len(table) + 1:] for n in noms if _annee_valide(n[0][len(table) + 1:])])
+
+
+def _sqlite_colonnes(conn, table):
+    return [r[1] for r in conn.execute(text(f"PRAGMA table_info('{table}_autres')"))]
+
+
+def _sqlite_creer_physique(conn, nom, cols):
+    defs = ", ".join([f'"{c}" TEXT' for c in cols])
+    conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{nom}" ({defs})'))
+    if "UUID" in cols: conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{nom}_uuid" ON "{nom}" ("UUID")'))
+
+
+def _sqlite_vue(conn, table):
+    cols = _sqlite_colonnes(conn, table)
+    annees = _sqlite_annees(conn, table)
+    physiques = [f"{table}_{a}" for a in annees] + [f"{table}_autres"]
+    liste = ", ".join([f'"{c}"' for c in cols])
+    new = ", ".join([f'NEW."{c}"' for c in cols])
+    hors = "(" + ", ".join([f"'{a}'" for a in annees]) + ")" if annees else "('')"
+
+    for obj in [f"{table}_ins", f"{table}_upd", f"{table}_del"]: conn.execute(text(f'DROP TRIGGER IF EXISTS "{obj}"'))
+    conn.execute(text(f'DROP VIEW IF EXISTS "{table}"'))
+    conn.execute(text(f'CREATE VIEW "{table}" AS ' +
+                      " UNION ALL ".join([f'SELECT {liste} FROM "{p}"' for p in physiques])))
+
+    def routage(verbe):
+        ordres = []
+        for a in annees:
+            if verbe == "INSERT":
+                ordres.append(f'INSERT INTO "{table}_{a}" ({liste}) SELECT {new} WHERE NEW."Annee" = \'{a}\';')
+            else:
+                ordres.append(f'DELETE FROM "{table}_{a}" WHERE OLD."Annee" = \'{a}\' AND "UUID" IS OLD."UUID";')
+        if verbe == "INSERT":
+            ordres.append(f'INSERT INTO "{table}_autres" ({liste}) SELECT {new} '
+                          f'WHERE NEW."Annee" IS NULL OR NEW."Annee" NOT IN {hors};')
+        else:
+            ordres.append(f'DELETE FROM "{table}_autres" WHERE (OLD."Annee" IS NULL OR OLD."Annee" NOT IN {hors}) '
+                          f'AND "UUID" IS OLD."UUID";')
+        return " ".join(ordres)
+
+    conn.execute(text(f'CREATE TRIGGER "{table}_ins" INSTEAD OF INSERT ON "{table}" BEGIN {routage("INSERT")} END'))
+    conn.execute(text(f'CREATE TRIGGER "{table}_del" INSTEAD OF DELETE ON "{table}" BEGIN {routage("DELETE")} END'))
+    conn.execute(text(f'CREATE TRIGGER "{table}_upd" INSTEAD OF UPDATE ON "{table}" BEGIN '
+                      f'{routage("DELETE")} {routage("INSERT")} END'))
+
+
+def _sqlite_creer(conn, table, cols, annees):
+    _sqlite_creer_physique(conn, f"{table}_autres", cols)
+    for a in annees: _sqlite_creer_physique(conn, f"{table}_{a}", cols)
+    _sqlite_vue(conn, table)
+
+
+def _sqlite_convertir(conn, table):
+    # Ancienne table simple -> tables annuelles + vue
+    cols = [r[1] for r in conn.execute(text(f"PRAGMA table_info('{table}')"))]
+    conn.execute(text(f'ALTER TABLE "{table}" RENAME TO "{table}_ancien"'))
+    annees = [_annee_valide(r[0]) for r in conn.execute(text(f'SELECT DISTINCT "Annee" FROM "{table}_ancien"'))]
+    _sqlite_creer(conn, table, cols, [a for a in annees if a])
+    liste = ", ".join([f'"{c}"' for c in cols])
+    conn.execute(text(f'INSERT INTO "{table}" ({liste}) SELECT {liste} FROM "{table}_ancien"'))
+    conn.execute(text(f'DROP TABLE "{table}_ancien"'))
+
+
+def _sqlite_assurer(conn, table, annee):
+    if _sqlite_objet(conn, f"{table}_{annee}"): return False
+    cols = _sqlite_colonnes(conn, table)
+    _sqlite_creer_physique(conn, f"{table}_{annee}", cols)
+    liste = ", ".join([f'"{c}"' for c in cols])
+    conn.execute(text(f'INSERT INTO "{table}_{annee}" ({liste}) SELECT {liste} FROM "{table}_autres" '
+                      f'WHERE "Annee" = :a'), {"a": annee})
+    conn.execute(text(f'DELETE FROM "{table}_autres" WHERE "Annee" = :a'), {"a": annee})
+    _sqlite_vue(conn, table)
+    return True
+
+
+# =============================================================================
+# API COMMUNE
+# =============================================================================
+def creer_ou_convertir(engine, table, cols):
+    annee = str(pd.Timestamp.now().year)
+    with engine.begin() as conn:
+        if est_sqlite(engine):
+            obj = _sqlite_objet(conn, table)
+            if obj is None: _sqlite_creer(conn, table, cols, [annee])
+            elif obj == "table": _sqlite_convertir(conn, table)
+        else:
+            existe = conn.execute(text("SELECT COUNT(*) FROM information_schema.TABLES "
+                                       "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :t"), {"t": table}).scalar()
+            if not existe: _mysql_creer(conn, table, cols, [annee])
+            elif not _mysql_partitions(conn, table): _mysql_convertir(conn, table)
+
+
+def assurer_partitions(engine, table, annees):
+    # Appelé avant chaque écriture : une nouvelle année obtient automatiquement sa partition
+    if table not in TABLES_PARTITIONNEES: return
+    annees = sorted(set([a for a in (_annee_valide(x) for x in annees) if a]))
+    if not annees: return
+    with engine.begin() as conn:
+        for a in annees:
+            if est_sqlite(engine): _sqlite_assurer(conn, table, a)
+            else: _mysql_assurer(conn, table, a)
+
+
+def vider_table(conn, engine, table):
+    # Vidage direct des tables physiques (évite le trigger ligne par ligne sur SQLite)
+    if est_sqlite(engine) and table in TABLES_PARTITIONNEES and _sqlite_objet(conn, table) == "view":
+        for a in _sqlite_annees(conn, table) + ["autres"]: conn.execute(text(f'DELETE FROM "{table}_{a}"'))
+    else:
+        conn.execute(text(f"DELETE FROM {table}"))
+
+
+def tables_physiques(conn, engine, table):
+    # Tables réellement modifiables (SQLite : les triggers INSTEAD OF ne rapportent aucun rowcount)
+    if est_sqlite(engine) and table in TABLES_PARTITIONNEES and _sqlite_objet(conn, table) == "view":
+        return [f'"{table}_{a}"' for a in _sqlite_annees(conn, table) + ["autres"]]
+    return [table]
+
+
+def assurer_colonnes(engine, table, cols):
+    # Colonne ajoutée au schéma (ex : Version) -> ALTER TABLE sur les tables existantes
+    with engine.begin() as conn:
+        if est_sqlite(engine) and table in TABLES_PARTITIONNEES and _sqlite_objet(conn, table) == "view":
+            manquantes = [c for c in cols if c not in _sqlite_colonnes(conn, table)]
+            if not manquantes: return []
+            for p in tables_physiques(conn, engine, table):
+                for c in manquantes: conn.execute(text(f'ALTER TABLE {p} ADD COLUMN "{c}" TEXT'))
+            _sqlite_vue(conn, table)
+            return manquantes
+    existantes = [c["name"] for c in sqlalchemy.inspect(engine).get_columns(table)]
+    manquantes = [c for c in cols if c not in existantes]
+    with engine.begin() as conn:
+        for c in manquantes: conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {c} TEXT"))
+    return manquantes
+
+
+def source_annee(engine, table, annee):
+    # Élagage : sur SQLite on interroge directement la table de l'année,
+    # sur MySQL le filtre Annee = :a suffit (partition pruning natif)
+    annee = _annee_valide(annee)
+    if annee and est_sqlite(engine) and table in TABLES_PARTITIONNEES:
+        with engine.connect() as conn:
+            if _sqlite_objet(conn, f"{table}_{annee}"): return f'"{table}_{annee}"'
+    return table
+
+
+def annees_presentes(engine, table):
+    with engine.connect() as conn:
+        return sorted([str(r[0]) for r in conn.execute(text(f"SELECT DISTINCT Annee FROM {table}")) if r[0]],
+                      reverse=True)
@@ -0,0 +1,177 @@
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+import flottes
+import partitions
+
+# --- RECHERCHE PLEIN TEXTE (Transactions, Dépenses, Chauffeurs) ---
+# Table d'index "recherche" : un document par ligne (Source, UUID, Taxi, Date, Texte). Index FTS5 à contenu
+# externe sous SQLite, FULLTEXT (InnoDB) sous MySQL. Tenue à jour dans la MÊME transaction que chaque écriture
+# de donnees.py (ligne, lot, remplacement complet) : une fiche enregistrée est trouvable immédiatement.
+# Requête : mots ET, chaque mot en préfixe (« frei 122 » trouve « Freins avant » du taxi 122) ; accents et
+# casse ignorés ; filtres Taxi / période ; résultats classés par pertinence (bm25 / score MATCH).
+#   python recherche.py "frein 122" --du 2025-03-01 --au 2025-06-30
+#   python recherche.py --reconstruire
+TABLE_RECHERCHE = "recherche"
+CHAMPS = {"revenus": ["Taxi", "Chauffeur"],
+          "depenses": ["Categorie", "Details", "Taxi", "Chauffeur"],
+          "chauffeurs": ["Prenom", "Nom", "Matricule", "License_ID", "Telephone", "Note"]}
+COL_DATE = {"revenus": "Date_Debut", "depenses": "Date"}
+COLONNES = ["Source", "UUID", "Taxi", "Date", "Texte"]
+LIMITE = 50
+
+_RE_MOT = re.compile(r"\w+", re.UNICODE)
+_pret = set()
+
+
+def creer_index(engine):
+    if sqlalchemy.inspect(engine).has_table(TABLE_RECHERCHE): return False
+    t = TABLE_RECHERCHE
+    with engine.begin() as conn:
+        if partitions.est_sqlite(engine):
+            # Table ordinaire (suppression par UUID indexée) + index FTS5 à contenu externe tenu par triggers
+            conn.execute(text(f"CREATE TABLE {t} (id INTEGER PRIMARY KEY, Source TEXT NOT NULL, "
+                              f"UUID TEXT NOT NULL, Taxi TEXT, Date TEXT, Texte TEXT)"))
+            conn.execute(text(f"CREATE INDEX idx_{t}_uuid ON {t} (Source, UUID)"))
+            conn.execute(text(f"CREATE VIRTUAL TABLE {t}_fts USING fts5(Texte, content = '{t}', "
+                              f"content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"))
+            conn.execute(text(f"CREATE TRIGGER {t}_ai AFTER INSERT ON {t} BEGIN "
+                              f"INSERT INTO {t}_fts (rowid, Texte) VALUES (NEW.id, NEW.Texte); END"))
+            conn.execute(text(f"CREATE TRIGGER {t}_ad AFTER DELETE ON {t} BEGIN INSERT INTO {t}_fts "
+                              f"({t}_fts, rowid, Texte) VALUES ('delete', OLD.id, OLD.Texte); END"))
+        else:
+            conn.execute(text(f"CREATE TABLE {t} (Source VARCHAR(16) NOT NULL, UUID VARCHAR(64) NOT NULL, "
+                              f"Taxi VARCHAR(64), Date VARCHAR(10), Texte TEXT, PRIMARY KEY (Source, UUID), "
+                              f"KEY idx_{t}_taxi (Taxi), KEY idx_{t}_date (Date), FULLTEXT KEY ft_{t} (Texte)) "
+                              f"ENGINE = InnoDB DEFAULT CHARSET = utf8mb4"))
+    return True
+
+
+def assurer(engine):
+    # Première utilisation : index créé puis rempli depuis les tables vivantes
+    if creer_index(engine): reconstruire(engine)
+    _pret.add(str(engine.url))
+
+
+def _actif(conn, engine):
+    # Écritures faites avant assurer() (scripts, API) : l'index n'est tenu que s'il existe
+    cle = str(engine.url)
+    if cle not in _pret and sqlalchemy.inspect(conn).has_table(TABLE_RECHERCHE): _pret.add(cle)
+    return cle in _pret
+
+
+# --- DOCUMENTS ---
+def documents(table, df):
+    # Lignes (texte, voir donnees.vers_texte) -> documents de l'index
+    n = len(df)
+    def col(c):
+        if c not in df.columns: return pd.Series([""] * n, index=df.index)
+        return df[c].astype(object).where(df[c].notna(), "").astype(str).replace({"nan": "", "None": ""})
+    texte = col(CHAMPS[table][0])
+    for c in CHAMPS[table][1:]: texte = texte + " " + col(c)
+    return pd.DataFrame({"Source": table, "UUID": col("UUID"), "Taxi": col("Taxi"),
+                         "Date": col(COL_DATE[table]).str[:10] if table in COL_DATE else "",
+                         "Texte": texte.str.strip()})[COLONNES]
+
+
+def indexer(conn, engine, table, lignes=None, retires=(), tout=False):
+    # Dans la transaction de l'écriture : documents 'retires' (UUID) ou toute la source (tout=True) enlevés,
+    # puis 'lignes' (ré)indexées
+    if table not in CHAMPS or not _actif(conn, engine): return
+    docs = documents(table, lignes) if lignes is not None and len(lignes) else None
+    if tout:
+        conn.execute(text(f"DELETE FROM {TABLE_RECHERCHE} WHERE Source = :s"), {"s": table})
+    else:
+        uuids = [str(u) for u in retires] + (list(docs["UUID"]) if docs is not None else [])
+        if uuids: conn.execute(text(f"DELETE FROM {TABLE_RECHERCHE} WHERE Source = :s AND UUID = :u"),
+                               [{"s": table, "u": u} for u in uuids])
+    if docs is not None:
+        conn.execute(text(f"INSERT INTO {TABLE_RECHERCHE} ({', '.join(COLONNES)}) "
+                          f"VALUES ({', '.join(':' + c for c in COLONNES)})"), docs.to_dict("records"))
+
+
+def reconstruire(engine):
+    # Sources lues d'abord, puis vidage + réindexation dans UNE transaction (jamais d'index à moitié vide)
+    sources = {}
+    for table in CHAMPS:
+        cols = sorted({"UUID", *CHAMPS[table], *([COL_DATE[table]] if table in COL_DATE else [])})
+        try:
+            sources[table] = pd.read_sql(text(f"SELECT {', '.join(cols)} FROM {table}"), engine)
+        except Exception:
+            continue  # table pas encore créée
+    with engine.begin() as conn:
+        conn.execute(text(f"DELETE FROM {TABLE_RECHERCHE}"))
+        for table, df in sources.items():
+            indexer(conn, engine, table, df)
+    _pret.add(str(engine.url))
+
+
+# --- REQUÊTE ---
+def _mots(requete):
+    return [m for m in _RE_MOT.findall(str(requete)) if m]
+
+
+def chercher(engine, requete, sources=None, taxi=None, debut=None, fin=None, limite=LIMITE):
+    # -> DataFrame Source, UUID, Taxi, Date, Texte, Score (meilleurs d'abord) ; vide si aucun mot
+    mots = _mots(requete)
+    if not mots: return pd.DataFrame(columns=[*COLONNES, "Score"])
+    params = {"lim": int(limite)}
+    filtres = []
+    if sources:
+        filtres.append(f"Source IN ({', '.join(':s' + str(i) for i in range(len(sources)))})")
+        params.update({f"s{i}": s for i, s in enumerate(sources)})
+    if taxi: filtres.append("Taxi = :taxi"); params["taxi"] = str(taxi)
+    if debut is not None: filtres.append("Date >= :debut"); params["debut"] = str(debut)[:10]
+    if fin is not None: filtres.append("Date <= :fin"); params["fin"] = str(fin)[:10]
+    et = "".join(f" AND {f}" for f in filtres)
+    t = TABLE_RECHERCHE
+    if partitions.est_sqlite(engine):
+        params["q"] = " ".join(f'"{m}"*' for m in mots)
+        sql = (f"SELECT {', '.join(t + '.' + c for c in COLONNES)}, -bm25({t}_fts) AS Score "
+               f"FROM {t}_fts JOIN {t} ON {t}.id = {t}_fts.rowid "
+               f"WHERE {t}_fts MATCH :q{et} ORDER BY bm25({t}_fts) LIMIT :lim")
+    else:
+        params["q"] = " ".join(f"+{m}*" for m in mots)
+        sql = (f"SELECT {', '.join(COLONNES)}, MATCH(Texte) AGAINST(:q IN BOOLEAN MODE) AS Score "
+               f"FROM {t} WHERE MATCH(Texte) AGAINST(:q IN BOOLEAN MODE){et} "
+               f"ORDER BY Score DESC LIMIT :lim")
+    return pd.read_sql(text(sql), engine, params=params)
+
+
+# --- LIGNE DE COMMANDE ---
+def main():
+    p = argparse.ArgumentParser(description="Recherche plein texte (transactions, dépenses, chauffeurs).")
+    p.add_argument("requete", nargs="?", default="")
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"))
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte de flottes.json : sa base (remplace --db)")
+    p.add_argument("--taxi", default=None)
+    p.add_argument("--du", default=None, help="AAAA-MM-JJ")
+    p.add_argument("--au", default=None, help="AAAA-MM-JJ")
+    p.add_argument("--reconstruire", action="store_true", help="réindexer toutes les lignes")
+    a = p.parse_args()
+
+    engine = flottes.source(a.flotte)[0] if a.flotte else sqlalchemy.create_engine(a.db)
+    if a.reconstruire:
+        creer_index(engine)
+        t0 = time.perf_counter()
+        reconstruire(engine)
+        print(f"Index reconstruit en {time.perf_counter() - t0:.2f} s")
+    else:
+        assurer(engine)
+    if a.requete:
+        t0 = time.perf_counter()
+        res = chercher(engine, a.requete, taxi=a.taxi, debut=a.du, fin=a.au)
+        ms = (time.perf_counter() - t0) * 1000
+        print(res.to_string(index=False) if len(res) else "Aucun résultat.")
+        print(f"{len(res)} résultat(s) en {ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+import appariement
+import archives
+import calculs
+import configuration
+import cumuls
+import donnees
+import flottes
+import lecture_pdf
+import taux
+
+# --- RÈGLEMENT EN LOT (sans interface) ---
+# Lit toutes les feuilles hebdomadaires PDF d'un dossier en parallèle (un processus par cœur),
+# apparie taxis / chauffeurs avec la base, calcule le règlement comme le formulaire Transactions
+# et enregistre les lignes retenues en UNE transaction. Rapport CSV ou JSON : succès, doublons, échecs.
+#   python reglement_lot.py feuilles/ --rapport rapport_lundi.csv
+#   python reglement_lot.py feuilles/ --simulation --rapport apercu.json
+SEUIL_CHAUFFEUR = 0.5
+COLONNES_RAPPORT = ["Fichier", "Statut", "Motif", "Date_Debut", "Taxi", "Chauffeur", "Score_Chauffeur",
+                    "Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis", "UUID"]
+
+
+def lister_pdf(dossier):
+    return sorted([os.path.join(r, f) for r, _, fs in os.walk(dossier) for f in fs if f.lower().endswith(".pdf")])
+
+
+# --- ÉTAPE 1 : LECTURE (processus de travail) ---
+def _lire(args):
+    chemin, cout_appel = args
+    try:
+        # Un processus par feuille : l'OCR d'un scan reste dans ce processus
+        data, log = lecture_pdf.analyser_pdf(chemin, cout_appel, travailleurs_ocr=1)
+        return chemin, data, log, None
+    except Exception as e:
+        return chemin, None, "", f"{type(e).__name__}: {e}"
+
+
+def lire_feuilles(chemins, cout_appel, travailleurs=None):
+    travailleurs = travailleurs or os.cpu_count() or 1
+    taches = [(c, cout_appel) for c in chemins]
+    if travailleurs == 1 or len(taches) < 2: return [_lire(t) for t in taches]
+    with ProcessPoolExecutor(max_workers=travailleurs) as ex:
+        return list(ex.map(_lire, taches, chunksize=max(1, len(taches) // (travailleurs * 4))))
+
+
+# --- ÉTAPE 2 : APPARIEMENT + RÈGLEMENT (processus principal) ---
+def _taxi_connu(taxi, ids):
+    taxi = str(taxi or "").strip()
+    if taxi in ids: return taxi
+    alt = taxi.lstrip("0")
+    return alt if alt in ids else None
+
+
+def traiter(resultats, engine, config):
+    df_taxis = donnees.load_data(engine, "taxis")
+    index = appariement.IndexChauffeurs(donnees.load_data(engine, "chauffeurs"), df_taxis)
+    ids = set(df_taxis["Taxi_ID"].astype(str))
+
+    # Clés (date, taxi) déjà en base pour les années concernées -> contrôle de doublon sans relire la table
+    annees = sorted({str(d["Date_Debut"].year) for _, d, _, _ in resultats if d and d.get("Date_Debut")})
+    existants = set()
+    if annees:
+        df = donnees.load_data(engine, "revenus", ["Date_Debut", "Taxi"], where={"Annee": annees})
+        existants = set(zip(df["Date_Debut"].dt.strftime("%Y-%m-%d"), df["Taxi"].astype(str)))
+
+    rapport, lignes = [], []
+    for chemin, data, log, erreur in resultats:
+        r = {"Fichier": os.path.basename(chemin), "Statut": "echec", "Motif": erreur or ""}
+        rapport.append(r)
+        if erreur: continue
+        if not data or not (data.get("Meter_Total", 0) > 0 or data.get("Essence", 0) > 0):
+            r["Motif"] = "Aucune donnée lisible (scan ?)"; continue
+        if not data.get("Date_Debut"):
+            r["Motif"] = "Date introuvable"; continue
+        taxi = _taxi_connu(data.get("Taxi"), ids)
+        d_in = data["Date_Debut"].date()
+        r.update({"Date_Debut": d_in.strftime("%Y-%m-%d"), "Taxi": data.get("Taxi", "")})
+        if taxi is None:
+            r["Motif"] = f"Taxi inconnu '{data.get('Taxi', '')}'"; continue
+        cands = index.candidats(data.get("Chauffeur_Raw", ""), taxi=taxi, n=1)
+        if not cands or cands[0][1] < SEUIL_CHAUFFEUR:
+            r["Motif"] = f"Chauffeur non reconnu '{data.get('Chauffeur_Raw', '')}'"; continue
+        r.update({"Taxi": taxi, "Chauffeur": cands[0][0], "Score_Chauffeur": cands[0][1]})
+
+        cle = (r["Date_Debut"], taxi)
+        if cle in existants:
+            r.update({"Statut": "doublon", "Motif": "Semaine déjà saisie pour ce taxi"}); continue
+        existants.add(cle)
+
+        ligne = {"Date_Debut": d_in, "Taxi": taxi, "Chauffeur": cands[0][0], **calculs.saisie_depuis_pdf(data),
+                 "UUID": str(uuid.uuid4()), donnees.COL_VERSION: 1}
+        lignes.append(ligne)
+        r.update({"Statut": "succes", "Motif": "", "UUID": ligne["UUID"]})
+
+    if not lignes: return rapport, pd.DataFrame(columns=donnees.SCHEMAS["revenus"])
+    # Règlement de tout le lot en une passe, aux taux en vigueur à la date de chaque feuille
+    df = calculs.recalculer_revenus(pd.DataFrame(lignes), config)
+    montants = df.set_index("UUID")[["Total_Brut", "Salaire_Chauffeur", "Grand_Total_Remis"]].to_dict("index")
+    for r in rapport:
+        if r.get("UUID") in montants: r.update(montants[r["UUID"]])
+    return rapport, df.reindex(columns=donnees.SCHEMAS["revenus"])
+
+
+# --- ÉTAPE 3 : ENREGISTREMENT + RAPPORT ---
+def ecrire_rapport(rapport, chemin):
+    df = pd.DataFrame(rapport, columns=COLONNES_RAPPORT)
+    if chemin.lower().endswith(".json"):
+        df.to_json(chemin, orient="records", force_ascii=False, indent=2)
+    else:
+        df.to_csv(chemin, index=False, encoding="utf-8")
+    return chemin
+
+
+def main():
+    p = argparse.ArgumentParser(description="Règlement en lot des feuilles hebdomadaires PDF.")
+    p.add_argument("dossier")
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"))
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte de flottes.json : sa base, ses archives et sa configuration (remplace --db)")
+    p.add_argument("--config", default=None, help="configuration (défaut : celle de la flotte)")
+    p.add_argument("--rapport", default="rapport_reglements.csv", help="extension .csv ou .json")
+    p.add_argument("--travailleurs", type=int, default=None, help="processus de lecture (défaut : nb de cœurs)")
+    p.add_argument("--simulation", action="store_true", help="n'écrit rien en base")
+    a = p.parse_args()
+
+    if a.flotte: engine, dossier_archives, fichier_config = flottes.source(a.flotte)
+    else: engine, dossier_archives, fichier_config = (create_engine(a.db), archives.DOSSIER_ARCHIVES,
+                                                      configuration.FILE_CONFIG)
+    config = configuration.charger(a.config or fichier_config)
+    chemins = lister_pdf(a.dossier)
+    if not chemins: sys.exit(f"Aucun PDF dans '{a.dossier}'.")
+
+    resultats = lire_feuilles(chemins, taux.actuels(config)["cout_appel"], a.travailleurs)
+    rapport, df = traiter(resultats, engine, config)
+    if not df.empty and not a.simulation:
+        donnees.ajouter_lignes(engine, "revenus", df)
+        cumuls.rafraichir(engine, df["Mois"].unique(), dossier_archives)
+
+    ecrire_rapport(rapport, a.rapport)
+    nb = pd.Series([r["Statut"] for r in rapport]).value_counts()
+    print(f"{len(chemins)} feuilles : {nb.get('succes', 0)} réglées, {nb.get('doublon', 0)} doublons, "
+          f"{nb.get('echec', 0)} échecs{' (simulation)' if a.simulation else ''} -> {a.rapport}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import argparse
+import os
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from fpdf import FPDF
+from sqlalchemy import create_engine, text
+
+import appariement
+import archives
+import calculs
+import flottes
+import partitions
+
+# --- RELEVÉS ANNUELS PAR CHAUFFEUR ---
+# Une requête groupée (Chauffeur, Mois) pour toute la flotte, puis un PDF par chauffeur rendu
+# dans un pool de processus. Sortie : archive .zip ou dossier.
+#   python releves_annuels.py 2025 --sortie releves_2025.zip
+#   python releves_annuels.py 2025 --sortie releves_2025/ --travailleurs 8
+SOMMES = ["Total_Brut", "Redevance", "Salaire_Chauffeur", "Impot", *calculs.DEDUCTIONS, "Grand_Total_Remis"]
+LOGO = "logo.png"
+LOGO_PX = 200
+ENTETE = "MonTaxi31"
+
+
+# --- DONNÉES (une seule requête pour tous les chauffeurs) ---
+def requete_releves(engine, annee):
+    src = partitions.source_annee(engine, "revenus", annee)
+    num = "REAL" if partitions.est_sqlite(engine) else "DECIMAL(12,2)"
+    sommes = ", ".join([f"SUM(CAST(COALESCE(NULLIF({c}, ''), '0') AS {num})) AS {c}" for c in SOMMES])
+    sql = (f"SELECT Chauffeur, Mois, COUNT(*) AS Semaines, {sommes} FROM {src} "
+           f"WHERE Annee = :a GROUP BY Chauffeur, Mois ORDER BY Chauffeur, Mois")
+    return sql, {"a": str(annee)}
+
+
+def charger_releves(engine, annee, dossier=archives.DOSSIER_ARCHIVES):
+    if archives.est_archivee(annee, dossier):
+        df = archives.lire_archive("revenus", annee, colonnes=["Chauffeur", "Mois", *SOMMES], dossier=dossier)
+        df = df.groupby(["Chauffeur", "Mois"], as_index=False).agg(Semaines=("Mois", "size"), **{
+            c: (c, "sum") for c in SOMMES})
+    else:
+        sql, params = requete_releves(engine, annee)
+        df = pd.read_sql(text(sql), engine, params=params)
+    df[SOMMES] = df[SOMMES].astype(float).fillna(0.0)
+    df["Deductions"] = df[calculs.DEDUCTIONS].sum(axis=1)
+    return df[df["Chauffeur"].astype(str).str.strip() != ""]
+
+
+# --- RENDU PDF (processus de travail) ---
+def _fmt(v):
+    return f"{v:,.2f} $".replace(",", " ")
+
+
+def _latin(txt):
+    # Polices de base fpdf : latin-1 uniquement
+    return str(txt).encode("latin-1", "replace").decode("latin-1")
+
+
+_images = {}
+
+
+def reduire_logo(dossier, cote=LOGO_PX):
+    # Logo 1024 px -> vignette : chaque relevé embarque l'image, la taille du lot en dépend directement
+    if not os.path.exists(LOGO): return None
+    try:
+        from PIL import Image
+        img = Image.open(LOGO)
+        img.thumbnail((cote, cote))
+        chemin = os.path.join(dossier, "logo_releve.png")
+        img.save(chemin)
+        return chemin
+    except:
+        return LOGO
+
+
+def _poser_logo(pdf, logo):
+    # Le PNG est décodé une seule fois par processus (fpdf le relirait pour chaque relevé)
+    if not logo: return
+    try:
+        if logo in _images and hasattr(pdf, "images"): pdf.images[logo] = dict(_images[logo])
+        pdf.image(logo, x=170, y=8, w=25)
+        if hasattr(pdf, "images"): _images.setdefault(logo, dict(pdf.images[logo]))
+    except:
+        pass
+
+
+def rendre_releve(args):
+    chauffeur, annee, mois, entete, logo = args
+    pdf = FPDF()
+    pdf.add_page()
+    _poser_logo(pdf, logo)
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, _latin(f"{entete} - Relevé annuel {annee}"), ln=True)
+    pdf.set_font("Arial", size=11)
+    pdf.cell(0, 8, _latin(f"Chauffeur : {chauffeur}"), ln=True)
+    pdf.cell(0, 8, _latin(f"Émis le {datetime.now().strftime('%Y-%m-%d')}"), ln=True)
+    pdf.ln(4)
+
+    # Tableau mensuel
+    cols = [("Mois", "Mois", 22), ("Sem.", "Semaines", 14), ("Brut", "Total_Brut", 28),
+            ("Salaire", "Salaire_Chauffeur", 28), ("Impôt", "Impot", 26), ("Déductions", "Deductions", 30),
+            ("Net remis", "Grand_Total_Remis", 30)]
+    pdf.set_font("Arial", "B", 10)
+    for titre, _, w in cols: pdf.cell(w, 8, _latin(titre), border=1, align="C")
+    pdf.ln()
+    pdf.set_font("Arial", size=10)
+    for m in mois:
+        for _, c, w in cols:
+            v = m[c]
+            pdf.cell(w, 7, str(int(v)) if c == "Semaines" else (v if c == "Mois" else _fmt(v)), border=1,
+                     align="L" if c == "Mois" else "R")
+        pdf.ln()
+
+    tot = {c: sum([m[c] for m in mois]) for _, c, _ in cols[1:]}
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(cols[0][2], 8, "TOTAL", border=1)
+    for _, c, w in cols[1:]:
+        pdf.cell(w, 8, str(int(tot[c])) if c == "Semaines" else _fmt(tot[c]), border=1, align="R")
+    pdf.ln(12)
+
+    # Détail des déductions
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 8, _latin("Détail des déductions"), ln=True)
+    pdf.set_font("Arial", size=10)
+    for c in calculs.DEDUCTIONS:
+        pdf.cell(60, 7, _latin(c.replace("_", " ")))
+        pdf.cell(40, 7, _fmt(sum([m[c] for m in mois])), align="R", ln=True)
+    pdf.cell(60, 7, _latin("Redevance appels"))
+    pdf.cell(40, 7, _fmt(sum([m["Redevance"] for m in mois])), align="R", ln=True)
+
+    res = pdf.output(dest="S")
+    nom = "_".join(appariement.normaliser(chauffeur).split()) or "inconnu"
+    return f"releve_{annee}_{nom}.pdf", res.encode("latin-1") if isinstance(res, str) else bytes(res)
+
+
+def generer_releves(df, annee, travailleurs=None, entete=ENTETE):
+    travailleurs = travailleurs or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory(prefix="montaxi_releves_") as tmp:
+        logo = reduire_logo(tmp)
+        taches = [(ch, annee, g.to_dict("records"), entete, logo) for ch, g in df.groupby("Chauffeur", observed=True)]
+        if travailleurs == 1 or len(taches) < 2:
+            yield from map(rendre_releve, taches)
+            return
+        with ProcessPoolExecutor(max_workers=travailleurs) as ex:
+            yield from ex.map(rendre_releve, taches, chunksize=max(1, len(taches) // (travailleurs * 4)))
+
+
+# --- SORTIE ---
+def ecrire(releves, sortie):
+    n = 0
+    if sortie.lower().endswith(".zip"):
+        # PDF déjà compressé -> stockage sans recompression
+        with zipfile.ZipFile(sortie, "w", zipfile.ZIP_STORED) as z:
+            for nom, contenu in releves:
+                z.writestr(nom, contenu); n += 1
+    else:
+        os.makedirs(sortie, exist_ok=True)
+        for nom, contenu in releves:
+            with open(os.path.join(sortie, nom), "wb") as f: f.write(contenu)
+            n += 1
+    return n
+
+
+def main():
+    p = argparse.ArgumentParser(description="Relevés annuels PDF par chauffeur.")
+    p.add_argument("annee")
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"))
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte de flottes.json : sa base et ses archives (remplace --db)")
+    p.add_argument("--sortie", default=None, help="fichier .zip ou dossier (défaut : releves_<annee>.zip)")
+    p.add_argument("--travailleurs", type=int, default=None, help="processus de rendu (défaut : nb de cœurs)")
+    a = p.parse_args()
+
+    if a.flotte:
+        engine, dossier, _ = flottes.source(a.flotte)
+    else:
+        engine, dossier = create_engine(a.db), archives.DOSSIER_ARCHIVES
+    df = charger_releves(engine, a.annee, dossier)
+    if df.empty: sys.exit(f"Aucun revenu pour {a.annee}.")
+    sortie = a.sortie or f"releves_{a.annee}.zip"
+    n = ecrire(generer_releves(df, a.annee, a.travailleurs), sortie)
+    print(f"{n} relevés -> {sortie}")
+
+
+if __name__ == "__main__":
+    main()
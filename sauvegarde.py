@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy import text
+
+import archives
+import cumuls
+import donnees
+import flottes
+
+# --- SAUVEGARDES COMPLÈTES + INCRÉMENTALES ---
+# Une sauvegarde = un dossier "sauvegardes/AAAAMMJJ-HHMMSS_complete|increment/" contenant, par table :
+#   <table>.parquet       lignes écrites (toutes pour une complète ; nouvelles / modifiées pour un incrément)
+#   <table>_cles.parquet  UUID + Version de TOUTES les lignes vivantes à cet instant (suppressions déduites)
+#   infos.json            type, horodatage, sauvegarde précédente, comptes et débit (écrit en dernier)
+# Un incrément ne relit que (UUID, Version) de chaque table, compare aux clés de la sauvegarde précédente et ne
+# relit que les lignes changées. Une ligne sans UUID est recopiée à chaque sauvegarde. Tout est lu dans une
+# seule transaction (instantané cohérent), écrit en Parquet compressé (zstd) dans un dossier temporaire puis
+# renommé : une sauvegarde interrompue n'existe pas. Une complète est refaite tous les CYCLE incréments.
+# Restauration : dernière complète avant l'instant demandé + incréments suivants rejoués, vers la base SQL
+# (donnees.save_data, partitions / index de recherche / cumuls refaits) ou vers des fichiers CSV.
+# Les années archivées (archives.py) ont leurs propres fichiers et ne sont pas concernées.
+# Avec --flotte : base de la flotte et sauvegardes dans son dossier (flottes.py), jamais mélangées entre flottes.
+#   python sauvegarde.py sauvegarder             (complète ou incrément selon la chaîne)
+#   python sauvegarde.py lister
+#   python sauvegarde.py restaurer --jusqu-a "2026-10-19 14:00" --vers-db sqlite:///restaure.db
+#   python sauvegarde.py restaurer --vers-csv restauration/
+DOSSIER_SAUVEGARDES = "sauvegardes"
+TABLES = list(donnees.SCHEMAS)
+COMPRESSION = "zstd"
+CYCLE = 7  # incréments au plus entre deux sauvegardes complètes
+TAILLE_LOT = 50000
+LOT_UUID = 500  # UUID par requête IN pour relire les lignes changées
+FORMAT_NOM = "%Y%m%d-%H%M%S"
+
+
+# --- JOURNAL (un dossier par sauvegarde terminée) ---
+def lister(dossier=DOSSIER_SAUVEGARDES):
+    # Sauvegardes terminées, de la plus ancienne à la plus récente
+    res = []
+    if not os.path.isdir(dossier): return res
+    for nom in sorted(os.listdir(dossier)):
+        infos = os.path.join(dossier, nom, "infos.json")
+        if nom.startswith(".") or not os.path.exists(infos): continue
+        with open(infos, 'r', encoding='utf-8') as f: res.append({**json.load(f), "nom": nom,
+                                                                  "chemin": os.path.join(dossier, nom)})
+    return res
+
+
+def chaine(jusqu_a=None, dossier=DOSSIER_SAUVEGARDES):
+    # Sauvegardes à rejouer pour revenir à 'jusqu_a' (None : la plus récente) : une complète + ses incréments
+    limite = pd.Timestamp(jusqu_a) if jusqu_a is not None else None
+    dispo = [s for s in lister(dossier) if limite is None or pd.Timestamp(s["horodatage"]) <= limite]
+    debuts = [i for i, s in enumerate(dispo) if s["type"] == "complete"]
+    if not debuts: raise ValueError(f"Aucune sauvegarde complète{' avant ' + str(limite) if limite else ''}.")
+    res = dispo[debuts[-1]:]
+    for prec, s in zip(res, res[1:]):
+        if s.get("precedente") != prec["nom"]:
+            raise RuntimeError(f"Chaîne interrompue : '{s['nom']}' suit '{s.get('precedente')}', introuvable.")
+    return res
+
+
+# --- ÉCRITURE ---
+def _cles(df):
+    # (UUID, Version normalisée) des lignes qui ont un UUID
+    uid = df["UUID"].astype(object).where(df["UUID"].notna(), "").astype(str).str.strip()
+    ver = pd.to_numeric(df["Version"], errors='coerce').fillna(0).astype(int).astype(str) \
+        if "Version" in df.columns else pd.Series("0", index=df.index)
+    garde = uid != ""
+    return pd.DataFrame({"UUID": uid[garde], "Version": ver[garde]}, dtype="string").reset_index(drop=True)
+
+
+def _ecrire_parquet(lots, chemin, colonnes):
+    # DataFrames -> un fichier Parquet compressé écrit lot par lot -> (lignes, clés des lignes)
+    archives.verifier_pyarrow()
+    pa, pq = archives.pa, archives.pq
+    ecrivain, n, cles = None, 0, []
+    try:
+        for lot in lots:
+            if lot.empty: continue
+            tbl = pa.Table.from_pandas(lot.astype("string"), preserve_index=False)
+            if ecrivain is None: ecrivain = pq.ParquetWriter(chemin, tbl.schema, compression=COMPRESSION)
+            ecrivain.write_table(tbl)
+            n += len(lot)
+            if "UUID" in lot.columns: cles.append(_cles(lot))
+        if ecrivain is None:
+            vide = pa.Table.from_pandas(pd.DataFrame(columns=colonnes, dtype="string"), preserve_index=False)
+            pq.write_table(vide, chemin, compression=COMPRESSION)
+    finally:
+        if ecrivain is not None: ecrivain.close()
+    return n, (pd.concat(cles, ignore_index=True) if cles else pd.DataFrame(columns=["UUID", "Version"],
+                                                                              dtype="string"))
+
+
+def _colonnes(conn, table):
+    return list(pd.read_sql(text(f"SELECT * FROM {table} WHERE 1 = 0"), conn).columns)
+
+
+def _lignes_changees(conn, table, uuids):
+    for i in range(0, len(uuids), LOT_UUID):
+        paquet = uuids[i:i + LOT_UUID]
+        params = {f"u{j}": u for j, u in enumerate(paquet)}
+        yield pd.read_sql(text(f"SELECT * FROM {table} WHERE UUID IN ({', '.join(':' + k for k in params)})"),
+                          conn, params=params)
+
+
+def _sauver_table(conn, table, dossier, precedente):
+    # -> infos de la table ; precedente : dossier de la sauvegarde précédente (None : complète)
+    colonnes = _colonnes(conn, table)
+    chemin = os.path.join(dossier, f"{table}.parquet")
+    if "UUID" not in colonnes or precedente is None or not os.path.exists(
+            os.path.join(precedente, f"{table}_cles.parquet")):
+        n, cles = _ecrire_parquet(pd.read_sql(text(f"SELECT * FROM {table}"), conn, chunksize=TAILLE_LOT),
+                                  chemin, colonnes)
+        supprimees = None
+    else:
+        cles = _cles(pd.read_sql(text(f"SELECT {', '.join(c for c in ['UUID', 'Version'] if c in colonnes)} "
+                                      f"FROM {table}"), conn))
+        avant = archives.pq.read_table(os.path.join(precedente, f"{table}_cles.parquet")).to_pandas()
+        changees = cles[~(cles["UUID"] + "|" + cles["Version"]).isin(set(avant["UUID"] + "|" + avant["Version"]))]
+        supprimees = int((~avant["UUID"].isin(set(cles["UUID"]))).sum())
+
+        def lots():
+            yield from _lignes_changees(conn, table, list(changees["UUID"]))
+            yield pd.read_sql(text(f"SELECT * FROM {table} WHERE UUID IS NULL OR UUID = ''"), conn)
+
+        n, _ = _ecrire_parquet(lots(), chemin, colonnes)
+    archives.pq.write_table(archives.pa.Table.from_pandas(cles, preserve_index=False),
+                            os.path.join(dossier, f"{table}_cles.parquet"), compression=COMPRESSION)
+    return {"lignes": n, "total": len(cles), "supprimees": supprimees}
+
+
+def sauvegarder(engine, complete=False, dossier=DOSSIER_SAUVEGARDES, cycle=CYCLE):
+    # -> infos de la nouvelle sauvegarde (type, comptes par table, octets, secondes)
+    archives.verifier_pyarrow()
+    t0 = time.perf_counter()
+    maintenant = datetime.now()
+    existantes = lister(dossier)
+    precedente = existantes[-1] if existantes else None
+    completes = [i for i, s in enumerate(existantes) if s["type"] == "complete"]
+    if not completes or len(existantes) - 1 - completes[-1] >= cycle: complete = True
+    type_ = "complete" if complete else "increment"
+
+    os.makedirs(dossier, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".sauvegarde_", dir=dossier)
+    try:
+        tables = {}
+        with engine.connect() as conn, conn.begin():  # un seul instantané pour toutes les tables
+            for table in TABLES:
+                try:
+                    _colonnes(conn, table)
+                except Exception:
+                    continue  # table absente de cette base
+                tables[table] = _sauver_table(conn, table, tmp,
+                                              None if type_ == "complete" else precedente["chemin"])
+        infos = {"type": type_, "horodatage": maintenant.isoformat(timespec="seconds"),
+                 "precedente": precedente["nom"] if precedente and type_ == "increment" else None,
+                 "tables": tables, "octets": sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)),
+                 "secondes": round(time.perf_counter() - t0, 3)}
+        with open(os.path.join(tmp, "infos.json"), 'w', encoding='utf-8') as f: json.dump(infos, f, indent=2)
+        nom = f"{maintenant.strftime(FORMAT_NOM)}_{type_}"
+        while os.path.exists(os.path.join(dossier, nom)): nom += "_"
+        os.replace(tmp, os.path.join(dossier, nom))
+    except:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return {**infos, "nom": nom}
+
+
+# --- RESTAURATION ---
+def reconstituer(sauvegardes, tables=None):
+    # Rejoue la chaîne (complète puis incréments) -> {table: DataFrame texte} à l'instant de la dernière
+    archives.verifier_pyarrow()
+    etat = {}
+    for s in sauvegardes:
+        for table in tables or TABLES:
+            chemin = os.path.join(s["chemin"], f"{table}.parquet")
+            if not os.path.exists(chemin): continue
+            lignes = archives.pq.read_table(chemin).to_pandas()
+            uid = lignes["UUID"].fillna("") if "UUID" in lignes.columns else pd.Series("", index=lignes.index)
+            gardees, _ = etat.get(table, (None, None))
+            if gardees is not None and "UUID" in lignes.columns:
+                cles = archives.pq.read_table(os.path.join(s["chemin"], f"{table}_cles.parquet"),
+                                              columns=["UUID"]).to_pandas()["UUID"]
+                gardees = pd.concat([gardees, lignes[uid != ""]], ignore_index=True)
+                gardees = gardees.drop_duplicates("UUID", keep="last")
+                gardees = gardees[gardees["UUID"].isin(set(cles))]
+            else:
+                gardees = lignes[uid != ""]
+            etat[table] = (gardees, lignes[uid == ""])  # lignes sans UUID : celles de la dernière sauvegarde
+    return {t: pd.concat([a, b], ignore_index=True).astype(object).where(lambda d: d.notna(), "")
+            for t, (a, b) in etat.items()}
+
+
+def restaurer_sql(etat, engine, dossier_archives=archives.DOSSIER_ARCHIVES):
+    # Remplace le contenu des tables (DELETE + INSERT transactionnel par table) puis refait les cumuls
+    donnees.creer_tables(engine)
+    for table, df in etat.items():
+        colonnes = [c for c in donnees.SCHEMAS.get(table, df.columns) if c in df.columns]
+        donnees.save_data(engine, table, df[colonnes])
+    cumuls.creer_table(engine)
+    cumuls.reconstruire(engine, dossier_archives)
+
+
+def restaurer_csv(etat, dossier):
+    os.makedirs(dossier, exist_ok=True)
+    # Mêmes fichiers, en-têtes et ordre de colonnes que ceux écrits par MonTaxi.py
+    for table, df in etat.items():
+        if table in donnees.ENTETES_CSV: df = donnees.vers_csv(table, df)
+        chemin = os.path.join(dossier, donnees.FICHIERS_CSV.get(table, f"{table}.csv"))
+        fd, tmp = tempfile.mkstemp(prefix=".restaure_", suffix=".csv", dir=dossier)
+        with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f: df.to_csv(f, index=False)
+        os.replace(tmp, chemin)
+
+
+# --- LIGNE DE COMMANDE ---
+def _debit(lignes, octets, secondes):
+    s = max(secondes, 1e-9)
+    return f"{lignes} lignes en {secondes:.2f} s ({lignes / s:,.0f} lignes/s, {octets / s / 1e6:.1f} Mo/s)"
+
+
+def main():
+    p = argparse.ArgumentParser(description="Sauvegardes complètes / incrémentales et restauration à un instant.")
+    p.add_argument("action", choices=["sauvegarder", "lister", "restaurer"])
+    p.add_argument("--db", default=os.environ.get("MONTAXI_DB", "mysql+pymysql://root:@localhost/montaxi31_db"),
+                   help="base sauvegardée")
+    p.add_argument("--flotte", choices=flottes.noms(), default=None,
+                   help="flotte de flottes.json : sa base et son dossier de sauvegardes (remplace --db)")
+    p.add_argument("--dossier", default=None, help="dossier des sauvegardes (défaut : celui de la flotte)")
+    p.add_argument("--complete", action="store_true", help="forcer une sauvegarde complète")
+    p.add_argument("--cycle", type=int, default=CYCLE, help="incréments au plus entre deux complètes")
+    p.add_argument("--jusqu-a", dest="jusqu_a", default=None, help="instant à restaurer (défaut : le plus récent)")
+    p.add_argument("--vers-db", dest="vers_db", default=None, help="base cible (son contenu est remplacé)")
+    p.add_argument("--vers-csv", dest="vers_csv", default=None, help="dossier des fichiers CSV restaurés")
+    a = p.parse_args()
+
+    if a.flotte:
+        engine, dossier_archives, _ = flottes.source(a.flotte)
+        dossier = a.dossier or flottes.fichier(a.flotte, "sauvegardes")
+    else:
+        engine, dossier_archives = sqlalchemy.create_engine(a.db), archives.DOSSIER_ARCHIVES
+        dossier = a.dossier or DOSSIER_SAUVEGARDES
+
+    if a.action == "sauvegarder":
+        s = sauvegarder(engine, a.complete, dossier, a.cycle)
+        for t, i in s["tables"].items():
+            sup = "" if i["supprimees"] is None else f", {i['supprimees']} supprimée(s)"
+            print(f"  {t:<12} {i['lignes']:>8} écrite(s) / {i['total']} lignes{sup}")
+        print(f"{s['nom']} : " + _debit(sum(i["lignes"] for i in s["tables"].values()), s["octets"], s["secondes"]))
+    elif a.action == "lister":
+        for s in lister(dossier):
+            n = sum(i["lignes"] for i in s["tables"].values())
+            print(f"{s['nom']:<30} {s['horodatage']}  {n:>8} lignes  {s['octets'] / 1e6:7.2f} Mo  "
+                  f"{s['secondes']:.2f} s")
+    else:
+        if not (a.vers_db or a.vers_csv): p.error("restaurer : --vers-db ou --vers-csv requis")
+        t0 = time.perf_counter()
+        try:
+            sauvegardes = chaine(a.jusqu_a, dossier)
+        except (ValueError, RuntimeError) as e:
+            raise SystemExit(str(e))
+        etat = reconstituer(sauvegardes)
+        t1 = time.perf_counter()
+        if a.vers_db: restaurer_sql(etat, sqlalchemy.create_engine(a.vers_db), dossier_archives)
+        if a.vers_csv: restaurer_csv(etat, a.vers_csv)
+        t2 = time.perf_counter()
+        lignes = sum(len(df) for df in etat.values())
+        octets = sum(os.path.getsize(os.path.join(s["chemin"], f)) for s in sauvegardes
+                     for f in os.listdir(s["chemin"]))
+        print(f"État du {sauvegardes[-1]['horodatage']} ({len(sauvegardes)} sauvegarde(s) rejouée(s)) : "
+              + ", ".join(f"{t} {len(df)}" for t, df in etat.items()))
+        print(f"Relecture : {_debit(lignes, octets, t1 - t0)}")
+        print(f"Écriture  : {lignes} lignes en {t2 - t1:.2f} s ({lignes / max(t2 - t1, 1e-9):,.0f} lignes/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+from sqlalchemy import create_engine
+
+import donnees
+import generer_donnees
+
+# --- SIMULATION DE POSTES CONCURRENTS ---
+# Plusieurs "répartiteurs" (threads, une connexion chacun) éditent la même base en même temps
+# via donnees.modifier_ligne / supprimer_ligne / inserer_ligne, comme le font les pages de app_taxi.py.
+# Vérifie qu'aucune écriture n'est perdue et que les conflits sont signalés au lieu d'écraser.
+#   python simuler_concurrence.py                       (base SQLite temporaire)
+#   python simuler_concurrence.py --db mysql+pymysql://root:@localhost/montaxi_test --sessions 16
+# Code de sortie 1 si un scénario échoue.
+
+
+def lire(engine, uid):
+    df = donnees.load_data(engine, "revenus", where={"UUID": uid})
+    return df.iloc[0].to_dict() if len(df) else None
+
+
+def en_parallele(taches):
+    # Toutes les sessions partent en même temps (barrière) pour maximiser les collisions
+    depart = threading.Barrier(len(taches))
+    resultats = [None] * len(taches)
+
+    def lancer(i, tache):
+        depart.wait()
+        try:
+            resultats[i] = ("ok", tache())
+        except donnees.ConflitVersion as e:
+            resultats[i] = ("conflit", e)
+        except Exception as e:
+            resultats[i] = ("erreur", f"{type(e).__name__}: {e}")
+
+    fils = [threading.Thread(target=lancer, args=(i, t)) for i, t in enumerate(taches)]
+    for f in fils: f.start()
+    for f in fils: f.join()
+    return resultats
+
+
+def _modifier(engine, ligne, version, note):
+    return lambda: donnees.modifier_ligne(engine, "revenus", {**ligne, "Divers": note}, version)
+
+
+# --- SCÉNARIOS ---
+def meme_ligne(engine, uids, n):
+    # n postes chargent la même fiche puis enregistrent : un seul gagne, les autres reçoivent un conflit
+    ligne = lire(engine, uids[0])
+    res = en_parallele([_modifier(engine, ligne, ligne["Version"], 1000 + i) for i in range(n)])
+    gagnants = [i for i, r in enumerate(res) if r[0] == "ok"]
+    finale = lire(engine, uids[0])
+    ok = (len(gagnants) == 1 and all(r[0] == "conflit" for i, r in enumerate(res) if i not in gagnants)
+          and finale["Divers"] == 1000 + gagnants[0] and finale["Version"] == ligne["Version"] + 1)
+    return ok, f"{len(gagnants)} gagnant(s), {sum(r[0] == 'conflit' for r in res)} conflit(s)"
+
+
+def lignes_distinctes(engine, uids, n):
+    # n postes modifient chacun leur fiche : toutes les modifications doivent être présentes
+    lignes = [lire(engine, u) for u in uids[1:n + 1]]
+    res = en_parallele([_modifier(engine, l, l["Version"], 2000 + i) for i, l in enumerate(lignes)])
+    finales = [lire(engine, l["UUID"]) for l in lignes]
+    perdues = [i for i, f in enumerate(finales) if f is None or f["Divers"] != 2000 + i]
+    ok = all(r[0] == "ok" for r in res) and not perdues
+    return ok, f"{sum(r[0] == 'ok' for r in res)}/{n} enregistrées, {len(perdues)} perdue(s)"
+
+
+def insertions(engine, uids, n, par_session=5):
+    # n postes saisissent de nouvelles semaines en même temps : aucune ligne ne doit manquer
+    avant = len(donnees.load_data(engine, "revenus", ["UUID"]))
+    modele = lire(engine, uids[0])
+
+    def saisir():
+        for _ in range(par_session): donnees.inserer_ligne(engine, "revenus", {**modele, "UUID": str(uuid.uuid4())})
+
+    res = en_parallele([saisir] * n)
+    apres = len(donnees.load_data(engine, "revenus", ["UUID"]))
+    ok = all(r[0] == "ok" for r in res) and apres - avant == n * par_session
+    return ok, f"{apres - avant}/{n * par_session} lignes ajoutées"
+
+
+def suppression_contre_modification(engine, uids, n):
+    # Un poste supprime pendant qu'un autre modifie la même fiche : une seule des deux opérations passe
+    ligne = lire(engine, uids[-1])
+    res = en_parallele([lambda: donnees.supprimer_ligne(engine, "revenus", ligne["UUID"], ligne["Version"]),
+                        _modifier(engine, ligne, ligne["Version"], 3000)])
+    finale = lire(engine, ligne["UUID"])
+    statuts = [r[0] for r in res]
+    ok = sorted(statuts) == ["conflit", "ok"] and ((finale is None) == (statuts[0] == "ok"))
+    return ok, f"suppression={statuts[0]}, modification={statuts[1]}, fiche {'absente' if finale is None else 'présente'}"
+
+
+SCENARIOS = [("même fiche", meme_ligne), ("fiches distinctes", lignes_distinctes), ("insertions", insertions),
+             ("suppression / modification", suppression_contre_modification)]
+
+
+def main():
+    p = argparse.ArgumentParser(description="Simule des postes concurrents sur les écritures ligne à ligne.")
+    p.add_argument("--db", default=None, help="URL SQLAlchemy (défaut : SQLite temporaire) ; la base est remplie")
+    p.add_argument("--sessions", type=int, default=8)
+    p.add_argument("--graine", type=int, default=7)
+    a = p.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="montaxi_concurrence_") as tmp:
+        url = a.db or f"sqlite:///{os.path.join(tmp, 'concurrence.db')}"
+        engine = create_engine(url, pool_size=a.sessions, max_overflow=a.sessions)
+        tables = generer_donnees.generer(3, 5, 1, graine=a.graine)
+        generer_donnees.ecrire_sql(tables, engine)
+        uids = tables["revenus"]["UUID"].tolist()
+
+        echecs = 0
+        for nom, scenario in SCENARIOS:
+            ok, detail = scenario(engine, uids, a.sessions)
+            echecs += not ok
+            print(f"{'OK   ' if ok else 'ÉCHEC'} {nom:<28} {detail}")
+        engine.dispose()
+    sys.exit(1 if echecs else 0)
+
+
+if __name__ == "__main__":
+    main()
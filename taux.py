@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# --- TAUX EN VIGUEUR PAR DATE ---
+# config_taxi.json["historique_taux"] : [{"depuis": "2025-01-01", "cout_appel": ..., "tps": ..., ...}, ...]
+# Chaque palier s'applique de sa date "depuis" jusqu'au palier suivant ; une date antérieure au premier palier
+# prend le premier. Sans historique, les taux globaux de la config valent pour toutes les dates.
+# Recherche vectorisée (pd.merge_asof) : une année complète de lignes est traitée en une passe.
+TAUX = ["cout_appel", "pct_chauf", "taux_impot", "tps", "tvq"]
+CLE_HISTORIQUE = "historique_taux"
+ORIGINE = "1900-01-01"
+
+
+def grille(config):
+    # Paliers triés ; un taux absent d'un palier reprend celui du palier précédent
+    paliers = config.get(CLE_HISTORIQUE) or [{"depuis": ORIGINE}]
+    df = pd.DataFrame(paliers).reindex(columns=["depuis", *TAUX])
+    df["Depuis"] = pd.to_datetime(df["depuis"], errors='coerce').fillna(pd.Timestamp(ORIGINE)).astype("datetime64[ns]")
+    df = df.drop(columns="depuis").sort_values("Depuis", kind="stable").drop_duplicates("Depuis", keep="last")
+    df[TAUX] = df[TAUX].astype(float).ffill().fillna({k: float(config[k]) for k in TAUX})
+    return df.reset_index(drop=True)
+
+
+def en_vigueur(dates, config):
+    # Un jeu de taux par date, même index que 'dates' ; date manquante -> taux du jour
+    dates = dates if isinstance(dates, pd.Series) else pd.Series(list(dates))
+    g = grille(config)
+    if len(g) == 1:
+        return pd.DataFrame({k: float(g[k].iloc[0]) for k in TAUX}, index=dates.index)
+    d = pd.to_datetime(dates, errors='coerce', format="mixed").fillna(pd.Timestamp.now().normalize())
+    gauche = pd.DataFrame({"Date": d.to_numpy(dtype="datetime64[ns]"), "_pos": np.arange(len(d))})
+    res = pd.merge_asof(gauche.sort_values("Date", kind="stable"), g, left_on="Date", right_on="Depuis",
+                        direction="backward")
+    res[TAUX] = res[TAUX].fillna(g.iloc[0][TAUX])
+    res = res.sort_values("_pos")
+    return pd.DataFrame(res[TAUX].to_numpy(), index=dates.index, columns=TAUX)
+
+
+def actuels(config, date=None):
+    # Config complétée des taux en vigueur à 'date' (défaut : aujourd'hui) -> formulaires ligne à ligne
+    t = en_vigueur(pd.Series([date]), config).iloc[0]
+    return {**config, **{k: float(t[k]) for k in TAUX}}
+
+
+def taxes_revenus(df_r, config):
+    # TPS / TVQ (en %) de chaque ligne de revenus, pour le partage des taxes essence / lavage
+    if "Date_Debut" in df_r.columns:
+        dates = df_r["Date_Debut"]
+    elif "Mois" in df_r.columns:
+        dates = pd.to_datetime(df_r["Mois"].astype(str) + "-01", errors='coerce')
+    else:
+        dates = pd.Series(pd.NaT, index=df_r.index)
+    t = en_vigueur(dates, config)
+    return t["tps"], t["tvq"]
+
+
+def ajouter(config, depuis, valeurs):
+    # Nouveau palier à partir de 'depuis' ; sans historique, les taux actuels deviennent le palier d'origine
+    hist = [dict(p) for p in (config.get(CLE_HISTORIQUE) or [{"depuis": ORIGINE, **{k: config[k] for k in TAUX}}])]
+    depuis = pd.Timestamp(depuis).strftime("%Y-%m-%d")
+    hist = [p for p in hist if p.get("depuis") != depuis] + [{"depuis": depuis,
+                                                              **{k: float(valeurs[k]) for k in TAUX}}]
+    nouveau = {**config, CLE_HISTORIQUE: sorted(hist, key=lambda p: p.get("depuis") or ORIGINE)}
+    # Taux globaux = taux du jour (lecteurs qui ignorent l'historique)
+    return {**nouveau, **{k: v for k, v in actuels(nouveau).items() if k in TAUX}}
+
+
+def historique(config):
+    g = grille(config)
+    g["Depuis"] = g["Depuis"].dt.strftime("%Y-%m-%d")
+    return g[["Depuis", *TAUX]]